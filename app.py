@@ -1,499 +1,91 @@
-<<<<<<< HEAD
-# app.py
-from flask import Flask, render_template, request, jsonify
-from datetime import datetime
-from dotenv import load_dotenv
-import os
-import logging
-import uuid
-
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
-
-# load .env (if present)
-load_dotenv()
-
-from db_helpers import (
-    init_db, create_session, log_message, log_result, close_session,
-    get_sessions, get_messages_for_session, get_results_for_session,
-    update_session_patient_info, get_conversation_history
-)
-from symptom_api import call_symptom_api_mock, has_red_flag, call_deepseek
-
-app = Flask(__name__, static_folder="static", template_folder="templates")
-app.config['JSON_SORT_KEYS'] = False
-
-# Init DB (creates tables if not present)
-init_db()
-
-# Check API status at startup
-DEEPSEEK_API_AVAILABLE = False
-try:
-    if os.getenv("DEEPSEEK_API_KEY"):
-        DEEPSEEK_API_AVAILABLE = True
-        logger.info("DeepSeek API key found")
-    else:
-        logger.warning("No DeepSeek API key found")
-except Exception as e:
-    logger.error(f"Error checking API status: {e}")
-
-# Store active conversations (in production, use Redis)
-active_conversations = {}
-
-@app.route("/")
-def index():
-    return render_template("index.html", deepseek_available=DEEPSEEK_API_AVAILABLE)
-
-@app.route("/api/start_conversation", methods=["POST"])
-def start_conversation():
-    """Start a new conversation session"""
-    data = request.json or {}
-    age = data.get("age")
-    gender = data.get("gender")
-    patient_name = data.get("patient_name", "").strip()
-    
-    # Create new session
-    session_id = create_session(
-        start_time=datetime.utcnow(),
-        age=(int(age) if age and str(age).isdigit() else None),
-        gender=(gender or None),
-        patient_name=(patient_name or None)
-    )
-    
-    # Store conversation context
-    conversation_id = str(uuid.uuid4())
-    active_conversations[conversation_id] = {
-        "session_id": session_id,
-        "patient_info": {
-            "age": age,
-            "gender": gender,
-            "patient_name": patient_name
-        },
-        "message_history": [],
-        "created_at": datetime.utcnow()
-    }
-    
-    # Log initial message
-    if patient_name:
-        log_message(session_id, "meta", f"patient_name:{patient_name}")
-    
-    welcome_message = "👋 Hello! I'm your medical assistant. I can help you understand your symptoms and provide guidance. How can I help you today?"
-    log_message(session_id, "bot", welcome_message)
-    
-    return jsonify({
-        "conversation_id": conversation_id,
-        "session_id": session_id,
-        "welcome_message": welcome_message
-    })
-
-@app.route("/api/send_message", methods=["POST"])
-def send_message():
-    """Process a message in an existing conversation"""
-    data = request.json or {}
-    conversation_id = data.get("conversation_id")
-    message = data.get("message", "").strip()
-    
-    if not conversation_id:
-        return jsonify({"error": "No conversation ID provided"}), 400
-    
-    if not message:
-        return jsonify({"error": "No message provided"}), 400
-    
-    # Get conversation context
-    conversation = active_conversations.get(conversation_id)
-    if not conversation:
-        return jsonify({"error": "Conversation not found"}), 404
-    
-    session_id = conversation["session_id"]
-    patient_info = conversation["patient_info"]
-    
-    # Add user message to history and log it
-    conversation["message_history"].append({"role": "user", "content": message, "timestamp": datetime.utcnow()})
-    log_message(session_id, "user", message)
-    
-    # Check for red flags immediately
-    if has_red_flag(message):
-        logger.info(f"Red flag detected in conversation {conversation_id}")
-        result = {
-            "triage": "🚨 Emergency — seek immediate care",
-            "conditions": [{"name": "Potential emergency condition", "probability": 0.8}],
-            "advice": "Symptoms indicate possible emergency. Call emergency services or go to nearest ER immediately.",
-            "selfcare": ["Do not delay - go to emergency department"],
-            "warning": [
-                "Severe chest pain or pressure",
-                "Difficulty breathing or shortness of breath", 
-                "Loss of consciousness or sudden confusion"
-            ],
-            "summary": "Immediate emergency care is recommended based on the symptoms you provided.",
-            "patient_name": patient_info.get("patient_name"),
-            "red_flag": True
-        }
-        
-        log_result(session_id, "redflag", result)
-        log_message(session_id, "bot", result["advice"])
-        
-        # Add to conversation history
-        conversation["message_history"].append({"role": "bot", "content": result["advice"], "timestamp": datetime.utcnow()})
-        
-        return jsonify({
-            "response": result["advice"],
-            "analysis": result,
-            "is_emergency": True
-        })
-    
-    # Check if this is a medical query
-    medical_keywords = [
-        'pain', 'hurt', 'sick', 'fever', 'cough', 'headache', 'nausea', 
-        'vomit', 'dizzy', 'rash', 'swollen', 'bleed', 'breath', 'chest',
-        'stomach', 'throat', 'cold', 'flu', 'symptom', 'feel', 'unwell'
-    ]
-    
-    is_medical_query = any(keyword in message.lower() for keyword in medical_keywords)
-    
-    if not is_medical_query:
-        # General conversation response
-        general_responses = [
-            "I'm here to help with medical concerns. Could you describe any symptoms you're experiencing?",
-            "I specialize in symptom assessment. Please tell me about any health issues you're having.",
-            "For medical assistance, please describe your symptoms and I'll do my best to help.",
-            "I understand you have a question. I'm designed to help with medical symptoms and health concerns. What symptoms are you experiencing?"
-        ]
-        
-        response = general_responses[len(conversation["message_history"]) % len(general_responses)]
-        log_message(session_id, "bot", response)
-        conversation["message_history"].append({"role": "bot", "content": response, "timestamp": datetime.utcnow()})
-        
-        return jsonify({
-            "response": response,
-            "is_medical": False
-        })
-    
-    # Medical query - analyze symptoms
-    try:
-        # Use mock for now due to API issues, but you can switch based on preference
-        use_api = "mock"  # You can make this configurable
-        
-        if use_api == "deepseek" and DEEPSEEK_API_AVAILABLE:
-            result = call_deepseek(message, age=patient_info.get("age"), gender=patient_info.get("gender"))
-            api_name = "deepseek"
-        else:
-            result = call_symptom_api_mock(message, age=patient_info.get("age"), gender=patient_info.get("gender"))
-            api_name = "mock"
-            
-    except Exception as api_error:
-        logger.error(f"API call failed: {api_error}")
-        # Fallback to mock on any API error
-        result = call_symptom_api_mock(message, age=patient_info.get("age"), gender=patient_info.get("gender"))
-        api_name = "mock_fallback"
-        result["api_note"] = "Primary API unavailable - using backup analysis"
-    
-    # Ensure all required keys exist
-    required_keys = ["triage", "conditions", "advice", "selfcare", "warning", "summary"]
-    for key in required_keys:
-        result.setdefault(key, "")
-        
-    if not result.get("selfcare"):
-        result["selfcare"] = ["Stay hydrated and rest."]
-    if not result.get("warning"):
-        result["warning"] = ["Seek medical help if symptoms worsen."]
-    if not result.get("summary"):
-        top_condition = result.get("conditions", [{}])[0].get("name") if result.get("conditions") else None
-        if top_condition:
-            result["summary"] = f"Most likely: {top_condition}. {result.get('advice', 'Follow up with a physician if unsure.')}"
-        else:
-            result["summary"] = "Please consult with a healthcare provider for proper diagnosis."
-            
-    result["patient_name"] = patient_info.get("patient_name")
-    
-    # Log and store results
-    log_result(session_id, api_name, result)
-    log_message(session_id, "bot", result.get("advice", ""))
-    
-    # Add to conversation history
-    conversation["message_history"].append({"role": "bot", "content": result["advice"], "timestamp": datetime.utcnow()})
-    
-    # Prepare follow-up question
-    follow_up_questions = [
-        "Is there anything else you'd like to know about your symptoms?",
-        "Would you like me to clarify anything about this assessment?",
-        "Do you have any other symptoms you'd like to discuss?",
-        "Is there anything else about your health that you're concerned about?"
-    ]
-    
-    follow_up = follow_up_questions[len(conversation["message_history"]) % len(follow_up_questions)]
-    
-    return jsonify({
-        "response": result["advice"],
-        "analysis": result,
-        "is_medical": True,
-        "follow_up": follow_up
-    })
-
-@app.route("/api/update_patient_info", methods=["POST"])
-def update_patient_info():
-    """Update patient information for an existing conversation"""
-    data = request.json or {}
-    conversation_id = data.get("conversation_id")
-    
-    if not conversation_id:
-        return jsonify({"error": "No conversation ID provided"}), 400
-    
-    conversation = active_conversations.get(conversation_id)
-    if not conversation:
-        return jsonify({"error": "Conversation not found"}), 404
-    
-    # Update patient info
-    age = data.get("age")
-    gender = data.get("gender")
-    patient_name = data.get("patient_name", "").strip()
-    
-    conversation["patient_info"].update({
-        "age": age,
-        "gender": gender,
-        "patient_name": patient_name
-    })
-    
-    # Update session in database
-    update_session_patient_info(
-        conversation["session_id"],
-        age=(int(age) if age and str(age).isdigit() else None),
-        gender=(gender or None),
-        patient_name=(patient_name or None)
-    )
-    
-    return jsonify({"success": True, "message": "Patient information updated"})
-
-@app.route("/api/conversation/<conversation_id>", methods=["GET"])
-def get_conversation(conversation_id):
-    """Get conversation history"""
-    conversation = active_conversations.get(conversation_id)
-    if not conversation:
-        return jsonify({"error": "Conversation not found"}), 404
-    
-    return jsonify({
-        "conversation_id": conversation_id,
-        "session_id": conversation["session_id"],
-        "patient_info": conversation["patient_info"],
-        "message_history": conversation["message_history"],
-        "created_at": conversation["created_at"].isoformat()
-    })
-
-@app.route("/api/end_conversation", methods=["POST"])
-def end_conversation():
-    """End a conversation and close the session"""
-    data = request.json or {}
-    conversation_id = data.get("conversation_id")
-    
-    if not conversation_id:
-        return jsonify({"error": "No conversation ID provided"}), 400
-    
-    conversation = active_conversations.get(conversation_id)
-    if not conversation:
-        return jsonify({"error": "Conversation not found"}), 404
-    
-    # Close the session in database
-    close_session(conversation["session_id"])
-    
-    # Remove from active conversations
-    del active_conversations[conversation_id]
-    
-    return jsonify({"success": True, "message": "Conversation ended"})
-
-@app.route("/check", methods=["POST"])
-def check():
-    """Legacy endpoint for single symptom check (for backward compatibility)"""
-    data = request.json or {}
-    age = data.get("age")
-    gender = data.get("gender")
-    patient_name = (data.get("patient_name","") or "").strip()
-    symptoms = (data.get("symptoms","") or "").strip()
-    use_api = data.get("use_api", "mock")
-
-    if not symptoms:
-        return jsonify({"error":"Please enter symptoms."}), 400
-
-    # create session and log user message
-    session_id = create_session(
-        start_time=datetime.utcnow(),
-        age=(int(age) if age and str(age).isdigit() else None),
-        gender=(gender or None),
-        patient_name=(patient_name or None)
-    )
-    if patient_name:
-        log_message(session_id, "meta", f"patient_name:{patient_name}")
-    log_message(session_id, "user", symptoms)
-
-    # quick red-flag handling
-    if has_red_flag(symptoms):
-        logger.info(f"Red flag detected for session {session_id}")
-        result = {
-            "triage": "🚨 Emergency — seek immediate care",
-            "conditions": [{"name": "Potential emergency condition", "probability": 0.8}],
-            "advice": "Symptoms indicate possible emergency. Call emergency services or go to nearest ER immediately.",
-            "selfcare": ["Do not delay - go to emergency department"],
-            "warning": [
-                "Severe chest pain or pressure",
-                "Difficulty breathing or shortness of breath", 
-                "Loss of consciousness or sudden confusion"
-            ],
-            "summary": "Immediate emergency care is recommended based on the symptoms you provided.",
-            "patient_name": patient_name,
-            "red_flag": True
-        }
-        log_result(session_id, "redflag", result)
-        log_message(session_id, "bot", result["advice"])
-        close_session(session_id)
-        return jsonify({"session_id": session_id, "result": result})
-
-    # Call chosen API
-    logger.info(f"Calling API: {use_api} for session {session_id}")
-    
-    if use_api == "deepseek" and DEEPSEEK_API_AVAILABLE:
-        result = call_deepseek(symptoms, age=age, gender=gender)
-        api_name = "deepseek"
-    else:
-        result = call_symptom_api_mock(symptoms, age=age, gender=gender)
-        api_name = "mock"
-
-    # Ensure all required keys exist
-    required_keys = ["triage", "conditions", "advice", "selfcare", "warning", "summary"]
-    for key in required_keys:
-        result.setdefault(key, "")
-        
-    if not result.get("selfcare"):
-        result["selfcare"] = ["Stay hydrated and rest."]
-    if not result.get("warning"):
-        result["warning"] = ["Seek medical help if symptoms worsen."]
-    if not result.get("summary"):
-        top_condition = result.get("conditions", [{}])[0].get("name") if result.get("conditions") else None
-        if top_condition:
-            result["summary"] = f"Most likely: {top_condition}. {result.get('advice', 'Follow up with a physician if unsure.')}"
-        else:
-            result["summary"] = "Please consult with a healthcare provider for proper diagnosis."
-            
-    result["patient_name"] = patient_name
-
-    # Log and finish
-    log_result(session_id, api_name, result)
-    log_message(session_id, "bot", result.get("advice",""))
-    close_session(session_id)
-
-    logger.info(f"Session {session_id} completed successfully")
-    return jsonify({"session_id": session_id, "result": result})
-
-@app.route("/history", methods=["GET"])
-def history():
-    try:
-        rows = get_sessions(100)
-        sessions = []
-        for r in rows:
-            sessions.append({
-                "id": r[0],
-                "session_hash": r[1],
-                "start_time": r[2],
-                "age": r[3],
-                "gender": r[4],
-                "patient_name": r[5] if len(r) > 5 else None
-            })
-        return render_template("history.html", sessions=sessions)
-    except Exception as e:
-        logger.error(f"Error loading history: {e}")
-        return render_template("history.html", sessions=[])
-
-@app.route("/history/<int:session_id>", methods=["GET"])
-def view_session(session_id):
-    try:
-        messages = get_messages_for_session(session_id)
-        results = get_results_for_session(session_id)
-        return render_template("session_view.html", session_id=session_id, messages=messages, results=results)
-    except Exception as e:
-        logger.error(f"Error viewing session {session_id}: {e}")
-        return render_template("session_view.html", session_id=session_id, messages=[], results=[])
-
-@app.route("/conversation/<int:session_id>", methods=["GET"])
-def view_conversation(session_id):
-    """View full conversation for a session"""
-    try:
-        conversation = get_conversation_history(session_id)
-        return render_template("conversation_view.html", 
-                             session_id=session_id, 
-                             conversation=conversation)
-    except Exception as e:
-        logger.error(f"Error viewing conversation {session_id}: {e}")
-        return render_template("conversation_view.html", 
-                             session_id=session_id, 
-                             conversation=[])
-
-# Health check endpoints
-@app.route("/health", methods=["GET"])
-def health_check():
-    return jsonify({
-        "status": "healthy", 
-        "timestamp": datetime.utcnow().isoformat(),
-        "deepseek_api_available": DEEPSEEK_API_AVAILABLE,
-        "active_conversations": len(active_conversations)
-    })
-
-@app.route("/debug/api-status", methods=["GET"])
-def api_status():
-    deepseek_key = os.getenv("DEEPSEEK_API_KEY")
-    return jsonify({
-        "deepseek_api_key_set": bool(deepseek_key),
-        "deepseek_key_length": len(deepseek_key) if deepseek_key else 0,
-        "deepseek_api_available": DEEPSEEK_API_AVAILABLE,
-        "environment_loaded": True,
-        "active_conversations": len(active_conversations)
-    })
-
-# Clean up old conversations (basic implementation)
-def cleanup_old_conversations():
-    """Remove conversations older than 24 hours"""
-    current_time = datetime.utcnow()
-    expired_conversations = []
-    
-    for conv_id, conv_data in active_conversations.items():
-        if (current_time - conv_data["created_at"]).total_seconds() > 24 * 3600:  # 24 hours
-            expired_conversations.append(conv_id)
-    
-    for conv_id in expired_conversations:
-        close_session(active_conversations[conv_id]["session_id"])
-        del active_conversations[conv_id]
-    
-    if expired_conversations:
-        logger.info(f"Cleaned up {len(expired_conversations)} expired conversations")
-
-if __name__ == "__main__":
-    # Clean up on startup
-    cleanup_old_conversations()
-=======
 # app.py
-from flask import Flask, render_template, request, jsonify
+from flask import (
+    Flask, render_template, request, jsonify, url_for, Response, stream_with_context, g,
+    before_render_template, template_rendered
+)
 from datetime import datetime
 from dotenv import load_dotenv
+from structured_logging import configure_logging
 import os
 import logging
 import uuid
-
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
+import time
+import json
 
 # load .env (if present)
 load_dotenv()
 
+# JSON lines from a background writer thread; LOG_LEVEL, LOG_LEVELS and
+# LOG_SAMPLE tune it (see structured_logging)
+configure_logging()
+logger = logging.getLogger(__name__)
+
 from db_helpers import (
-    init_db, create_session, log_message, log_result, close_session,
-    get_sessions, get_messages_for_session, get_results_for_session,
-    update_session_patient_info, get_conversation_history
+    init_db, create_session, log_message, close_session,
+    get_sessions_page, get_session_timeline, update_session_patient_info,
+    configure_journal, journal_stats, log_sessions_batch, AGE_BANDS, TRIAGE_LEVELS
+)
+from symptom_api import DEEPSEEK_BREAKER, DEEPSEEK_HEDGING
+from conversation_store import create_conversation_store
+from triage_cache import TriageCache, cache_key as triage_cache_key
+from single_flight import SingleFlight
+from triage_pipeline import (
+    TriagePipeline, emergency_result, fallback_api_name, EMERGENCY, GENERAL, GENERAL_RESPONSES, FOLLOW_UP_QUESTIONS,
+    PROVIDER_SECONDS, RED_FLAGS
 )
-from symptom_api import call_symptom_api_mock, has_red_flag, call_deepseek
+import metrics
+from request_profiler import install_profiler
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 app.config['JSON_SORT_KEYS'] = False
 
-# Init DB (creates tables if not present)
-init_db()
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_seconds", "Request handling time until the response is returned (streamed bodies excluded)",
+    ["endpoint", "method"])
+HTTP_RESPONSES = metrics.counter("http_responses_total", "Responses by endpoint and status", ["endpoint", "status"])
+TEMPLATE_RENDER_SECONDS = metrics.histogram("template_render_seconds", "Jinja template rendering", ["template"])
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        endpoint = request.endpoint or "unmatched"
+        HTTP_REQUEST_SECONDS.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        HTTP_RESPONSES.labels(endpoint, str(response.status_code)).inc()
+    return response
+
+@before_render_template.connect_via(app)
+def _start_template_timer(sender, template, context, **extra):
+    g.template_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def _record_template(sender, template, context, **extra):
+    started = g.pop("template_started", None)
+    if started is not None:
+        TEMPLATE_RENDER_SECONDS.labels(template.name or "string").observe(time.perf_counter() - started)
+
+# Opt-in request profiling: set PROFILE_DIR, then send "X-Profile: 1" (or
+# PROFILE_TOKEN, if set) or sample with PROFILE_SAMPLE_RATE.  Unset, the
+# app isn't wrapped at all.
+if os.getenv("PROFILE_DIR"):
+    install_profiler(
+        app, os.getenv("PROFILE_DIR"),
+        sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        token=os.getenv("PROFILE_TOKEN") or None,
+        keep=int(os.getenv("PROFILE_KEEP", "200"))
+    )
+
+# Init DB (creates tables if not present). WAL unless overridden, so /history
+# readers don't block behind chat writes.
+init_db(profile=os.getenv("DB_STORAGE_PROFILE", "wal"))
+
+# Message/result logging is write-behind so chat turns don't wait on fsync.
+# Set DB_JOURNAL_MODE=strict to commit every row on the request thread.
+configure_journal(os.getenv("DB_JOURNAL_MODE", "async"))
 
 # Check API status at startup
 DEEPSEEK_API_AVAILABLE = False
@@ -504,10 +96,53 @@ try:
     else:
         logger.warning("No DeepSeek API key found")
 except Exception as e:
-    logger.error(f"Error checking API status: {e}")
+    logger.error("Error checking API status: %s", e)
 
-# Store active conversations (in production, use Redis)
-active_conversations = {}
+def _on_conversation_evicted(conversation_id, conversation, reason):
+    close_session(conversation["session_id"])
+    logger.info("Evicted conversation %s (%s)", conversation_id, reason)
+
+# Live conversations: idle TTL and a capped history window per conversation.
+# CONVERSATION_BACKEND=sqlite shares them between worker processes through
+# the database; the default in-process store is also LRU-bounded.
+conversations = create_conversation_store(
+    os.getenv("CONVERSATION_BACKEND", "memory"),
+    max_conversations=int(os.getenv("CONVERSATION_MAX", "10000")),
+    ttl_seconds=float(os.getenv("CONVERSATION_TTL_SECONDS", str(24 * 3600))),
+    max_history=int(os.getenv("CONVERSATION_MAX_HISTORY", "50")),
+    on_evict=_on_conversation_evicted
+)
+
+# Each triage request has a time budget: TRIAGE_DEADLINE_SECONDS, or less if
+# the client sends X-Request-Deadline-Ms.  The upstream call, and anyone
+# waiting on it, only get what's left of it.
+TRIAGE_DEADLINE_SECONDS = float(os.getenv("TRIAGE_DEADLINE_SECONDS", "20"))
+
+def _request_deadline():
+    """The time.monotonic() by which this request's triage must be done"""
+    budget = TRIAGE_DEADLINE_SECONDS
+    header = request.headers.get("X-Request-Deadline-Ms", "")
+    if header.isdigit():
+        budget = min(budget, int(header) / 1000.0)
+    return time.monotonic() + budget
+
+# Screening, provider choice, result backfill and logging for every triage
+# route.  Its cache holds provider results for repeated presentations (same
+# normalized symptoms, age band and gender): TRIAGE_CACHE_BACKEND=sqlite keeps
+# them across restarts, TRIAGE_CACHE_MAX=0 disables it, and clients send
+# "bypass_cache": true to force a fresh triage.  Identical presentations
+# arriving while a DeepSeek call for them is still running wait for that call
+# instead of starting another one.
+pipeline = TriagePipeline(
+    cache=TriageCache(
+        max_entries=int(os.getenv("TRIAGE_CACHE_MAX", "10000")),
+        ttl_seconds=float(os.getenv("TRIAGE_CACHE_TTL_SECONDS", str(6 * 3600))),
+        persistent=os.getenv("TRIAGE_CACHE_BACKEND", "memory") == "sqlite"
+    ),
+    flights=SingleFlight(),
+    deepseek_available=DEEPSEEK_API_AVAILABLE,
+    deadline_seconds=TRIAGE_DEADLINE_SECONDS
+)
 
 @app.route("/")
 def index():
@@ -531,7 +166,7 @@ def start_conversation():
     
     # Store conversation context
     conversation_id = str(uuid.uuid4())
-    active_conversations[conversation_id] = {
+    conversations.create(conversation_id, {
         "session_id": session_id,
         "patient_info": {
             "age": age,
@@ -539,8 +174,8 @@ def start_conversation():
             "patient_name": patient_name
         },
         "message_history": [],
-        "created_at": datetime.utcnow()
-    }
+        "created_at": datetime.utcnow().isoformat()
+    })
     
     # Log initial message
     if patient_name:
@@ -556,8 +191,9 @@ def start_conversation():
     })
 
 @app.route("/api/send_message", methods=["POST"])
-def send_message():
+async def send_message():
     """Process a message in an existing conversation"""
+    deadline = _request_deadline()
     data = request.json or {}
     conversation_id = data.get("conversation_id")
     message = data.get("message", "").strip()
@@ -569,7 +205,7 @@ def send_message():
         return jsonify({"error": "No message provided"}), 400
     
     # Get conversation context
-    conversation = active_conversations.get(conversation_id)
+    conversation = conversations.get(conversation_id)
     if not conversation:
         return jsonify({"error": "Conversation not found"}), 404
     
@@ -577,119 +213,42 @@ def send_message():
     patient_info = conversation["patient_info"]
     
     # Add user message to history and log it
-    conversation["message_history"].append({"role": "user", "content": message, "timestamp": datetime.utcnow()})
+    history_length = conversations.append_messages(
+        conversation_id, {"role": "user", "content": message, "timestamp": datetime.utcnow().isoformat()})
     log_message(session_id, "user", message)
     
-    # Check for red flags immediately
-    if has_red_flag(message):
-        logger.info(f"Red flag detected in conversation {conversation_id}")
-        result = {
-            "triage": "🚨 Emergency — seek immediate care",
-            "conditions": [{"name": "Potential emergency condition", "probability": 0.8}],
-            "advice": "Symptoms indicate possible emergency. Call emergency services or go to nearest ER immediately.",
-            "selfcare": ["Do not delay - go to emergency department"],
-            "warning": [
-                "Severe chest pain or pressure",
-                "Difficulty breathing or shortness of breath", 
-                "Loss of consciousness or sudden confusion"
-            ],
-            "summary": "Immediate emergency care is recommended based on the symptoms you provided.",
-            "patient_name": patient_info.get("patient_name"),
-            "red_flag": True
-        }
-        
-        log_result(session_id, "redflag", result)
-        log_message(session_id, "bot", result["advice"])
-        
-        # Add to conversation history
-        conversation["message_history"].append({"role": "bot", "content": result["advice"], "timestamp": datetime.utcnow()})
-        
-        return jsonify({
-            "response": result["advice"],
-            "analysis": result,
-            "is_emergency": True
-        })
-    
-    # Check if this is a medical query
-    medical_keywords = [
-        'pain', 'hurt', 'sick', 'fever', 'cough', 'headache', 'nausea', 
-        'vomit', 'dizzy', 'rash', 'swollen', 'bleed', 'breath', 'chest',
-        'stomach', 'throat', 'cold', 'flu', 'symptom', 'feel', 'unwell'
-    ]
-    
-    is_medical_query = any(keyword in message.lower() for keyword in medical_keywords)
+    # Use mock for now due to API issues, but you can switch based on preference
+    outcome = await pipeline.run(
+        message, session_id,
+        age=patient_info.get("age"), gender=patient_info.get("gender"),
+        patient_name=patient_info.get("patient_name"),
+        use_api="mock", require_medical=True,
+        bypass_cache=bool(data.get("bypass_cache")), deadline=deadline
+    )
     
-    if not is_medical_query:
-        # General conversation response
-        general_responses = [
-            "I'm here to help with medical concerns. Could you describe any symptoms you're experiencing?",
-            "I specialize in symptom assessment. Please tell me about any health issues you're having.",
-            "For medical assistance, please describe your symptoms and I'll do my best to help.",
-            "I understand you have a question. I'm designed to help with medical symptoms and health concerns. What symptoms are you experiencing?"
-        ]
-        
-        response = general_responses[len(conversation["message_history"]) % len(general_responses)]
+    if outcome.kind == GENERAL:
+        response = GENERAL_RESPONSES[(history_length or 0) % len(GENERAL_RESPONSES)]
         log_message(session_id, "bot", response)
-        conversation["message_history"].append({"role": "bot", "content": response, "timestamp": datetime.utcnow()})
+        conversations.append_messages(
+            conversation_id, {"role": "bot", "content": response, "timestamp": datetime.utcnow().isoformat()})
         
         return jsonify({
             "response": response,
             "is_medical": False
         })
     
-    # Medical query - analyze symptoms
-    try:
-        # Use mock for now due to API issues, but you can switch based on preference
-        use_api = "mock"  # You can make this configurable
-        
-        if use_api == "deepseek" and DEEPSEEK_API_AVAILABLE:
-            result = call_deepseek(message, age=patient_info.get("age"), gender=patient_info.get("gender"))
-            api_name = "deepseek"
-        else:
-            result = call_symptom_api_mock(message, age=patient_info.get("age"), gender=patient_info.get("gender"))
-            api_name = "mock"
-            
-    except Exception as api_error:
-        logger.error(f"API call failed: {api_error}")
-        # Fallback to mock on any API error
-        result = call_symptom_api_mock(message, age=patient_info.get("age"), gender=patient_info.get("gender"))
-        api_name = "mock_fallback"
-        result["api_note"] = "Primary API unavailable - using backup analysis"
-    
-    # Ensure all required keys exist
-    required_keys = ["triage", "conditions", "advice", "selfcare", "warning", "summary"]
-    for key in required_keys:
-        result.setdefault(key, "")
-        
-    if not result.get("selfcare"):
-        result["selfcare"] = ["Stay hydrated and rest."]
-    if not result.get("warning"):
-        result["warning"] = ["Seek medical help if symptoms worsen."]
-    if not result.get("summary"):
-        top_condition = result.get("conditions", [{}])[0].get("name") if result.get("conditions") else None
-        if top_condition:
-            result["summary"] = f"Most likely: {top_condition}. {result.get('advice', 'Follow up with a physician if unsure.')}"
-        else:
-            result["summary"] = "Please consult with a healthcare provider for proper diagnosis."
-            
-    result["patient_name"] = patient_info.get("patient_name")
-    
-    # Log and store results
-    log_result(session_id, api_name, result)
-    log_message(session_id, "bot", result.get("advice", ""))
-    
-    # Add to conversation history
-    conversation["message_history"].append({"role": "bot", "content": result["advice"], "timestamp": datetime.utcnow()})
+    result = outcome.result
+    history_length = conversations.append_messages(
+        conversation_id, {"role": "bot", "content": result["advice"], "timestamp": datetime.utcnow().isoformat()})
     
-    # Prepare follow-up question
-    follow_up_questions = [
-        "Is there anything else you'd like to know about your symptoms?",
-        "Would you like me to clarify anything about this assessment?",
-        "Do you have any other symptoms you'd like to discuss?",
-        "Is there anything else about your health that you're concerned about?"
-    ]
+    if outcome.kind == EMERGENCY:
+        return jsonify({
+            "response": result["advice"],
+            "analysis": result,
+            "is_emergency": True
+        })
     
-    follow_up = follow_up_questions[len(conversation["message_history"]) % len(follow_up_questions)]
+    follow_up = FOLLOW_UP_QUESTIONS[(history_length or 0) % len(FOLLOW_UP_QUESTIONS)]
     
     return jsonify({
         "response": result["advice"],
@@ -707,7 +266,7 @@ def update_patient_info():
     if not conversation_id:
         return jsonify({"error": "No conversation ID provided"}), 400
     
-    conversation = active_conversations.get(conversation_id)
+    conversation = conversations.get(conversation_id)
     if not conversation:
         return jsonify({"error": "Conversation not found"}), 404
     
@@ -716,7 +275,7 @@ def update_patient_info():
     gender = data.get("gender")
     patient_name = data.get("patient_name", "").strip()
     
-    conversation["patient_info"].update({
+    conversations.update_patient_info(conversation_id, {
         "age": age,
         "gender": gender,
         "patient_name": patient_name
@@ -735,7 +294,7 @@ def update_patient_info():
 @app.route("/api/conversation/<conversation_id>", methods=["GET"])
 def get_conversation(conversation_id):
     """Get conversation history"""
-    conversation = active_conversations.get(conversation_id)
+    conversation = conversations.get(conversation_id)
     if not conversation:
         return jsonify({"error": "Conversation not found"}), 404
     
@@ -743,8 +302,8 @@ def get_conversation(conversation_id):
         "conversation_id": conversation_id,
         "session_id": conversation["session_id"],
         "patient_info": conversation["patient_info"],
-        "message_history": conversation["message_history"],
-        "created_at": conversation["created_at"].isoformat()
+        "message_history": list(conversation["message_history"]),
+        "created_at": conversation["created_at"]
     })
 
 @app.route("/api/end_conversation", methods=["POST"])
@@ -756,7 +315,7 @@ def end_conversation():
     if not conversation_id:
         return jsonify({"error": "No conversation ID provided"}), 400
     
-    conversation = active_conversations.get(conversation_id)
+    conversation = conversations.get(conversation_id)
     if not conversation:
         return jsonify({"error": "Conversation not found"}), 404
     
@@ -764,13 +323,14 @@ def end_conversation():
     close_session(conversation["session_id"])
     
     # Remove from active conversations
-    del active_conversations[conversation_id]
+    conversations.delete(conversation_id)
     
     return jsonify({"success": True, "message": "Conversation ended"})
 
 @app.route("/check", methods=["POST"])
-def check():
+async def check():
     """Legacy endpoint for single symptom check (for backward compatibility)"""
+    deadline = _request_deadline()
     data = request.json or {}
     age = data.get("age")
     gender = data.get("gender")
@@ -792,106 +352,278 @@ def check():
         log_message(session_id, "meta", f"patient_name:{patient_name}")
     log_message(session_id, "user", symptoms)
 
-    # quick red-flag handling
-    if has_red_flag(symptoms):
-        logger.info(f"Red flag detected for session {session_id}")
-        result = {
-            "triage": "🚨 Emergency — seek immediate care",
-            "conditions": [{"name": "Potential emergency condition", "probability": 0.8}],
-            "advice": "Symptoms indicate possible emergency. Call emergency services or go to nearest ER immediately.",
-            "selfcare": ["Do not delay - go to emergency department"],
-            "warning": [
-                "Severe chest pain or pressure",
-                "Difficulty breathing or shortness of breath", 
-                "Loss of consciousness or sudden confusion"
-            ],
-            "summary": "Immediate emergency care is recommended based on the symptoms you provided.",
-            "patient_name": patient_name,
-            "red_flag": True
-        }
-        log_result(session_id, "redflag", result)
-        log_message(session_id, "bot", result["advice"])
-        close_session(session_id)
-        return jsonify({"session_id": session_id, "result": result})
+    outcome = await pipeline.run(
+        symptoms, session_id, age=age, gender=gender, patient_name=patient_name, use_api=use_api,
+        bypass_cache=bool(data.get("bypass_cache")), deadline=deadline
+    )
+    close_session(session_id)
 
-    # Call chosen API
-    logger.info(f"Calling API: {use_api} for session {session_id}")
-    
-    if use_api == "deepseek" and DEEPSEEK_API_AVAILABLE:
-        result = call_deepseek(symptoms, age=age, gender=gender)
-        api_name = "deepseek"
-    else:
-        result = call_symptom_api_mock(symptoms, age=age, gender=gender)
-        api_name = "mock"
+    logger.info("Session %s completed successfully", session_id)
+    return jsonify({"session_id": session_id, "result": outcome.result})
 
-    # Ensure all required keys exist
-    required_keys = ["triage", "conditions", "advice", "selfcare", "warning", "summary"]
-    for key in required_keys:
-        result.setdefault(key, "")
-        
-    if not result.get("selfcare"):
-        result["selfcare"] = ["Stay hydrated and rest."]
-    if not result.get("warning"):
-        result["warning"] = ["Seek medical help if symptoms worsen."]
-    if not result.get("summary"):
-        top_condition = result.get("conditions", [{}])[0].get("name") if result.get("conditions") else None
-        if top_condition:
-            result["summary"] = f"Most likely: {top_condition}. {result.get('advice', 'Follow up with a physician if unsure.')}"
+# /check/batch: up to BATCH_MAX_RECORDS records per request, with at most
+# BATCH_CONCURRENCY provider calls in flight for any one batch.
+BATCH_MAX_RECORDS = int(os.getenv("BATCH_MAX_RECORDS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+
+@app.route("/check/batch", methods=["POST"])
+async def check_batch():
+    """Triage many records in one request, streamed back as NDJSON.
+
+    Body: {"records": [{"symptoms", "age", "gender", "patient_name", "id"}],
+    "use_api", "bypass_cache"}.  Red flags are screened over the whole batch
+    in one pass, identical presentations are triaged once, and every
+    session, message and result is written in a single transaction.  Each
+    output line is {"index", "id", "session_id", "result"}, or
+    {"index", "id", "error"} for a record that couldn't be triaged.
+    """
+    deadline = _request_deadline()
+    data = request.json or {}
+    records = data.get("records")
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "Please send a non-empty list of records."}), 400
+    if len(records) > BATCH_MAX_RECORDS:
+        return jsonify({"error": f"At most {BATCH_MAX_RECORDS} records per batch."}), 413
+    use_api = data.get("use_api", "mock")
+    api_name = pipeline.select_api(use_api)
+
+    items = []
+    for index, record in enumerate(records):
+        record = record if isinstance(record, dict) else {}
+        items.append({
+            "index": index,
+            "id": record.get("id"),
+            "symptoms": (record.get("symptoms", "") or "").strip(),
+            "age": record.get("age"),
+            "gender": record.get("gender"),
+            "patient_name": (record.get("patient_name", "") or "").strip(),
+        })
+    valid = [item for item in items if item["symptoms"]]
+
+    for item, red_flag in zip(valid, pipeline.screen_many([item["symptoms"] for item in valid])):
+        item["red_flag"] = red_flag
+        if not red_flag:
+            # Text with no cache key can't be deduplicated either; it gets its own slot
+            item["cache_key"] = (triage_cache_key(api_name, item["symptoms"], item["age"], item["gender"])
+                                 or ("uncached", item["index"]))
+    pending = {item["cache_key"]: (item["symptoms"], item["age"], item["gender"])
+               for item in valid if not item["red_flag"]}
+    RED_FLAGS.inc(sum(item["red_flag"] for item in valid))
+    logger.info("Batch of %d records: %d red flag or duplicate, %d distinct presentations for %s",
+                len(items), len(valid) - len(pending), len(pending), api_name)
+    triaged = await pipeline.provide_many(pending, api_name, bool(data.get("bypass_cache")), deadline,
+                                          concurrency=BATCH_CONCURRENCY)
+
+    entries = []
+    start_time = datetime.utcnow()
+    for item in valid:
+        if item["red_flag"]:
+            item["api_name"], result = "redflag", emergency_result(item["patient_name"])
         else:
-            result["summary"] = "Please consult with a healthcare provider for proper diagnosis."
-            
-    result["patient_name"] = patient_name
+            result = pipeline.normalize(dict(triaged[item["cache_key"]]), item["patient_name"])
+            item["api_name"] = fallback_api_name(api_name, result)
+        item["result"] = result
+        messages = [("meta", f"patient_name:{item['patient_name']}")] if item["patient_name"] else []
+        messages += [("user", item["symptoms"]), ("bot", result.get("advice", ""))]
+        age = item["age"]
+        entries.append({
+            "start_time": start_time,
+            "age": (int(age) if age and str(age).isdigit() else None),
+            "gender": (item["gender"] or None),
+            "patient_name": (item["patient_name"] or None),
+            "messages": messages,
+            "api_name": item["api_name"],
+            "result": result,
+        })
+    for item, session_id in zip(valid, log_sessions_batch(entries)):
+        item["session_id"] = session_id
+    logger.info("Batch of %d records stored as %d sessions", len(items), len(valid))
 
-    # Log and finish
-    log_result(session_id, api_name, result)
-    log_message(session_id, "bot", result.get("advice",""))
-    close_session(session_id)
+    def generate():
+        for item in items:
+            if "session_id" in item:
+                line = {"index": item["index"], "id": item["id"],
+                        "session_id": item["session_id"], "result": item["result"]}
+            else:
+                line = {"index": item["index"], "id": item["id"], "error": "Please enter symptoms."}
+            yield json.dumps(line) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _relay_sse(events):
+    """Send a pipeline's ``(event, data)`` pairs as SSE; returns what ``events`` returns"""
+    outcome = None
+
+    def run():
+        nonlocal outcome
+        outcome = yield from events
+
+    for event, data in run():
+        yield _sse(event, data)
+    return outcome
+
+@app.route("/check/stream", methods=["POST"])
+def check_stream():
+    """/check as Server-Sent Events.
+
+    Events: ``session`` first, then ``token`` (raw model text, DeepSeek
+    only) and ``field`` (each top-level triage field as soon as it is
+    complete), and finally ``result`` with the same body /check returns.
+    If a DeepSeek stream fails after sending fields, ``reset`` says to
+    discard them; the backup answer's fields follow.
+    """
+    deadline = _request_deadline()
+    data = request.json or {}
+    age = data.get("age")
+    gender = data.get("gender")
+    patient_name = (data.get("patient_name","") or "").strip()
+    symptoms = (data.get("symptoms","") or "").strip()
+    use_api = data.get("use_api", "mock")
+
+    if not symptoms:
+        return jsonify({"error":"Please enter symptoms."}), 400
+
+    session_id = create_session(
+        start_time=datetime.utcnow(),
+        age=(int(age) if age and str(age).isdigit() else None),
+        gender=(gender or None),
+        patient_name=(patient_name or None)
+    )
+    if patient_name:
+        log_message(session_id, "meta", f"patient_name:{patient_name}")
+    log_message(session_id, "user", symptoms)
+
+    def events():
+        yield _sse("session", {"session_id": session_id})
+        streamed = False
+        started = time.perf_counter()
+        if pipeline.classify(pipeline.screen(symptoms)) == EMERGENCY:
+            logger.info("Red flag detected for session %s", session_id)
+            RED_FLAGS.inc()
+            api_name, result = "redflag", emergency_result(patient_name)
+        else:
+            api_name, result, _, streamed = yield from _relay_sse(pipeline.provide_stream(
+                symptoms, age, gender, pipeline.select_api(use_api), bool(data.get("bypass_cache")), deadline))
+            pipeline.normalize(result, patient_name)
+        PROVIDER_SECONDS.labels(api_name).observe(time.perf_counter() - started)
+        if not streamed:
+            # Nothing to wait for: send the fields in one go
+            for name, value in result.items():
+                yield _sse("field", {"name": name, "value": value})
+
+        pipeline.persist(session_id, api_name, result)
+        close_session(session_id)
+        yield _sse("result", {"session_id": session_id, "result": result})
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_FILTERS = ("start_date", "end_date", "gender", "age_band", "triage_level")
 
-    logger.info(f"Session {session_id} completed successfully")
-    return jsonify({"session_id": session_id, "result": result})
+def _history_query_args():
+    """Read the page size, cursor and filters for /history from the query string"""
+    args = request.args
+    try:
+        limit = min(max(int(args.get("limit", HISTORY_PAGE_SIZE)), 1), 500)
+    except ValueError:
+        limit = HISTORY_PAGE_SIZE
+    filters = {name: args.get(name) for name in HISTORY_FILTERS if args.get(name)}
+    return limit, args.get("cursor") or None, filters
+
+def _session_row_to_dict(r):
+    return {
+        "id": r["id"],
+        "session_hash": r["session_hash"],
+        "start_time": r["start_time"],
+        "age": r["age"],
+        "gender": r["gender"],
+        "patient_name": r["patient_name"],
+        "triage_level": r["triage_level"]
+    }
 
 @app.route("/history", methods=["GET"])
 def history():
+    limit, cursor, filters = _history_query_args()
     try:
-        rows = get_sessions(100)
-        sessions = []
-        for r in rows:
-            sessions.append({
-                "id": r[0],
-                "session_hash": r[1],
-                "start_time": r[2],
-                "age": r[3],
-                "gender": r[4],
-                "patient_name": r[5] if len(r) > 5 else None
-            })
-        return render_template("history.html", sessions=sessions)
+        page = get_sessions_page(limit=limit, cursor=cursor, **filters)
+        sessions = [_session_row_to_dict(r) for r in page["sessions"]]
+        next_url = None
+        if page["next_cursor"]:
+            next_url = url_for("history", cursor=page["next_cursor"], limit=limit, **filters)
+        return render_template("history.html", sessions=sessions, filters=filters, next_url=next_url,
+                               age_bands=AGE_BANDS, triage_levels=TRIAGE_LEVELS)
+    except ValueError as e:
+        return render_template("history.html", sessions=[], filters=filters, next_url=None,
+                               age_bands=AGE_BANDS, triage_levels=TRIAGE_LEVELS, error=str(e)), 400
     except Exception as e:
-        logger.error(f"Error loading history: {e}")
-        return render_template("history.html", sessions=[])
+        logger.error("Error loading history: %s", e)
+        return render_template("history.html", sessions=[], filters=filters, next_url=None,
+                               age_bands=AGE_BANDS, triage_levels=TRIAGE_LEVELS)
+
+@app.route("/api/history", methods=["GET"])
+def history_json():
+    """Keyset-paginated session list; pass next_cursor back as ?cursor= for the next page"""
+    limit, cursor, filters = _history_query_args()
+    try:
+        page = get_sessions_page(limit=limit, cursor=cursor, **filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "sessions": [_session_row_to_dict(r) for r in page["sessions"]],
+        "next_cursor": page["next_cursor"]
+    })
 
 @app.route("/history/<int:session_id>", methods=["GET"])
 def view_session(session_id):
     try:
-        messages = get_messages_for_session(session_id)
-        results = get_results_for_session(session_id)
-        return render_template("session_view.html", session_id=session_id, messages=messages, results=results)
+        timeline = get_session_timeline(session_id)
+        return render_template("session_view.html", session_id=session_id,
+                               messages=timeline["messages"], results=timeline["analyses"][::-1])
     except Exception as e:
-        logger.error(f"Error viewing session {session_id}: {e}")
+        logger.error("Error viewing session %s: %s", session_id, e)
         return render_template("session_view.html", session_id=session_id, messages=[], results=[])
 
 @app.route("/conversation/<int:session_id>", methods=["GET"])
 def view_conversation(session_id):
     """View full conversation for a session"""
     try:
-        conversation = get_conversation_history(session_id)
+        conversation = get_session_timeline(session_id)
         return render_template("conversation_view.html", 
                              session_id=session_id, 
                              conversation=conversation)
     except Exception as e:
-        logger.error(f"Error viewing conversation {session_id}: {e}")
+        logger.error("Error viewing conversation %s: %s", session_id, e)
         return render_template("conversation_view.html", 
                              session_id=session_id, 
-                             conversation=[])
+                             conversation={"messages": [], "analyses": [], "timeline": []})
+
+def _collect_app_metrics():
+    cache = pipeline.cache.stats()
+    breaker = DEEPSEEK_BREAKER.stats()
+    return [
+        ("triage_cache_hits_total", "counter", "Triage cache hits by tier",
+         [({"tier": "memory"}, cache["memory_hits"]), ({"tier": "sqlite"}, cache["sqlite_hits"])]),
+        ("triage_cache_misses_total", "counter", "Triage cache misses", [({}, cache["misses"])]),
+        ("triage_cache_bypasses_total", "counter", "Requests that skipped the triage cache", [({}, cache["bypasses"])]),
+        ("deepseek_calls_coalesced_total", "counter", "DeepSeek triages that joined an identical in-flight call",
+         [({}, pipeline.flights.stats()["coalesced"])]),
+        ("deepseek_circuit_open", "gauge", "1 while the DeepSeek circuit breaker is open",
+         [({}, int(breaker["state"] == "open"))]),
+        ("deepseek_circuit_rejected_total", "counter", "DeepSeek calls refused by the open circuit",
+         [({}, breaker["rejected"])]),
+        ("active_conversations", "gauge", "Live chat conversations", [({}, len(conversations))]),
+    ]
+
+metrics.register_collector(_collect_app_metrics)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus text exposition of every metric in the process"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 # Health check endpoints
 @app.route("/health", methods=["GET"])
@@ -900,7 +632,11 @@ def health_check():
         "status": "healthy", 
         "timestamp": datetime.utcnow().isoformat(),
         "deepseek_api_available": DEEPSEEK_API_AVAILABLE,
-        "active_conversations": len(active_conversations)
+        "active_conversations": len(conversations),
+        "conversation_store": conversations.stats(),
+        "triage_cache": pipeline.cache.stats(),
+        "deepseek_single_flight": pipeline.flights.stats(),
+        "db_journal": journal_stats()
     })
 
 @app.route("/debug/api-status", methods=["GET"])
@@ -910,29 +646,23 @@ def api_status():
         "deepseek_api_key_set": bool(deepseek_key),
         "deepseek_key_length": len(deepseek_key) if deepseek_key else 0,
         "deepseek_api_available": DEEPSEEK_API_AVAILABLE,
+        "deepseek_circuit": DEEPSEEK_BREAKER.stats(),
+        "deepseek_hedging": DEEPSEEK_HEDGING.stats(),
         "environment_loaded": True,
-        "active_conversations": len(active_conversations)
+        "active_conversations": len(conversations)
     })
 
-# Clean up old conversations (basic implementation)
+# Clean up old conversations
 def cleanup_old_conversations():
-    """Remove conversations older than 24 hours"""
-    current_time = datetime.utcnow()
-    expired_conversations = []
-    
-    for conv_id, conv_data in active_conversations.items():
-        if (current_time - conv_data["created_at"]).total_seconds() > 24 * 3600:  # 24 hours
-            expired_conversations.append(conv_id)
-    
-    for conv_id in expired_conversations:
-        close_session(active_conversations[conv_id]["session_id"])
-        del active_conversations[conv_id]
-    
-    if expired_conversations:
-        logger.info(f"Cleaned up {len(expired_conversations)} expired conversations")
+    """Drop conversations idle past their TTL (eviction also happens on access)"""
+    expired = conversations.purge_expired()
+    if expired:
+        logger.info("Cleaned up %d expired conversations", expired)
+    expired = pipeline.cache.purge_expired()
+    if expired:
+        logger.info("Cleaned up %d expired triage cache entries", expired)
 
 if __name__ == "__main__":
     # Clean up on startup
     cleanup_old_conversations()
->>>>>>> c90d239 (Initial commit)
-    app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,114 @@
+# benchmarks/bench_async_triage.py
+"""Concurrency vs. throughput: blocking call_deepseek on worker threads vs. the async client.
+
+The blocking side models a WSGI server: a fixed pool of worker threads
+(--workers), each tied up for the whole LLM round trip, so throughput
+tops out at workers / latency however many callers are waiting.  The
+async side runs every caller as a coroutine on the shared client loop.
+Both hit a local fake DeepSeek server with --latency-ms of think time,
+run in its own process so it doesn't compete with the client for the GIL.
+
+    python benchmarks/bench_async_triage.py --latency-ms 200 --workers 8
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_deepseek import FakeDeepSeekServer
+
+
+def serve(latency_ms, conn):
+    server = FakeDeepSeekServer(latency_ms=latency_ms)
+    conn.send(server.url)
+    server._server.serve_forever()
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed):
+    latencies.sort()
+    return len(latencies) / elapsed, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000
+
+
+def run_blocking(symptom_api, concurrency, calls, workers):
+    # Every caller arrives at once and queues for a worker, like requests
+    # queueing in front of a WSGI server
+    def one(i):
+        t0 = time.perf_counter()
+        symptom_api.call_deepseek(f"fever and cough {i}")
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    latencies = []
+    with ThreadPoolExecutor(max_workers=min(workers, concurrency)) as pool:
+        for start in range(0, calls, concurrency):
+            submitted = time.perf_counter()
+            futures = [pool.submit(one, i) for i in range(start, min(start + concurrency, calls))]
+            for f in futures:
+                f.result()
+                latencies.append(time.perf_counter() - submitted)
+    return summarize(latencies, time.perf_counter() - t0)
+
+
+def run_async(symptom_api, concurrency, calls):
+    async def wave(start):
+        submitted = time.perf_counter()
+
+        async def one(i):
+            await symptom_api.call_deepseek_async(f"fever and cough {i}")
+            return time.perf_counter() - submitted
+        return await asyncio.gather(*(one(i) for i in range(start, min(start + concurrency, calls))))
+
+    async def all_waves():
+        latencies = []
+        for start in range(0, calls, concurrency):
+            latencies.extend(await wave(start))
+        return latencies
+
+    t0 = time.perf_counter()
+    latencies = symptom_api.run_on_async_loop(all_waves()).result()
+    return summarize(latencies, time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--workers", type=int, default=8, help="blocking worker threads")
+    parser.add_argument("--concurrency", default="1,8,32,128,256,512")
+    parser.add_argument("--waves", type=int, default=2, help="bursts of --concurrency callers per level")
+    args = parser.parse_args()
+
+    parent_conn, child_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(args.latency_ms, child_conn), daemon=True)
+    server.start()
+    os.environ["DEEPSEEK_API_URL"] = parent_conn.recv()
+    os.environ["DEEPSEEK_API_KEY"] = "bench-key"
+    import symptom_api
+
+    print(f"upstream latency {args.latency_ms:.0f} ms, {args.workers} blocking workers")
+    print(f"{'callers':>8} | {'blocking calls/s':>16} {'p50 ms':>8} {'p99 ms':>8} | "
+          f"{'async calls/s':>13} {'p50 ms':>8} {'p99 ms':>8}")
+    # call_deepseek still prints progress on every call; keep it off the report
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        calls = concurrency * args.waves
+        with contextlib.redirect_stdout(io.StringIO()):
+            blocking = run_blocking(symptom_api, concurrency, calls, args.workers)
+            asynchronous = run_async(symptom_api, concurrency, calls)
+        print(f"{concurrency:>8} | {blocking[0]:>16.0f} {blocking[1]:>8.0f} {blocking[2]:>8.0f} | "
+              f"{asynchronous[0]:>13.0f} {asynchronous[1]:>8.0f} {asynchronous[2]:>8.0f}")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
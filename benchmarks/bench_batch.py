@@ -0,0 +1,74 @@
+# benchmarks/bench_batch.py
+"""Triaging N records: N /check requests vs. one /check/batch request.
+
+Every record is a distinct presentation (so nothing is served from the
+triage cache) and one in ten has a red flag.  use_api=deepseek goes to a
+local fake DeepSeek server with the given latency; the per-record run
+posts one record at a time, as a client looping over /check would.  Uses
+a throwaway database.
+
+    python benchmarks/bench_batch.py --records 200 --latency-ms 100
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_deepseek import FakeDeepSeekServer
+
+
+def make_records(count):
+    records = []
+    for i in range(count):
+        symptoms = f"chest pain since morning {i}" if i % 10 == 0 else f"fever and cough for {i} days"
+        records.append({"id": i, "symptoms": symptoms, "age": str(20 + i % 60), "gender": ("male", "female")[i % 2]})
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--api", choices=("deepseek", "mock"), default="deepseek")
+    args = parser.parse_args()
+
+    server = FakeDeepSeekServer(latency_ms=args.latency_ms).start()
+    os.environ.update({
+        "DEEPSEEK_API_URL": server.url, "DEEPSEEK_API_KEY": "bench-key",
+        "SYMPTOM_DB_PATH": os.path.join(tempfile.mkdtemp(), "bench.db"),
+    })
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+    client = app_module.app.test_client()
+    records = make_records(args.records)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        for record in records:
+            response = client.post("/check", json=dict(record, use_api=args.api, bypass_cache=True))
+            assert response.status_code == 200
+        single = time.perf_counter() - t0
+        single_requests = server.requests
+
+        t0 = time.perf_counter()
+        response = client.post("/check/batch", json={"records": records, "use_api": args.api, "bypass_cache": True})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        batch = time.perf_counter() - t0
+    assert len(lines) == args.records and all("session_id" in line for line in lines)
+
+    print(f"{args.records} records, use_api={args.api}, upstream {args.latency_ms:.0f} ms, "
+          f"batch concurrency {app_module.BATCH_CONCURRENCY}")
+    print(f"{'':<12} {'total s':>8} {'records/s':>10} {'upstream':>9}")
+    print(f"{'/check':<12} {single:>8.2f} {args.records / single:>10.1f} {single_requests:>9}")
+    print(f"{'/check/batch':<12} {batch:>8.2f} {args.records / batch:>10.1f} {server.requests - single_requests:>9}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_circuit_breaker.py
+"""Triage latency during an upstream brownout, with and without the circuit breaker.
+
+The fake DeepSeek server answers slower than DEEPSEEK_TIMEOUT, so every
+call that goes upstream times out and falls back to the mock.  Without
+the breaker each call waits out the full timeout; with it, calls fail
+fast once the breaker has seen --min-calls bad outcomes.
+
+    python benchmarks/bench_circuit_breaker.py --timeout 1 --calls 200
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_deepseek import FakeDeepSeekServer
+
+
+def run(symptom_api, calls, threads):
+    def one(i):
+        t0 = time.perf_counter()
+        result = symptom_api.call_deepseek(f"fever and cough {i}")
+        assert "api_note" in result
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = sorted(pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - t0
+    return (elapsed, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--timeout", type=float, default=1.0, help="DEEPSEEK_TIMEOUT in seconds")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--min-calls", type=int, default=10)
+    args = parser.parse_args()
+
+    server = FakeDeepSeekServer(latency_ms=args.timeout * 3000).start()
+    os.environ.update({"DEEPSEEK_API_URL": server.url, "DEEPSEEK_API_KEY": "bench-key",
+                       "DEEPSEEK_TIMEOUT": str(args.timeout)})
+    import symptom_api
+    from circuit_breaker import CircuitBreaker
+
+    print(f"upstream slower than the {args.timeout}s timeout; {args.calls} calls on {args.threads} threads")
+    print(f"{'':<10} {'total s':>8} {'p50 ms':>9} {'p99 ms':>9} {'upstream calls':>15}")
+    for label, min_calls in (("no breaker", 10 ** 9), ("breaker", args.min_calls)):
+        symptom_api.DEEPSEEK_BREAKER = CircuitBreaker(min_calls=min_calls, open_seconds=300)
+        before = server.requests
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed, p50, p99 = run(symptom_api, args.calls, args.threads)
+        print(f"{label:<10} {elapsed:>8.1f} {p50:>9.2f} {p99:>9.1f} {server.requests - before:>15}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
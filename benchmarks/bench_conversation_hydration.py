@@ -0,0 +1,104 @@
+# benchmarks/bench_conversation_hydration.py
+"""Conversation hydration benchmark: two-query eager decode vs. one-query timeline.
+
+Builds sessions with hundreds of chat turns (user message, analysis, bot
+reply) and times loading them for /conversation/<id>, both as a bare load
+and including the template render.
+
+    python benchmarks/bench_conversation_hydration.py --turns 300 --repeat 200
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_helpers
+
+SAMPLE_RESULT = {
+    "triage": "See GP within 24-48 hours",
+    "conditions": [
+        {"name": "Common cold / viral upper respiratory infection", "probability": 0.55},
+        {"name": "Influenza (flu)", "probability": 0.30},
+        {"name": "Acute bronchitis", "probability": 0.10},
+    ],
+    "advice": "Rest, stay hydrated; consider paracetamol for fever. Monitor breathing closely.",
+    "selfcare": ["Drink warm fluids and rest.", "Take paracetamol for fever (follow dosing).", "Gargle warm salt water."],
+    "warning": ["Difficulty breathing", "High fever >3 days", "Bluish lips or chest pain"],
+    "summary": "Your symptoms suggest a viral respiratory infection; monitor breathing closely.",
+}
+
+
+def two_query_history(session_id):
+    """The pre-timeline get_conversation_history: two queries, eager json.loads.
+
+    The timeline conversation_view.html renders is merged in Python here.
+    """
+    with db_helpers.get_pool().connection() as conn:
+        cursor = conn.execute(db_helpers.SELECT_MESSAGES_SQL, (session_id,))
+        messages = [dict(row, kind="message") for row in cursor.fetchall()]
+        rows = conn.execute(db_helpers.SELECT_RESULTS_SQL, (session_id,)).fetchall()
+    analyses = []
+    for row in rows:
+        try:
+            analyses.append({"kind": "analysis", "readable": True, "api_name": row[0],
+                             "result": json.loads(row[1]), "timestamp": row[2]})
+        except json.JSONDecodeError:
+            continue
+    timeline = sorted(messages + analyses, key=lambda entry: entry["timestamp"])
+    return {"messages": messages, "analyses": analyses, "timeline": timeline}
+
+
+def seed(turns):
+    session_id = db_helpers.create_session(start_time=datetime.utcnow())
+    for i in range(turns):
+        db_helpers.log_message(session_id, "user", f"symptom update {i}: fever and cough")
+        db_helpers.log_result(session_id, "mock", SAMPLE_RESULT)
+        db_helpers.log_message(session_id, "bot", SAMPLE_RESULT["advice"])
+    return session_id
+
+
+def timed(fn, repeat):
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    db_helpers.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_hydration_"), "bench.db")
+    db_helpers.init_db(profile="wal")
+    session_id = seed(args.turns)
+
+    # Imported late so app.init_db() runs against the scratch database
+    os.environ["SYMPTOM_DB_PATH"] = db_helpers.DB_PATH
+    from app import app
+    template = app.jinja_env.get_template("conversation_view.html")
+
+    def render(conversation):
+        with app.test_request_context():
+            return template.render(session_id=session_id, conversation=conversation)
+
+    rows = [
+        ("two queries, eager decode", lambda: two_query_history(session_id)),
+        ("one query, lazy decode", lambda: db_helpers.get_session_timeline(session_id)),
+        ("two queries + render", lambda: render(two_query_history(session_id))),
+        ("one query + render", lambda: render(db_helpers.get_session_timeline(session_id))),
+    ]
+    print(f"session with {args.turns} turns ({args.turns * 2} messages, {args.turns} analyses)")
+    for label, fn in rows:
+        print(f"  {label:<28} {timed(fn, args.repeat):8.3f} ms/load")
+
+
+if __name__ == "__main__":
+    main()
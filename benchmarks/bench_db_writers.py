@@ -0,0 +1,106 @@
+# benchmarks/bench_db_writers.py
+"""Concurrent-writer benchmark for the db_helpers storage profiles.
+
+Drives N threads of log_message/log_result against a scratch database for
+each storage profile (and journal mode) and reports writes/sec and latency
+percentiles.  Async-journal throughput includes the final flush.
+
+    python benchmarks/bench_db_writers.py --threads 8 --ops 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_helpers
+
+SAMPLE_RESULT = {
+    "triage": "See GP within 24-48 hours",
+    "conditions": [{"name": "Influenza (flu)", "probability": 0.3}],
+    "advice": "Rest, stay hydrated.",
+    "selfcare": ["Drink warm fluids and rest."],
+    "warning": ["Difficulty breathing"],
+    "summary": "Likely a viral respiratory infection.",
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_profile(profile, threads, ops, journal="strict"):
+    workdir = tempfile.mkdtemp(prefix=f"bench_{profile}_")
+    db_helpers.DB_PATH = os.path.join(workdir, "bench.db")
+    db_helpers.init_db(profile=profile)
+    db_helpers.configure_journal(journal)
+    session_ids = [db_helpers.create_session(start_time=f"{datetime.utcnow()}-{i}") for i in range(threads)]
+
+    latencies = [[] for _ in range(threads)]
+    errors = [0] * threads
+    start_gate = threading.Barrier(threads + 1)
+
+    def worker(index):
+        session_id = session_ids[index]
+        record = latencies[index].append
+        start_gate.wait()
+        for i in range(ops):
+            t0 = time.perf_counter()
+            try:
+                if i % 3 == 1:
+                    db_helpers.log_result(session_id, "mock", SAMPLE_RESULT)
+                else:
+                    db_helpers.log_message(session_id, "user" if i % 3 == 0 else "bot", f"message {i}")
+            except Exception:
+                errors[index] += 1
+            record(time.perf_counter() - t0)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    start_gate.wait()
+    t0 = time.perf_counter()
+    for w in workers:
+        w.join()
+    db_helpers.flush_journal()
+    elapsed = time.perf_counter() - t0
+    db_helpers.shutdown_journal()
+    db_helpers.close_pool()
+
+    all_latencies = sorted(l for per_thread in latencies for l in per_thread)
+    return {
+        "profile": f"{profile}/{journal}",
+        "writes": len(all_latencies),
+        "errors": sum(errors),
+        "writes_per_sec": len(all_latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(all_latencies, 50) * 1000,
+        "p99_ms": percentile(all_latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=300, help="writes per thread")
+    parser.add_argument("--profiles", default=",".join(db_helpers.STORAGE_PROFILES))
+    parser.add_argument("--journal", default="strict,async",
+                        help="comma-separated journal modes to run for each profile")
+    args = parser.parse_args()
+
+    print(f"{'profile':<14} {'writes':>8} {'errors':>7} {'writes/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for profile in args.profiles.split(","):
+        for journal in args.journal.split(","):
+            r = run_profile(profile.strip(), args.threads, args.ops, journal.strip())
+            print(f"{r['profile']:<14} {r['writes']:>8} {r['errors']:>7} {r['writes_per_sec']:>10.0f} "
+                  f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_hedging.py
+"""Tail latency with and without hedged DeepSeek requests.
+
+The fake DeepSeek server (in its own process) draws each response time
+from a lognormal distribution: median --median-ms, long right tail set by
+--sigma.  The same stream of async triage calls is run with hedging off
+and on; with it on, a call still unanswered after the recent p95 sends a
+backup copy (for at most --max-rate of calls) and takes the first answer.
+
+    python benchmarks/bench_hedging.py --median-ms 50 --sigma 1.0 --calls 3000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_deepseek import FakeDeepSeekServer, lognormal_latency
+
+
+def serve(median_ms, sigma, conn):
+    server = FakeDeepSeekServer(latency_ms=lognormal_latency(median_ms, sigma, seed=7))
+    conn.send(server.url)
+    server._server.serve_forever()
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(pct / 100.0 * len(sorted_values)))]
+
+
+def run(symptom_api, calls, concurrency, hedge):
+    async def all_calls():
+        gate = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(i):
+            async with gate:
+                t0 = time.perf_counter()
+                result = await symptom_api.call_deepseek_async(f"fever and cough {i}", hedge=hedge)
+                latencies.append(time.perf_counter() - t0)
+                assert "api_note" not in result
+        await asyncio.gather(*(one(i) for i in range(calls)))
+        return sorted(latencies)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return symptom_api.run_on_async_loop(all_calls()).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--median-ms", type=float, default=50)
+    parser.add_argument("--sigma", type=float, default=1.0)
+    parser.add_argument("--calls", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--max-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    parent_conn, child_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(args.median_ms, args.sigma, child_conn), daemon=True)
+    server.start()
+    os.environ.update({"DEEPSEEK_API_URL": parent_conn.recv(), "DEEPSEEK_API_KEY": "bench-key",
+                       "DEEPSEEK_HEDGE_MAX_RATE": str(args.max_rate)})
+    import symptom_api
+    from circuit_breaker import CircuitBreaker
+    # The tail is the point here; don't let the breaker treat it as an outage
+    symptom_api.DEEPSEEK_BREAKER = CircuitBreaker(slow_call_seconds=float("inf"))
+
+    run(symptom_api, 300, args.concurrency, hedge=False)  # warm connections and the p95 estimate
+    print(f"lognormal upstream: median {args.median_ms:.0f} ms, sigma {args.sigma}; "
+          f"{args.calls} calls, {args.concurrency} concurrent")
+    print(f"{'hedging':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'hedge rate':>11}")
+    for hedge in (False, True):
+        before = symptom_api.DEEPSEEK_HEDGING.stats()
+        latencies = run(symptom_api, args.calls, args.concurrency, hedge)
+        after = symptom_api.DEEPSEEK_HEDGING.stats()
+        rate = (after["hedges"] - before["hedges"]) / args.calls
+        print(f"{'on' if hedge else 'off':<8} " + " ".join(
+            f"{percentile(latencies, p) * 1000:>8.1f}" for p in (50, 95, 99)) +
+            f" {percentile(latencies, 99.9) * 1000:>9.1f} {rate:>11.1%}")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
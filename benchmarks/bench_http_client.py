@@ -0,0 +1,102 @@
+# benchmarks/bench_http_client.py
+"""Per-call requests.post vs. the pooled keep-alive session in call_deepseek.
+
+Runs call_deepseek against a local fake DeepSeek server (HTTPS with a
+throwaway self-signed cert by default, so each new connection pays a TCP
+connect and a TLS handshake) and reports mean/p99 latency per call and
+how many connections the server accepted.
+
+    python benchmarks/bench_http_client.py --calls 200 --threads 8
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from fake_deepseek import FakeDeepSeekServer, make_self_signed_cert
+
+
+class PerCallClient:
+    """What call_deepseek did before: module-level requests.post per call"""
+    post = staticmethod(requests.post)
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(symptom_api, server, calls, threads):
+    latencies = []
+    lock = threading.Lock()
+    per_thread = calls // threads
+    connections_before = server.connections
+
+    def worker():
+        local = []
+        for _ in range(per_thread):
+            t0 = time.perf_counter()
+            result = symptom_api.call_deepseek("fever and cough", age=30)
+            local.append(time.perf_counter() - t0)
+            assert result["triage"].startswith("See GP"), result
+        with lock:
+            latencies.extend(local)
+
+    # call_deepseek still prints progress on every call; keep it off the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        t0 = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "calls_per_sec": len(latencies) / elapsed,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "connections": server.connections - connections_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=0, help="fake server think time")
+    parser.add_argument("--no-tls", action="store_true", help="plain HTTP (TCP handshake only)")
+    args = parser.parse_args()
+
+    cert = key = None
+    if not args.no_tls:
+        cert, key = make_self_signed_cert(tempfile.mkdtemp(prefix="fake_deepseek_"))
+        os.environ["REQUESTS_CA_BUNDLE"] = cert
+    server = FakeDeepSeekServer(latency_ms=args.latency_ms, certfile=cert, keyfile=key).start()
+    os.environ["DEEPSEEK_API_URL"] = server.url
+    os.environ["DEEPSEEK_API_KEY"] = "bench-key"
+
+    import symptom_api
+    pooled_session = symptom_api.get_http_session
+
+    print(f"{args.calls} calls on {args.threads} thread(s) to {server.url}")
+    print(f"{'client':<10} {'calls/s':>9} {'mean ms':>9} {'p99 ms':>9} {'connections':>12}")
+    for label, client in (("per-call", lambda: PerCallClient), ("pooled", pooled_session)):
+        symptom_api.get_http_session = client
+        r = run(symptom_api, server, args.calls, args.threads)
+        print(f"{label:<10} {r['calls_per_sec']:>9.0f} {r['mean_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['connections']:>12}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_import_legacy.py
+"""import_legacy.py throughput on a synthetic legacy database.
+
+Builds a throwaway symptom_chatbot.db-style database (legacy schema: ISO
+timestamps, end_time, messages.text, results.response_json) with three
+messages and one result per session, imports it into a fresh database,
+then imports it again to time the already-imported no-op pass.
+
+    python benchmarks/bench_import_legacy.py --sessions 1000000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_helpers
+import import_legacy
+
+LEGACY_SCHEMA = [
+    '''CREATE TABLE sessions (
+      id INTEGER PRIMARY KEY AUTOINCREMENT, session_hash TEXT UNIQUE, start_time TEXT NOT NULL,
+      end_time TEXT, age INTEGER, gender TEXT, patient_name TEXT)''',
+    '''CREATE TABLE messages (
+      id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER NOT NULL, timestamp TEXT NOT NULL,
+      role TEXT NOT NULL, text TEXT NOT NULL, FOREIGN KEY(session_id) REFERENCES sessions(id))''',
+    '''CREATE TABLE results (
+      id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER NOT NULL, timestamp TEXT NOT NULL,
+      api_name TEXT, response_json TEXT NOT NULL, FOREIGN KEY(session_id) REFERENCES sessions(id))''',
+]
+
+RESULT = json.dumps({"triage": "Self-care / monitor",
+                     "conditions": [{"name": "Allergic rhinitis or mild viral illness", "probability": 0.45}],
+                     "advice": "Monitor symptoms; use OTC medicines as needed."})
+
+
+def build_legacy(path, sessions):
+    conn = sqlite3.connect(path)
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    conn.execute("PRAGMA synchronous = OFF")
+    batch = 50000
+    for base in range(0, sessions, batch):
+        ids = range(base + 1, base + 1 + min(batch, sessions - base))
+        ts = "2025-11-16T09:35:01.436344"
+        conn.executemany("INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         [(i, f"{i:016x}", ts, ts, 20 + i % 60, ("male", "female")[i % 2], f"p{i}") for i in ids])
+        conn.executemany("INSERT INTO messages (session_id, timestamp, role, text) VALUES (?, ?, ?, ?)",
+                         [row for i in ids for row in ((i, ts, "meta", f"patient_name:p{i}"),
+                                                       (i, ts, "user", "fever and cough"),
+                                                       (i, ts, "bot", "Monitor symptoms."))])
+        conn.executemany("INSERT INTO results (session_id, timestamp, api_name, response_json) VALUES (?, ?, ?, ?)",
+                         [(i, ts, "mock" if i % 7 else None, RESULT) for i in ids])
+        conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000000)
+    parser.add_argument("--batch", type=int, default=50000)
+    parser.add_argument("--profile", choices=sorted(db_helpers.STORAGE_PROFILES), default="wal")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    legacy = os.path.join(workdir, "symptom_chatbot.db")
+    t0 = time.perf_counter()
+    build_legacy(legacy, args.sessions)
+    rows = 5 * args.sessions
+    print(f"built legacy DB: {args.sessions} sessions, {rows} rows, {os.path.getsize(legacy) / 1e6:.0f} MB "
+          f"in {time.perf_counter() - t0:.1f} s")
+
+    db_helpers.DB_PATH = os.path.join(workdir, "symptom_checker.db")
+    db_helpers.init_db(profile=args.profile)
+    for label in ("import", "re-import"):
+        stats = import_legacy.import_legacy(legacy, batch_size=args.batch)
+        imported = stats["sessions"] + stats["messages"] + stats["results"]
+        print(f"{label:<10} {imported:>9} rows in {stats['seconds']:>7} s  ({stats['rows_per_second']} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_red_flag_matcher.py
+"""Red-flag/keyword screening: per-phrase substring scans vs. the compiled matcher.
+
+The baseline is what send_message used to do: has_red_flag's
+``any(flag in s for flag in RED_FLAGS)`` followed by a second
+``any(keyword in s ...)`` pass over the medical keywords.  Both are timed
+on ~10k-character messages with the shipped phrase lists and with padded
+lists of up to thousands of phrases.  The worst case is a message with no
+hits, where every ``any()`` has to run to the end.
+
+    python benchmarks/bench_red_flag_matcher.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from phrase_matcher import PhraseMatcher
+from symptom_api import RED_FLAGS, MEDICAL_KEYWORDS
+
+FILLER_WORDS = ("the", "patient", "reports", "mild", "tiredness", "since", "yesterday",
+                "after", "walking", "home", "and", "slept", "badly", "with", "some", "worry")
+
+
+def make_text(length, seed):
+    rng = random.Random(seed)
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(FILLER_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def baseline(red_flags, keywords):
+    def screen(text):
+        s = text.lower()
+        flagged = any(flag in s for flag in red_flags)
+        medical = any(keyword in s for keyword in keywords)
+        return flagged, medical
+    return screen
+
+
+def compiled(red_flags, keywords):
+    matcher = PhraseMatcher([(f, "red_flag") for f in red_flags] + [(k, "keyword") for k in keywords],
+                            negation={"red_flag"})
+
+    def screen(text):
+        flagged = medical = False
+        for match in matcher.finditer(text):
+            if match.tag == "red_flag":
+                flagged = flagged or not match.negated
+            else:
+                medical = True
+        return flagged, medical
+    return screen
+
+
+def timed(fn, text, repeat):
+    fn(text)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--length", type=int, default=10000, help="message length in characters")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--sizes", default="0,100,1000,5000",
+                        help="extra synthetic phrases added to each list")
+    args = parser.parse_args()
+
+    text = make_text(args.length, seed=1)
+    print(f"{args.length}-character message without hits, ms per screen")
+    print(f"{'phrases':>8} {'substring':>10} {'compiled':>10}")
+    for extra in (int(x) for x in args.sizes.split(",")):
+        red_flags = RED_FLAGS + [f"redflag term {i}" for i in range(extra // 2)]
+        keywords = MEDICAL_KEYWORDS + [f"keyword{i}" for i in range(extra - extra // 2)]
+        old = timed(baseline(red_flags, keywords), text, args.repeat)
+        new = timed(compiled(red_flags, keywords), text, args.repeat)
+        print(f"{len(red_flags) + len(keywords):>8} {old:>10.3f} {new:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
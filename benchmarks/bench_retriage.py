@@ -0,0 +1,85 @@
+# benchmarks/bench_retriage.py
+"""retriage.py throughput on a synthetic history database.
+
+Builds a throwaway database of /check-shaped sessions (user message,
+result, bot message; one in ten with a red flag, one in twenty with a
+stale mock answer) and re-triages it with the given worker counts,
+reporting rows/s and peak RSS.
+
+    python benchmarks/bench_retriage.py --sessions 1000000 --workers 0 1 4
+"""
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_helpers
+import retriage
+from symptom_api import call_symptom_api_mock
+
+TEXTS = ["fever and cough", "I have a headache", "sore throat since yesterday", "stomach ache and nausea",
+         "rash on my arm", "feeling dizzy", "runny nose", "back pain after lifting"]
+
+
+def build(path, sessions):
+    db_helpers.DB_PATH = path
+    db_helpers.init_db()
+    db_helpers.close_pool()
+    mock = {text: json.dumps(call_symptom_api_mock(text)) for text in TEXTS}
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    batch = 50000
+    for base in range(0, sessions, batch):
+        count = min(batch, sessions - base)
+        ts = "2025-01-01 10:00:00.000000"
+        conn.executemany("INSERT INTO sessions (id, session_hash, start_time) VALUES (?, ?, ?)",
+                         [(base + i + 1, f"h{base + i}", ts) for i in range(count)])
+        messages, results = [], []
+        for i in range(base, base + count):
+            text = "chest pain and " + TEXTS[i % len(TEXTS)] if i % 10 == 0 else TEXTS[i % len(TEXTS)]
+            messages.append((i + 1, "user", text, ts))
+            messages.append((i + 1, "bot", "advice", ts))
+            if i % 10 == 0:
+                results.append((i + 1, "redflag", json.dumps({"triage": "Emergency", "red_flag": True}), ts))
+            elif i % 20 == 5:
+                results.append((i + 1, "mock", json.dumps({"triage": "Old advice"}), ts))
+            else:
+                results.append((i + 1, "mock", mock[text], ts))
+        conn.executemany("INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)", messages)
+        conn.executemany("INSERT INTO results (session_id, api_name, result, timestamp) VALUES (?, ?, ?, ?)", results)
+        conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 4])
+    parser.add_argument("--chunk", type=int, default=2000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    t0 = time.perf_counter()
+    build(path, args.sessions)
+    print(f"built {args.sessions} sessions ({3 * args.sessions} rows) in {time.perf_counter() - t0:.1f} s, "
+          f"{os.path.getsize(path) / 1e6:.0f} MB, {os.cpu_count()} CPUs")
+    db_helpers.DB_PATH = path
+    print(f"{'workers':>8} {'rows':>9} {'diffs':>8} {'seconds':>8} {'rows/s':>9} {'max RSS MB':>11}")
+    for workers in args.workers:
+        with db_helpers.get_pool().connection() as conn:
+            conn.execute("DELETE FROM retriage_diffs")
+        stats = retriage.run_retriage(retriage.TableSink(f"bench-{workers}"), workers=workers, chunk_sessions=args.chunk)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{workers:>8} {stats['rows']:>9} {stats['diffs']:>8} {stats['seconds']:>8} "
+              f"{stats['rows_per_second']:>9} {rss:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
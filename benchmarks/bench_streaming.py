@@ -0,0 +1,76 @@
+# benchmarks/bench_streaming.py
+"""Time to first byte: /check vs. the /check/stream SSE endpoint.
+
+The fake DeepSeek server waits --ttft-ms before the first token and
+--token-ms between tokens, and takes just as long to send an unstreamed
+reply.  /check can't answer until the whole completion is in; /check/stream
+sends each triage field as soon as it is complete.
+
+    python benchmarks/bench_streaming.py --ttft-ms 300 --token-ms 20
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_deepseek import FakeDeepSeekServer
+
+
+def median(values):
+    return sorted(values)[len(values) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args()
+
+    server = FakeDeepSeekServer(latency_ms=args.ttft_ms, token_interval_ms=args.token_ms).start()
+    os.environ.update({
+        "DEEPSEEK_API_URL": server.url, "DEEPSEEK_API_KEY": "bench-key",
+        "SYMPTOM_DB_PATH": os.path.join(tempfile.mkdtemp(), "bench.db"),
+        "TRIAGE_CACHE_MAX": "0",
+    })
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+    client = app_module.app.test_client()
+    body = {"symptoms": "fever and cough", "use_api": "deepseek"}
+
+    whole = []
+    first_byte, first_field, done = [], [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            client.post("/check", json=body)
+            whole.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            response = client.post("/check/stream", json=body, buffered=False)
+            seen_byte = seen_field = False
+            for chunk in response.response:
+                chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+                if not seen_byte and "event: token" in chunk:
+                    first_byte.append(time.perf_counter() - t0)
+                    seen_byte = True
+                if not seen_field and "event: field" in chunk:
+                    first_field.append(time.perf_counter() - t0)
+                    seen_field = True
+            done.append(time.perf_counter() - t0)
+
+    print(f"upstream: {args.ttft_ms:.0f} ms to first token, {args.token_ms:.0f} ms per token; medians")
+    print(f"/check         response      {median(whole):>8.0f} ms")
+    print(f"/check/stream  first token   {median(first_byte):>8.0f} ms")
+    print(f"/check/stream  triage field  {median(first_field):>8.0f} ms")
+    print(f"/check/stream  result        {median(done):>8.0f} ms")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
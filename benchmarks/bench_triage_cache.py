@@ -0,0 +1,69 @@
+# benchmarks/bench_triage_cache.py
+"""/check latency for repeated presentations: triage cache miss vs. hit.
+
+Posts the same quick-symptom texts to /check through the Flask test
+client with use_api=deepseek against a local fake DeepSeek server, first
+with bypass_cache (every request pays the upstream round trip), then
+with the cache warm.  Uses a throwaway database.
+
+    python benchmarks/bench_triage_cache.py --latency-ms 200
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_deepseek import FakeDeepSeekServer
+
+QUICK_SYMPTOMS = ["I have fever", "I have a headache", "I have a cough", "I have a sore throat"]
+
+
+def timed_posts(client, requests):
+    latencies = []
+    for body in requests:
+        t0 = time.perf_counter()
+        response = client.post("/check", json=body)
+        latencies.append(time.perf_counter() - t0)
+        assert response.status_code == 200
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    args = parser.parse_args()
+
+    server = FakeDeepSeekServer(latency_ms=args.latency_ms).start()
+    os.environ.update({
+        "DEEPSEEK_API_URL": server.url, "DEEPSEEK_API_KEY": "bench-key",
+        "SYMPTOM_DB_PATH": os.path.join(tempfile.mkdtemp(), "bench.db"),
+        "TRIAGE_CACHE_BACKEND": args.backend,
+    })
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+    client = app_module.app.test_client()
+    bodies = [{"symptoms": QUICK_SYMPTOMS[i % len(QUICK_SYMPTOMS)], "age": "30", "use_api": "deepseek"}
+              for i in range(args.requests)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        miss = timed_posts(client, [dict(b, bypass_cache=True) for b in bodies])
+        hit = timed_posts(client, bodies)
+    stats = app_module.pipeline.cache.stats()
+    print(f"/check, {args.requests} requests, upstream {args.latency_ms:.0f} ms, {args.backend} cache")
+    print(f"{'':<8} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'bypass':<8} {miss[0]:>8.2f} {miss[1]:>8.2f}")
+    print(f"{'cached':<8} {hit[0]:>8.2f} {hit[1]:>8.2f}")
+    print(f"hits={stats['hits']} misses={stats['misses']} upstream requests={server.requests}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
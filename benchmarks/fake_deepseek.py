@@ -0,0 +1,286 @@
+# benchmarks/fake_deepseek.py
+"""Local stand-in for the DeepSeek /chat/completions endpoint.
+
+Answers every POST with a canned triage completion over HTTP/1.1
+keep-alive, except for the share turned into failures on purpose:
+``error_rate`` of requests get a 503 and ``malformed_rate`` get a
+completion whose content is truncated, unparseable JSON.  Use it from a
+benchmark:
+
+    server = FakeDeepSeekServer(latency_ms=20).start()
+    os.environ["DEEPSEEK_API_URL"] = server.url
+    ...
+    server.stop()
+
+or run it standalone:
+
+    python benchmarks/fake_deepseek.py --port 8089 --latency-ms 200
+    python benchmarks/fake_deepseek.py --latency-median-ms 300 --latency-sigma 0.6 --error-rate 0.02
+"""
+import argparse
+import json
+import math
+import os
+import random
+import ssl
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRIAGE_CONTENT = json.dumps({
+    "triage": "See GP within 24-48 hours",
+    "conditions": [{"name": "Viral upper respiratory infection", "probability": 0.6}],
+    "advice": "Rest, stay hydrated and monitor your temperature.",
+    "selfcare": ["Drink warm fluids", "Rest"],
+    "warning": ["Difficulty breathing", "Fever above 39C for more than 3 days"],
+    "summary": "Likely a viral infection; see a GP if it gets worse.",
+})
+
+
+# Characters per streamed delta, roughly one model token
+STREAM_PIECE_CHARS = 4
+
+
+def _stream_pieces():
+    return -(-len(TRIAGE_CONTENT) // STREAM_PIECE_CHARS)
+
+
+# What a reply cut off mid-generation looks like to the parser
+MALFORMED_CONTENT = TRIAGE_CONTENT[:len(TRIAGE_CONTENT) // 2]
+
+ERROR_BODY = json.dumps({"error": {"message": "Service temporarily unavailable", "type": "server_error"}}).encode()
+
+
+def completion_body(content=TRIAGE_CONTENT):
+    return json.dumps({
+        "id": "fake-completion",
+        "object": "chat.completion",
+        "model": "deepseek-chat",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                     "finish_reason": "stop"}],
+    }).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open between requests
+    # Headers and body go out in separate writes; without TCP_NODELAY the body
+    # waits on the client's delayed ACK (~40 ms) on every reused connection
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            streaming = bool(json.loads(self.rfile.read(length) or b"{}").get("stream"))
+        except ValueError:
+            streaming = False
+        with server.stats_lock:
+            server.requests += 1
+        latency_ms = server.latency_ms() if callable(server.latency_ms) else server.latency_ms
+        delay = latency_ms / 1000.0
+        if delay:
+            time.sleep(delay)
+        outcome = server.draw_outcome()
+        if outcome == "error":
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(ERROR_BODY)))
+            self.end_headers()
+            self.wfile.write(ERROR_BODY)
+            return
+        content = MALFORMED_CONTENT if outcome == "malformed" else TRIAGE_CONTENT
+        if streaming:
+            self._stream(server.token_interval_ms / 1000.0, content)
+            return
+        if server.token_interval_ms:
+            # Unstreamed, the whole reply still has to be generated first
+            time.sleep(server.token_interval_ms / 1000.0 * (_stream_pieces() - 1))
+        body = completion_body(content)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, token_interval, content=TRIAGE_CONTENT):
+        # OpenAI-style SSE deltas over chunked encoding, a few characters each
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(content), STREAM_PIECE_CHARS):
+            if i and token_interval:
+                time.sleep(token_interval)
+            delta = {"choices": [{"index": 0, "delta": {"content": content[i:i + STREAM_PIECE_CHARS]}}]}
+            self._write_chunk(f"data: {json.dumps(delta)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # load tests open hundreds of connections at once
+
+    def __init__(self, address, handler, latency_ms, token_interval_ms=0, error_rate=0.0, malformed_rate=0.0,
+                 seed=None):
+        super().__init__(address, handler)
+        self.latency_ms = latency_ms
+        self.token_interval_ms = token_interval_ms
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.connections = 0
+        self.errors = 0
+        self.malformed = 0
+        self.stats_lock = threading.Lock()
+
+    def draw_outcome(self):
+        """"error", "malformed" or "ok" for the next reply"""
+        if not (self.error_rate or self.malformed_rate):
+            return "ok"
+        with self.stats_lock:
+            draw = self.rng.random()
+            if draw < self.error_rate:
+                self.errors += 1
+                return "error"
+            if draw < self.error_rate + self.malformed_rate:
+                self.malformed += 1
+                return "malformed"
+        return "ok"
+
+    def process_request(self, request, client_address):
+        with self.stats_lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response; that's expected here
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def lognormal_latency(median_ms, sigma, seed=None):
+    """Heavy-tailed latency sampler: most requests near the median, a few far beyond"""
+    rng = random.Random(seed)
+    mu = math.log(median_ms)
+    return lambda: rng.lognormvariate(mu, sigma)
+
+
+def make_self_signed_cert(directory, host="127.0.0.1"):
+    """Create a throwaway cert/key pair with the openssl CLI; returns the paths"""
+    certfile = os.path.join(directory, "fake_deepseek.crt")
+    keyfile = os.path.join(directory, "fake_deepseek.key")
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+        "-subj", f"/CN={host}", "-addext", f"subjectAltName=IP:{host}",
+        "-keyout", keyfile, "-out", certfile,
+    ], check=True, capture_output=True)
+    return certfile, keyfile
+
+
+class FakeDeepSeekServer:
+    """Threaded fake completion server bound to localhost.
+
+    ``latency_ms`` is a fixed think time or a callable drawing one per
+    request (see lognormal_latency); for ``"stream": true`` requests it is
+    the time to first token, and ``token_interval_ms`` spaces the rest.  Pass ``certfile``/``keyfile`` to
+    serve HTTPS, so client benchmarks pay a real TLS handshake per new
+    connection.  ``error_rate`` and ``malformed_rate`` are fractions of
+    requests (drawn from a ``seed``-ed generator) answered with a 503 or
+    with truncated JSON content.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, certfile=None, keyfile=None,
+                 token_interval_ms=0, error_rate=0.0, malformed_rate=0.0, seed=None):
+        self._server = _Server((host, port), _Handler, latency_ms, token_interval_ms, error_rate, malformed_rate,
+                               seed)
+        self.tls = certfile is not None
+        if self.tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        scheme = "https" if self.tls else "http"
+        return f"{scheme}://{host}:{port}/chat/completions"
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+    @property
+    def errors(self):
+        return self._server.errors
+
+    @property
+    def malformed(self):
+        return self._server.malformed
+
+    def stats(self):
+        return {"requests": self.requests, "connections": self.connections, "errors": self.errors,
+                "malformed": self.malformed}
+
+    @property
+    def connections(self):
+        """TCP connections accepted so far (one per handshake)"""
+        return self._server.connections
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def add_fault_arguments(parser):
+    """The latency and failure-injection flags, shared with load_test.py"""
+    parser.add_argument("--latency-ms", type=float, default=0, help="fixed think time per request")
+    parser.add_argument("--latency-median-ms", type=float,
+                        help="draw think times from a lognormal with this median instead")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal shape (default: %(default)s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="fraction of requests answered with unparseable content")
+    parser.add_argument("--seed", type=int, help="seed for the latency and failure draws")
+
+
+def fault_options(args):
+    """FakeDeepSeekServer keyword arguments from add_fault_arguments() flags"""
+    latency = args.latency_ms
+    if args.latency_median_ms:
+        latency = lognormal_latency(args.latency_median_ms, args.latency_sigma, args.seed)
+    return {"latency_ms": latency, "error_rate": args.error_rate, "malformed_rate": args.malformed_rate,
+            "seed": args.seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    server = FakeDeepSeekServer(args.host, args.port, **fault_options(args))
+    print(f"Fake DeepSeek listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# benchmarks/load_test.py
+"""End-to-end load test: chat flows against app.py with a fake DeepSeek.
+
+Each virtual user runs whole conversations back to back:
+start_conversation, then ``--messages`` turns, then end_conversation.
+Turns are mostly distinct symptom descriptions, so most are triage-cache
+misses.  About one in twelve is small talk and about one in twenty-five
+has a red flag.  Small talk is a send_message turn (the chat always
+answers with the mock); every other turn is a /check with the
+conversation's patient details and ``--api``.  With ``--api deepseek``
+those go to a local fake /chat/completions server.  Its latency
+distribution, error rate and malformed-reply rate come from the same
+flags as fake_deepseek.py.
+
+By default the app is served in-process by a threaded werkzeug server,
+on a throwaway database.  ``--target`` points the load at an app that is
+already running; that app is then responsible for its own DeepSeek
+settings.
+
+The report has requests/s, p50/p95/p99 latency (overall and per
+endpoint), the error rate (transport errors and non-2xx responses) and
+the fallback rate (/check turns answered with the backup analysis).  It
+is saved as JSON.  ``--compare`` checks a run against an earlier report and exits
+non-zero when throughput or latency is worse by more than
+``--tolerance``, or when the error rate has grown.
+
+    python benchmarks/load_test.py --users 16 --conversations 200 --messages 4 \\
+        --latency-median-ms 300 --latency-sigma 0.6 --error-rate 0.02 --malformed-rate 0.02
+    python benchmarks/load_test.py ... --compare benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_deepseek import FakeDeepSeekServer, add_fault_arguments, fault_options
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+SYMPTOMS = (
+    "fever and cough for {n} days",
+    "sore throat and runny nose since {n} days ago",
+    "stomach pain and nausea after eating, {n} hours now",
+    "headache and dizziness on and off for {n} days",
+    "itchy rash on my arm for {n} days",
+    "swollen ankle after a fall {n} days ago",
+    "I feel unwell and tired, temperature {n}",
+)
+RED_FLAG_SYMPTOMS = ("chest pain for {n} minutes", "sudden numbness in my left arm", "difficulty breathing")
+SMALL_TALK = ("hello", "thanks for the help", "what can you do?")
+
+# The report fields --compare checks, and which direction is worse
+HIGHER_IS_WORSE = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def message_for(user, conversation, turn):
+    """Deterministic message mix: mostly distinct symptoms, some chat, some red flags"""
+    n = user * 1000 + conversation * 10 + turn
+    if n % 25 == 7:
+        return RED_FLAG_SYMPTOMS[n % len(RED_FLAG_SYMPTOMS)].format(n=n % 60 + 1)
+    if n % 12 == 5:
+        return SMALL_TALK[n % len(SMALL_TALK)]
+    return SYMPTOMS[n % len(SYMPTOMS)].format(n=n)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values), math.ceil(fraction * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+def latency_summary(seconds):
+    values = sorted(seconds)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2),
+    }
+
+
+class LoadRun:
+    """Virtual users sharing a conversation budget; collects one sample per request"""
+
+    def __init__(self, base_url, users, conversations, messages, api, timeout=30.0, duration=None):
+        self.base_url = base_url.rstrip("/")
+        self.users = users
+        self.conversations = conversations
+        self.messages = messages
+        self.api = api
+        self.timeout = timeout
+        self.duration = duration
+        # (endpoint, seconds, ok, fallback)
+        self.samples = []
+        self.flows_completed = 0
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def _claim_conversation(self, stop_at):
+        with self._lock:
+            if self.duration is None and self._started >= self.conversations:
+                return None
+            if stop_at is not None and time.monotonic() >= stop_at:
+                return None
+            self._started += 1
+            return self._started
+
+    def _post(self, http, endpoint, payload):
+        started = time.perf_counter()
+        try:
+            response = http.post(self.base_url + endpoint, json=payload, timeout=self.timeout)
+            body = response.json() if response.headers.get("Content-Type", "").startswith("application/json") else {}
+            ok = 200 <= response.status_code < 300
+        except (requests.RequestException, ValueError):
+            body, ok = {}, False
+        elapsed = time.perf_counter() - started
+        fallback = bool((body.get("analysis") or body.get("result") or {}).get("api_note"))
+        with self._lock:
+            self.samples.append((endpoint, elapsed, ok, fallback))
+        return body if ok else None
+
+    def _user(self, user, stop_at):
+        with requests.Session() as http:
+            while True:
+                number = self._claim_conversation(stop_at)
+                if number is None:
+                    return
+                patient = {"age": str(20 + (user + number) % 60), "gender": ("male", "female")[number % 2],
+                           "patient_name": f"Load {user}-{number}"}
+                started = self._post(http, "/api/start_conversation", patient)
+                if started is None:
+                    continue
+                conversation_id = started["conversation_id"]
+                for turn in range(self.messages):
+                    message = message_for(user, number, turn)
+                    if message in SMALL_TALK:
+                        self._post(http, "/api/send_message", {"conversation_id": conversation_id, "message": message})
+                    else:
+                        self._post(http, "/check", dict(patient, symptoms=message, use_api=self.api))
+                if self._post(http, "/api/end_conversation", {"conversation_id": conversation_id}) is not None:
+                    with self._lock:
+                        self.flows_completed += 1
+
+    def run(self):
+        stop_at = time.monotonic() + self.duration if self.duration else None
+        threads = [threading.Thread(target=self._user, args=(user, stop_at), name=f"load-user-{user}")
+                   for user in range(self.users)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    def report(self, seconds):
+        total = len(self.samples)
+        errors = sum(1 for _, _, ok, _ in self.samples if not ok)
+        turns = [sample for sample in self.samples if sample[0] == "/check"]
+        endpoints = {}
+        for endpoint, elapsed, _, _ in self.samples:
+            endpoints.setdefault(endpoint, []).append(elapsed)
+        return {
+            "seconds": round(seconds, 2),
+            "requests": total,
+            "flows_completed": self.flows_completed,
+            "rps": round(total / seconds, 2) if seconds else None,
+            "error_rate": round(errors / total, 4) if total else None,
+            "fallback_rate": round(sum(1 for s in turns if s[3]) / len(turns), 4) if turns else None,
+            "latency": latency_summary([elapsed for _, elapsed, _, _ in self.samples]),
+            "endpoints": {endpoint: latency_summary(values) for endpoint, values in sorted(endpoints.items())},
+        }
+
+
+def scrape_fallbacks(base_url):
+    """triage_fallbacks_total by reason, from the app's /metrics"""
+    try:
+        text = requests.get(base_url.rstrip("/") + "/metrics", timeout=5).text
+    except requests.RequestException:
+        return {}
+    fallbacks = {}
+    for line in text.splitlines():
+        if line.startswith("triage_fallbacks_total{"):
+            labels, _, value = line.rpartition(" ")
+            fallbacks[labels[labels.index('"') + 1:labels.rindex('"')]] = float(value)
+    return fallbacks
+
+
+def compare(baseline, current, tolerance):
+    """Lines describing each checked metric, and whether any regressed"""
+    rows = [("rps", baseline.get("rps"), current.get("rps"), False)]
+    rows += [(key, baseline["latency"].get(key), current["latency"].get(key), True) for key in HIGHER_IS_WORSE]
+    lines, regressed = [], False
+    for key, before, after, higher_is_worse in rows:
+        if not before or after is None:
+            lines.append(f"{key:<11} {before!s:>10} -> {after!s:>10}")
+            continue
+        change = (after - before) / before
+        worse = change > tolerance if higher_is_worse else change < -tolerance
+        regressed |= worse
+        lines.append(f"{key:<11} {before:>10} -> {after:>10}  {change:+.1%}{'  REGRESSION' if worse else ''}")
+    before, after = baseline.get("error_rate") or 0, current.get("error_rate") or 0
+    worse = after > before + 0.01
+    regressed |= worse
+    lines.append(f"{'error_rate':<11} {before:>10} -> {after:>10}{'  REGRESSION' if worse else ''}")
+    return lines, regressed
+
+
+def serve_app(fake_url):
+    """Import app.py against ``fake_url`` and a throwaway DB; serve it on a free port"""
+    os.environ.update({
+        "DEEPSEEK_API_URL": fake_url, "DEEPSEEK_API_KEY": "load-test-key",
+        "SYMPTOM_DB_PATH": os.path.join(tempfile.mkdtemp(), "load_test.db"),
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LOG_LEVELS", "werkzeug=WARNING")
+    import app as app_module
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", help="base URL of a running app (default: serve app.py in-process)")
+    parser.add_argument("--users", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--conversations", type=int, default=200, help="conversations in total")
+    parser.add_argument("--duration", type=float, help="run for this many seconds instead of --conversations")
+    parser.add_argument("--messages", type=int, default=4, help="turns per conversation")
+    parser.add_argument("--api", choices=("deepseek", "mock"), default="deepseek")
+    parser.add_argument("--timeout", type=float, default=30.0, help="client timeout per request")
+    parser.add_argument("--output", help="report path (default: benchmarks/results/load-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier report to check this run against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed relative change before --compare fails (default: %(default)s)")
+    add_fault_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fake = app_server = None
+    base_url = args.target
+    if base_url is None:
+        fake = FakeDeepSeekServer(**fault_options(args)).start()
+        app_server, base_url = serve_app(fake.url)
+
+    try:
+        run = LoadRun(base_url, args.users, args.conversations, args.messages, args.api, args.timeout,
+                      args.duration)
+        seconds = run.run()
+        report = run.report(seconds)
+        report["triage_fallbacks"] = scrape_fallbacks(base_url)
+        if fake is not None:
+            report["fake_deepseek"] = fake.stats()
+    finally:
+        if app_server is not None:
+            app_server.shutdown()
+        if fake is not None:
+            fake.stop()
+
+    report["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    report["recorded_at"] = datetime.now().isoformat(timespec="seconds")
+    report["python"] = platform.python_version()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{datetime.now():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    latency = report["latency"]
+    print(f"{report['requests']} requests, {report['flows_completed']} flows in {report['seconds']} s: "
+          f"{report['rps']} req/s, errors {report['error_rate']:.2%}, fallbacks {report['fallback_rate'] or 0:.2%}")
+    print(f"{'endpoint':<26} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, summary in [("all", latency)] + list(report["endpoints"].items()):
+        print(f"{endpoint:<26} {summary['count']:>6} {summary.get('p50_ms')!s:>9} "
+              f"{summary.get('p95_ms')!s:>9} {summary.get('p99_ms')!s:>9}")
+    print(f"saved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressed = compare(baseline, report, args.tolerance)
+        print(f"vs {args.compare}:")
+        print("\n".join(lines))
+        if regressed:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
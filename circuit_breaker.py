@@ -0,0 +1,120 @@
+# circuit_breaker.py
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Fail fast while an upstream is erroring or slow.
+
+    Closed: calls go through and their outcomes land in a rolling window of
+    ``window_seconds``.  A call counts as bad if it failed or took longer
+    than ``slow_call_seconds``; once the window holds at least ``min_calls``
+    and the bad share reaches ``failure_rate`` the breaker opens.
+
+    Open: ``allow()`` says no for ``open_seconds``, so callers go straight
+    to their fallback.  After that the breaker half-opens and lets up to
+    ``half_open_probes`` calls through at a time.  A bad probe reopens it;
+    ``half_open_probes`` good ones in a row close it with a fresh window.
+
+    Every call that ``allow()`` lets through must be followed by exactly
+    one ``record()`` (or ``cancel()`` if it was abandoned).
+    """
+
+    def __init__(self, window_seconds=60, min_calls=10, failure_rate=0.5, slow_call_seconds=5.0,
+                 open_seconds=30, half_open_probes=3, clock=time.monotonic):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._window = deque()  # (finished_at, bad)
+        self._bad = 0
+        self.state = CLOSED
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.opened_count = 0
+
+    def _trim(self, now):
+        cutoff = now - self.window_seconds
+        while self._window and self._window[0][0] <= cutoff:
+            self._bad -= self._window.popleft()[1]
+
+    def _open(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.opened_count += 1
+
+    def allow(self):
+        """True if a call may go upstream now; False means use the fallback"""
+        with self._lock:
+            if self.state == OPEN:
+                if self._clock() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    self.rejected += 1
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def record(self, ok, seconds):
+        """Report the outcome of an allowed call: whether it worked and how long it took"""
+        bad = not ok or seconds > self.slow_call_seconds
+        with self._lock:
+            now = self._clock()
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if bad:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self.state = CLOSED
+                        self._window.clear()
+                        self._bad = 0
+                return
+            if self.state == OPEN:
+                # A call let through before the breaker opened
+                return
+            self._window.append((now, bad))
+            self._bad += bad
+            self._trim(now)
+            if len(self._window) >= self.min_calls and self._bad >= self.failure_rate * len(self._window):
+                self._open(now)
+
+    def cancel(self):
+        """An allowed call was abandoned with no outcome (e.g. a losing hedge)"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def stats(self):
+        with self._lock:
+            now = self._clock()
+            if self.state == CLOSED:
+                self._trim(now)
+            calls = len(self._window)
+            return {
+                "state": self.state,
+                "window_calls": calls,
+                "window_bad_calls": self._bad,
+                "window_bad_rate": round(self._bad / calls, 4) if calls else None,
+                "retry_in_seconds": (round(max(0.0, self._opened_at + self.open_seconds - now), 1)
+                                     if self.state == OPEN else None),
+                "rejected": self.rejected,
+                "opened_count": self.opened_count,
+            }
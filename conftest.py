@@ -0,0 +1,64 @@
+# conftest.py
+import os
+import tempfile
+
+import pytest
+
+# Keep test runs away from the checked-in database files.  This has to be set
+# before db_helpers (or app, which imports it) is first imported.
+os.environ.setdefault("SYMPTOM_DB_PATH", os.path.join(tempfile.mkdtemp(), "test_symptom_checker.db"))
+
+import db_helpers
+
+
+class FakeClock:
+    """A time.time/time.monotonic stand-in that only moves when a test sets ``now``"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Point db_helpers at a fresh database for the duration of a test"""
+    path = str(tmp_path / "symptom_checker.db")
+    monkeypatch.setattr(db_helpers, "DB_PATH", path)
+    db_helpers.init_db()
+    yield path
+    # Rows the app queued on the write-behind journal belong to this database
+    db_helpers.flush_journal()
+    db_helpers.close_pool()
+
+
+@pytest.fixture
+def fake_deepseek(monkeypatch):
+    """Factory: start a FakeDeepSeekServer(**options) and point symptom_api at it.
+
+    Each call also installs a fresh circuit breaker, so an earlier test's
+    failures can't keep the upstream shut.  Servers are stopped afterwards.
+    """
+    import symptom_api
+    from benchmarks.fake_deepseek import FakeDeepSeekServer
+    from circuit_breaker import CircuitBreaker
+
+    servers = []
+
+    def start(**options):
+        server = FakeDeepSeekServer(**options).start()
+        servers.append(server)
+        monkeypatch.setattr(symptom_api, "DEEPSEEK_API_URL", server.url)
+        monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+        monkeypatch.setattr(symptom_api, "DEEPSEEK_BREAKER", CircuitBreaker())
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
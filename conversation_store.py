@@ -0,0 +1,457 @@
+# conversation_store.py
+import heapq
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Rough fixed cost of one history entry (dict, timestamp, role string) on top
+# of its text; only used for the memory estimate reported on /health.
+MESSAGE_OVERHEAD_BYTES = 400
+CONVERSATION_OVERHEAD_BYTES = 1500
+
+
+class ConversationStore:
+    """Interface for live chat state keyed by conversation id.
+
+    A conversation is a dict with ``session_id``, ``patient_info``,
+    ``message_history`` and ``created_at``.  Callers go through the methods
+    below rather than mutating what ``get`` returns, so that backends which
+    don't hand out live objects behave the same way.
+    """
+
+    def create(self, conversation_id, conversation):
+        raise NotImplementedError
+
+    def get(self, conversation_id):
+        """Return the conversation, or None if unknown or expired"""
+        raise NotImplementedError
+
+    def append_messages(self, conversation_id, *messages):
+        """Append to the history; returns the new history length or None"""
+        raise NotImplementedError
+
+    def update_patient_info(self, conversation_id, patient_info):
+        raise NotImplementedError
+
+    def delete(self, conversation_id):
+        """Remove and return the conversation (None if it wasn't there)"""
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Drop expired conversations; returns how many were removed"""
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class _Entry:
+    __slots__ = ("conversation", "expires_at", "approx_bytes")
+
+    def __init__(self, conversation, expires_at, approx_bytes):
+        self.conversation = conversation
+        self.expires_at = expires_at
+        self.approx_bytes = approx_bytes
+
+
+def _message_bytes(message):
+    return MESSAGE_OVERHEAD_BYTES + len(message.get("content") or "")
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Process-local store with LRU and idle-TTL eviction.
+
+    - At most ``max_conversations`` are kept; the least recently used one is
+      evicted to make room.
+    - A conversation expires ``ttl_seconds`` after it was last touched.
+      Deadlines live in a min-heap, so expiry costs O(log n) per
+      conversation instead of a full scan.  Touching a conversation pushes a
+      new deadline and leaves the old heap entry to be skipped lazily.
+    - ``message_history`` is a deque capped at ``max_history`` entries.
+
+    ``on_evict(conversation_id, conversation, reason)`` is called outside the
+    lock for every LRU/TTL eviction (not for explicit deletes).
+    """
+
+    def __init__(self, max_conversations=10000, ttl_seconds=24 * 3600, max_history=50,
+                 on_evict=None, clock=time.monotonic):
+        self.max_conversations = max_conversations
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max_history
+        self.on_evict = on_evict
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._deadlines = []  # heap of (expires_at, conversation_id)
+        self._lock = threading.RLock()
+        self._approx_bytes = 0
+        self.evictions = {"lru": 0, "ttl": 0}
+
+    # -- internals (caller holds the lock) ---------------------------------
+
+    def _schedule(self, conversation_id, entry, now):
+        entry.expires_at = now + self.ttl_seconds
+        heapq.heappush(self._deadlines, (entry.expires_at, conversation_id))
+        # Stale heap entries pile up when hot conversations are touched
+        # repeatedly; rebuild once they outnumber live ones.
+        if len(self._deadlines) > 2 * len(self._entries) + 64:
+            self._deadlines = [(e.expires_at, cid) for cid, e in self._entries.items()]
+            heapq.heapify(self._deadlines)
+
+    def _remove(self, conversation_id):
+        entry = self._entries.pop(conversation_id)
+        self._approx_bytes -= entry.approx_bytes
+        return entry
+
+    def _expire(self, now, evicted):
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now:
+            expires_at, conversation_id = heapq.heappop(deadlines)
+            entry = self._entries.get(conversation_id)
+            if entry is not None and entry.expires_at == expires_at:
+                self._remove(conversation_id)
+                self.evictions["ttl"] += 1
+                evicted.append((conversation_id, entry.conversation, "ttl"))
+
+    def _lookup(self, conversation_id, now, evicted):
+        self._expire(now, evicted)
+        entry = self._entries.get(conversation_id)
+        if entry is not None:
+            self._entries.move_to_end(conversation_id)
+            self._schedule(conversation_id, entry, now)
+        return entry
+
+    def _notify(self, evicted):
+        if self.on_evict:
+            for conversation_id, conversation, reason in evicted:
+                self.on_evict(conversation_id, conversation, reason)
+
+    # -- public API --------------------------------------------------------
+
+    def create(self, conversation_id, conversation):
+        conversation = dict(conversation)
+        history = deque(conversation.get("message_history") or (), maxlen=self.max_history)
+        conversation["message_history"] = history
+        approx_bytes = CONVERSATION_OVERHEAD_BYTES + sum(_message_bytes(m) for m in history)
+        evicted = []
+        with self._lock:
+            now = self._clock()
+            self._expire(now, evicted)
+            if conversation_id in self._entries:
+                self._remove(conversation_id)
+            while len(self._entries) >= self.max_conversations:
+                old_id, old_entry = self._entries.popitem(last=False)
+                self._approx_bytes -= old_entry.approx_bytes
+                self.evictions["lru"] += 1
+                evicted.append((old_id, old_entry.conversation, "lru"))
+            entry = _Entry(conversation, 0, approx_bytes)
+            self._entries[conversation_id] = entry
+            self._approx_bytes += approx_bytes
+            self._schedule(conversation_id, entry, now)
+        self._notify(evicted)
+        return conversation
+
+    def get(self, conversation_id):
+        evicted = []
+        with self._lock:
+            entry = self._lookup(conversation_id, self._clock(), evicted)
+        self._notify(evicted)
+        return entry.conversation if entry is not None else None
+
+    def append_messages(self, conversation_id, *messages):
+        evicted = []
+        with self._lock:
+            entry = self._lookup(conversation_id, self._clock(), evicted)
+            if entry is None:
+                length = None
+            else:
+                history = entry.conversation["message_history"]
+                delta = 0
+                for message in messages:
+                    if len(history) == history.maxlen:
+                        delta -= _message_bytes(history[0])
+                    history.append(message)
+                    delta += _message_bytes(message)
+                entry.approx_bytes += delta
+                self._approx_bytes += delta
+                length = len(history)
+        self._notify(evicted)
+        return length
+
+    def update_patient_info(self, conversation_id, patient_info):
+        evicted = []
+        with self._lock:
+            entry = self._lookup(conversation_id, self._clock(), evicted)
+            if entry is not None:
+                entry.conversation["patient_info"].update(patient_info)
+        self._notify(evicted)
+        return entry is not None
+
+    def delete(self, conversation_id):
+        with self._lock:
+            if conversation_id not in self._entries:
+                return None
+            return self._remove(conversation_id).conversation
+
+    def purge_expired(self):
+        evicted = []
+        with self._lock:
+            self._expire(self._clock(), evicted)
+        self._notify(evicted)
+        return len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "conversations": len(self._entries),
+                "max_conversations": self.max_conversations,
+                "ttl_seconds": self.ttl_seconds,
+                "max_history": self.max_history,
+                "approx_bytes": self._approx_bytes,
+                "evictions": dict(self.evictions),
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ConversationConflict(Exception):
+    """Raised when an update keeps losing optimistic-concurrency races"""
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Conversation state shared by every worker through the conversations table.
+
+    Each row carries a version number that every write bumps.  Hot
+    conversations are cached in-process, and a read costs one indexed
+    lookup that only returns the state JSON when the cached version is
+    stale.  Writes are read-modify-write with a version check and are retried
+    when another worker got there first.  Expiry is an idle TTL on
+    ``expires_at`` (unix time, refreshed at most every ``touch_interval``
+    seconds on reads); ``purge_expired`` removes old rows in one indexed
+    delete, and the store calls it itself from ``create``/``get`` at most
+    every ``purge_interval`` seconds, so expired rows go away (and
+    ``on_evict`` fires) under any WSGI host.  State must be
+    JSON-serialisable.
+
+    ``len()`` and ``stats()`` are polled by /health and every /metrics
+    scrape, so the live count is a COUNT(*) taken at most every
+    ``count_interval`` seconds.  In between, it is adjusted for this
+    worker's own creates, deletes and purges.
+    """
+
+    MAX_WRITE_ATTEMPTS = 5
+
+    def __init__(self, ttl_seconds=24 * 3600, max_history=50, cache_size=1024,
+                 touch_interval=60, count_interval=15, purge_interval=300, on_evict=None, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max_history
+        self.cache_size = cache_size
+        self.touch_interval = min(touch_interval, ttl_seconds)
+        self.count_interval = count_interval
+        self.purge_interval = purge_interval
+        self.on_evict = on_evict
+        self._clock = clock
+        self._cache = OrderedDict()  # conversation_id -> (version, conversation)
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.write_conflicts = 0
+        self.evictions = {"ttl": 0}
+        self._count = None
+        self._counted_at = 0.0
+        self._purged_at = clock()
+
+    def _pool(self):
+        # Imported here so conversation_store has no import-time dependency
+        # on the database module (the in-memory backend doesn't need it)
+        import db_helpers
+        return db_helpers.get_pool()
+
+    def _cache_put(self, conversation_id, version, conversation):
+        with self._lock:
+            self._cache[conversation_id] = (version, conversation)
+            self._cache.move_to_end(conversation_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, conversation_id):
+        with self._lock:
+            self._cache.pop(conversation_id, None)
+
+    def _adjust_count(self, delta):
+        with self._lock:
+            if self._count is not None:
+                self._count = max(0, self._count + delta)
+
+    def count(self):
+        """Live conversations across all workers, at most ``count_interval`` seconds stale"""
+        now = self._clock()
+        with self._lock:
+            if self._count is not None and now - self._counted_at < self.count_interval:
+                return self._count
+        with self._pool().connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM conversations WHERE expires_at > ?", (now,)).fetchone()[0]
+        with self._lock:
+            self._count, self._counted_at = count, now
+        return count
+
+    def _maybe_purge(self):
+        now = self._clock()
+        with self._lock:
+            if now - self._purged_at < self.purge_interval:
+                return
+            self._purged_at = now
+        self.purge_expired()
+
+    def _load(self, conn, conversation_id, now):
+        """Return (version, conversation) or (None, None) if missing/expired"""
+        with self._lock:
+            cached = self._cache.get(conversation_id)
+        cached_version = cached[0] if cached else -1
+        row = conn.execute(
+            "SELECT version, expires_at, CASE WHEN version = ? THEN NULL ELSE state END "
+            "FROM conversations WHERE id = ?",
+            (cached_version, conversation_id)).fetchone()
+        if row is None:
+            self._cache_drop(conversation_id)
+            return None, None
+        version, expires_at, state = row
+        if expires_at <= now:
+            return None, None
+        if state is None:
+            self.cache_hits += 1
+            conversation = cached[1]
+        else:
+            self.cache_misses += 1
+            conversation = json.loads(state)
+            self._cache_put(conversation_id, version, conversation)
+        if expires_at - now < self.ttl_seconds - self.touch_interval:
+            conn.execute("UPDATE conversations SET expires_at = ? WHERE id = ?",
+                         (now + self.ttl_seconds, conversation_id))
+        return version, conversation
+
+    def _modify(self, conversation_id, change):
+        """Apply ``change(conversation) -> new conversation`` with a version check"""
+        for _ in range(self.MAX_WRITE_ATTEMPTS):
+            now = self._clock()
+            with self._pool().connection() as conn:
+                # Take the write lock up front: a deferred read-then-write
+                # transaction can fail with SQLITE_BUSY when another process
+                # commits in between.
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                version, conversation = self._load(conn, conversation_id, now)
+                if conversation is None:
+                    return None
+                updated = change(conversation)
+                cursor = conn.execute(
+                    "UPDATE conversations SET state = ?, version = version + 1, expires_at = ?, updated_at = ? "
+                    "WHERE id = ? AND version = ?",
+                    (json.dumps(updated), now + self.ttl_seconds, now, conversation_id, version))
+                if cursor.rowcount == 1:
+                    self._cache_put(conversation_id, version + 1, updated)
+                    return updated
+            self.write_conflicts += 1
+            self._cache_drop(conversation_id)
+        raise ConversationConflict(f"Gave up updating conversation {conversation_id} after "
+                                   f"{self.MAX_WRITE_ATTEMPTS} conflicting writes")
+
+    def create(self, conversation_id, conversation):
+        self._maybe_purge()
+        conversation = dict(conversation)
+        conversation["message_history"] = list(conversation.get("message_history") or ())[-self.max_history:]
+        now = self._clock()
+        with self._pool().connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO conversations (id, state, version, expires_at, updated_at) "
+                "VALUES (?, ?, 1, ?, ?)",
+                (conversation_id, json.dumps(conversation), now + self.ttl_seconds, now))
+        self._cache_put(conversation_id, 1, conversation)
+        self._adjust_count(1)
+        return conversation
+
+    def get(self, conversation_id):
+        self._maybe_purge()
+        with self._pool().connection() as conn:
+            return self._load(conn, conversation_id, self._clock())[1]
+
+    def append_messages(self, conversation_id, *messages):
+        def change(conversation):
+            updated = dict(conversation)
+            updated["message_history"] = (conversation["message_history"] + list(messages))[-self.max_history:]
+            return updated
+        updated = self._modify(conversation_id, change)
+        return len(updated["message_history"]) if updated is not None else None
+
+    def update_patient_info(self, conversation_id, patient_info):
+        def change(conversation):
+            updated = dict(conversation)
+            updated["patient_info"] = dict(conversation["patient_info"], **patient_info)
+            return updated
+        return self._modify(conversation_id, change) is not None
+
+    def delete(self, conversation_id):
+        with self._pool().connection() as conn:
+            row = conn.execute("SELECT state FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+        self._cache_drop(conversation_id)
+        self._adjust_count(-1)
+        return json.loads(row[0])
+
+    def purge_expired(self):
+        now = self._clock()
+        with self._pool().connection() as conn:
+            rows = conn.execute("SELECT id, state FROM conversations WHERE expires_at <= ?", (now,)).fetchall()
+            conn.execute("DELETE FROM conversations WHERE expires_at <= ?", (now,))
+        for conversation_id, _ in rows:
+            self._cache_drop(conversation_id)
+        self.evictions["ttl"] += len(rows)
+        self._adjust_count(-len(rows))
+        if self.on_evict:
+            for conversation_id, state in rows:
+                self.on_evict(conversation_id, json.loads(state), "ttl")
+        return len(rows)
+
+    def stats(self):
+        count = self.count()
+        with self._lock:
+            cached = len(self._cache)
+        return {
+            "backend": "sqlite",
+            "conversations": count,
+            "ttl_seconds": self.ttl_seconds,
+            "max_history": self.max_history,
+            "cached": cached,
+            "cache_size": self.cache_size,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "write_conflicts": self.write_conflicts,
+            "evictions": dict(self.evictions),
+        }
+
+    def __len__(self):
+        return self.count()
+
+
+CONVERSATION_BACKENDS = {
+    "memory": InMemoryConversationStore,
+    "sqlite": SQLiteConversationStore,
+}
+
+
+def create_conversation_store(backend="memory", **options):
+    """Build a store by backend name; options are passed to its constructor"""
+    try:
+        store_class = CONVERSATION_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown conversation backend {backend!r}; expected one of {sorted(CONVERSATION_BACKENDS)}")
+    if store_class is SQLiteConversationStore:
+        options.pop("max_conversations", None)  # bounded by TTL purges instead
+    return store_class(**options)
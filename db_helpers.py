@@ -1,305 +1,708 @@
-<<<<<<< HEAD
-# db_helpers.py
-import sqlite3
-import hashlib
-import json
-from datetime import datetime
-import os
-
-DB_PATH = "symptom_checker.db"
-
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db():
-    conn = get_db_connection()
-    
-    # Sessions table (updated - removed end_time)
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_hash TEXT UNIQUE NOT NULL,
-            start_time TIMESTAMP NOT NULL,
-            age INTEGER,
-            gender TEXT,
-            patient_name TEXT
-        )
-    ''')
-    
-    # Messages table for conversation history
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id INTEGER NOT NULL,
-            role TEXT NOT NULL,  -- 'user', 'bot', or 'meta'
-            content TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES sessions (id)
-        )
-    ''')
-    
-    # Results table for analysis results
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS results (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id INTEGER NOT NULL,
-            api_name TEXT NOT NULL,
-            result TEXT NOT NULL,  -- JSON stored as text
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES sessions (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def create_session(start_time, age=None, gender=None, patient_name=None):
-    session_hash = hashlib.md5(f"{start_time}{age}{gender}{patient_name}".encode()).hexdigest()
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
-            INSERT INTO sessions (session_hash, start_time, age, gender, patient_name)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (session_hash, start_time, age, gender, patient_name))
-        
-        session_id = cursor.lastrowid
-        conn.commit()
-        return session_id
-        
-    except sqlite3.IntegrityError:
-        # Session already exists, return existing ID
-        cursor.execute('SELECT id FROM sessions WHERE session_hash = ?', (session_hash,))
-        result = cursor.fetchone()
-        return result[0] if result else None
-        
-    finally:
-        conn.close()
-
-def update_session_patient_info(session_id, age=None, gender=None, patient_name=None):
-    conn = get_db_connection()
-    
-    # Build update query dynamically based on provided fields
-    updates = []
-    params = []
-    
-    if age is not None:
-        updates.append("age = ?")
-        params.append(age)
-    
-    if gender is not None:
-        updates.append("gender = ?")
-        params.append(gender)
-        
-    if patient_name is not None:
-        updates.append("patient_name = ?")
-        params.append(patient_name)
-    
-    if updates:
-        params.append(session_id)
-        query = f"UPDATE sessions SET {', '.join(updates)} WHERE id = ?"
-        
-        conn.execute(query, params)
-        conn.commit()
-    
-    conn.close()
-
-def log_message(session_id, role, content):
-    conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO messages (session_id, role, content)
-        VALUES (?, ?, ?)
-    ''', (session_id, role, content))
-    conn.commit()
-    conn.close()
-
-def log_result(session_id, api_name, result):
-    conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO results (session_id, api_name, result)
-        VALUES (?, ?, ?)
-    ''', (session_id, api_name, json.dumps(result)))
-    conn.commit()
-    conn.close()
-
-def close_session(session_id):
-    # With the new schema, we don't need to do anything special to close a session
-    # This function is kept for backward compatibility
-    pass
-
-def get_sessions(limit=100):
-    conn = get_db_connection()
-    cursor = conn.execute('''
-        SELECT id, session_hash, start_time, age, gender, patient_name
-        FROM sessions 
-        ORDER BY start_time DESC 
-        LIMIT ?
-    ''', (limit,))
-    sessions = cursor.fetchall()
-    conn.close()
-    return sessions
-
-def get_messages_for_session(session_id):
-    conn = get_db_connection()
-    cursor = conn.execute('''
-        SELECT role, content, timestamp
-        FROM messages 
-        WHERE session_id = ?
-        ORDER BY timestamp ASC
-    ''', (session_id,))
-    messages = cursor.fetchall()
-    conn.close()
-    return messages
-
-def get_results_for_session(session_id):
-    conn = get_db_connection()
-    cursor = conn.execute('''
-        SELECT api_name, result, timestamp
-        FROM results 
-        WHERE session_id = ?
-        ORDER BY timestamp DESC
-    ''', (session_id,))
-    results = []
-    for row in cursor.fetchall():
-        try:
-            result_data = json.loads(row[1])
-            results.append({
-                'api_name': row[0],
-                'result': result_data,
-                'timestamp': row[2]
-            })
-        except json.JSONDecodeError:
-            continue
-    conn.close()
-    return results
-
-def get_conversation_history(session_id):
-    """Get complete conversation history for a session"""
-    conn = get_db_connection()
-    
-    # Get messages
-    cursor = conn.execute('''
-        SELECT role, content, timestamp
-        FROM messages 
-        WHERE session_id = ?
-        ORDER BY timestamp ASC
-    ''', (session_id,))
-    messages = [dict(row) for row in cursor.fetchall()]
-    
-    # Get analysis results
-    cursor = conn.execute('''
-        SELECT api_name, result, timestamp
-        FROM results 
-        WHERE session_id = ?
-        ORDER BY timestamp ASC
-    ''', (session_id,))
-    
-    analyses = []
-    for row in cursor.fetchall():
-        try:
-            result_data = json.loads(row[1])
-            analyses.append({
-                'api_name': row[0],
-                'result': result_data,
-                'timestamp': row[2]
-            })
-        except json.JSONDecodeError:
-            continue
-    
-    conn.close()
-    
-    return {
-        'messages': messages,
-        'analyses': analyses
-=======
 # db_helpers.py
 import sqlite3
 import hashlib
 import json
-from datetime import datetime
+import base64
+import binascii
+from datetime import datetime, timedelta
 import os
+import threading
+import time
+import uuid
+import atexit
+import logging
+import queue
+from contextlib import contextmanager
 
-DB_PATH = "symptom_checker.db"
+import metrics
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+logger = logging.getLogger(__name__)
 
-def init_db():
-    conn = get_db_connection()
-    
-    # Sessions table (updated - removed end_time)
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_hash TEXT UNIQUE NOT NULL,
-            start_time TIMESTAMP NOT NULL,
-            age INTEGER,
-            gender TEXT,
-            patient_name TEXT
+DB_CALL_SECONDS = metrics.histogram(
+    "db_call_seconds", "Time spent in db_helpers calls (enqueueing only, for journaled writes)", ["function"])
+
+DB_PATH = os.getenv("SYMPTOM_DB_PATH", "symptom_checker.db")
+
+# Connection pool settings
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+# Storage profiles: PRAGMAs applied to every pooled connection.  "default" is
+# SQLite's stock behaviour (rollback journal, synchronous=FULL); "wal" lets
+# readers run alongside a writer and only fsyncs at checkpoints.
+STORAGE_PROFILES = {
+    "default": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+    },
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -16000,  # negative = KiB, so ~16 MB
+        "busy_timeout": 5000,
+    },
+}
+DEFAULT_STORAGE_PROFILE = os.getenv("DB_STORAGE_PROFILE", "default")
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within the timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections.
+
+    A thread keeps the connection it checked out for the duration of a
+    ``connection()`` block, and nested blocks on the same thread reuse it.
+    Idle connections are kept LIFO so the most recently used (and warmest)
+    one is handed out first, and are pinged before reuse once they have
+    been idle longer than ``health_check_interval`` seconds.
+    """
+
+    def __init__(self, db_path, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT,
+                 health_check_interval=POOL_HEALTH_CHECK_INTERVAL, pragmas=None):
+        self.db_path = db_path
+        self.pragmas = dict(pragmas or {})
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = []  # stack of (conn, last_used)
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}").fetchall()
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No database connection free after {self.timeout}s")
+                self._cond.wait(remaining)
+
+        if conn is None:
+            try:
+                return self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        if time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+            self._discard(conn)
+            return self._acquire()
+        return conn
+
+    def _release(self, conn):
+        with self._cond:
+            if self._closed:
+                conn.close()
+                self._size -= 1
+                return
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for this thread.
+
+        Commits when the outermost block exits cleanly and rolls back if it
+        raises.  A connection that errors out at the SQLite level is replaced
+        rather than returned to the pool.
+        """
+        local = self._local
+        if getattr(local, "conn", None) is not None:
+            local.depth += 1
+            try:
+                yield local.conn
+            finally:
+                local.depth -= 1
+            return
+
+        conn = self._acquire()
+        local.conn, local.depth = conn, 0
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException as exc:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+            if isinstance(exc, (sqlite3.OperationalError, sqlite3.DatabaseError)) \
+                    and not isinstance(exc, sqlite3.IntegrityError):
+                broken = broken or not self._is_healthy(conn)
+            raise
+        finally:
+            local.conn = None
+            if broken:
+                self._discard(conn)
+            else:
+                self._release(conn)
+
+    def stats(self):
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "max_size": self.max_size}
+
+    def close(self):
+        """Close every idle connection and refuse further checkouts.
+
+        Connections that are checked out are closed as they are returned.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_storage_profile = DEFAULT_STORAGE_PROFILE
+
+
+def get_storage_profile():
+    return _storage_profile
+
+
+def set_storage_profile(profile):
+    """Switch the PRAGMAs used for new pooled connections"""
+    global _storage_profile
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile {profile!r}; expected one of {sorted(STORAGE_PROFILES)}")
+    with _pool_lock:
+        _storage_profile = profile
+
+
+def get_pool():
+    """Return the shared pool for DB_PATH, (re)creating it if DB_PATH or the
+    storage profile changed"""
+    global _pool
+    pool = _pool
+    pragmas = STORAGE_PROFILES[_storage_profile]
+    if pool is not None and pool.db_path == DB_PATH and pool.pragmas == pragmas:
+        return pool
+    with _pool_lock:
+        pragmas = STORAGE_PROFILES[_storage_profile]
+        if _pool is None or _pool.db_path != DB_PATH or _pool.pragmas != pragmas:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH, pragmas=pragmas)
+        return _pool
+
+
+def close_pool():
+    """Shutdown hook: close all pooled connections"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+atexit.register(close_pool)
+
+
+# Write-behind journal for message/result rows.  In "strict" mode every
+# log_message/log_result commits on the caller's thread, as before; in
+# "async" mode rows are queued and a background thread writes them with
+# executemany, one transaction per batch.
+JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "strict")
+JOURNAL_BATCH_SIZE = int(os.getenv("DB_JOURNAL_BATCH_SIZE", "200"))
+JOURNAL_FLUSH_INTERVAL_MS = float(os.getenv("DB_JOURNAL_FLUSH_INTERVAL_MS", "50"))
+JOURNAL_MAX_RETRIES = 3
+
+_INSERT_MESSAGE_SQL = '''
+    INSERT INTO messages (session_id, role, content, timestamp)
+    VALUES (?, ?, ?, ?)
+'''
+_INSERT_RESULT_SQL = '''
+    INSERT INTO results (session_id, api_name, result, timestamp)
+    VALUES (?, ?, ?, ?)
+'''
+# A session keeps the most severe triage level any of its results reached
+_UPDATE_TRIAGE_LEVEL_SQL = '''
+    UPDATE sessions SET triage_level = ?
+    WHERE id = ?
+      AND COALESCE(CASE triage_level WHEN 'emergency' THEN 3 WHEN 'urgent' THEN 2
+                                     WHEN 'routine' THEN 1 END, 0) < ?
+'''
+
+# Same buckets the chat UI uses to colour the triage badge.  Unlike the UI,
+# a bare "urgent" counts as urgent rather than emergency, so advice such as
+# "See GP within 24-48 hours; urgent if breathing worsens" isn't filed as an
+# emergency.
+TRIAGE_LEVELS = ("emergency", "urgent", "routine")
+_TRIAGE_LEVEL_RANK = {"routine": 1, "urgent": 2, "emergency": 3}
+
+
+def classify_triage_level(result):
+    """Bucket a result dict (or a bare triage string) into TRIAGE_LEVELS"""
+    if isinstance(result, dict):
+        if result.get("red_flag"):
+            return "emergency"
+        triage = result.get("triage")
+    else:
+        triage = result
+    triage = (triage or "").lower()
+    if "emergency" in triage or "immediate" in triage:
+        return "emergency"
+    if "urgent" in triage or "gp" in triage or "doctor" in triage or "within" in triage:
+        return "urgent"
+    return "routine"
+
+
+def _triage_level_update(session_id, result):
+    level = classify_triage_level(result)
+    return (level, session_id, _TRIAGE_LEVEL_RANK[level])
+
+
+def _utc_timestamp():
+    # SQLite's CURRENT_TIMESTAMP format plus microseconds, captured when the
+    # row is logged rather than when it is flushed.  The extra precision keeps
+    # messages and results from one chat turn in order when they are merged
+    # into a timeline; older second-resolution rows still sort correctly.
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+class WriteBehindJournal:
+    """Queue message/result rows and write them in batches on a worker thread.
+
+    A batch is written when it reaches ``batch_size`` rows or when
+    ``flush_interval_ms`` has passed since its first row was queued,
+    whichever comes first.  ``flush()`` blocks until everything queued
+    before the call is committed; ``close()`` flushes and stops the worker.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_size=JOURNAL_BATCH_SIZE, flush_interval_ms=JOURNAL_FLUSH_INTERVAL_MS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._closed = False
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.batches_written = 0
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def submit(self, kind, row):
+        if self._closed:
+            raise RuntimeError("Write-behind journal is closed")
+        with self._pending_lock:
+            self._pending += 1
+        self._queue.put((kind, row))
+
+    def flush(self, timeout=None):
+        if self._closed or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((self._STOP, None))
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "pending": self._pending,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "batches_written": self.batches_written,
+        }
+
+    def _run(self):
+        messages, results, waiters = [], [], []
+        batch_started = None
+        stopping = False
+        while not stopping:
+            if batch_started is None:
+                item = self._queue.get()
+            else:
+                remaining = batch_started + self.flush_interval - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    item = None
+
+            if item is not None:
+                kind, payload = item
+                if kind == "message":
+                    messages.append(payload)
+                elif kind == "result":
+                    results.append(payload)  # (row, triage level update)
+                elif kind == "flush":
+                    waiters.append(payload)
+                elif kind is self._STOP:
+                    stopping = True
+                if batch_started is None and (messages or results):
+                    batch_started = time.monotonic()
+
+            size = len(messages) + len(results)
+            if (item is None or waiters or stopping or size >= self.batch_size
+                    or (batch_started is not None and time.monotonic() - batch_started >= self.flush_interval)):
+                if size:
+                    self._write_batch(messages, results)
+                    messages, results = [], []
+                batch_started = None
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+
+    def _write_batch(self, messages, results):
+        count = len(messages) + len(results)
+        for attempt in range(JOURNAL_MAX_RETRIES):
+            try:
+                with get_pool().connection() as conn:
+                    if messages:
+                        conn.executemany(_INSERT_MESSAGE_SQL, messages)
+                    if results:
+                        conn.executemany(_INSERT_RESULT_SQL, [row for row, _ in results])
+                        conn.executemany(_UPDATE_TRIAGE_LEVEL_SQL, [update for _, update in results])
+                self.rows_written += count
+                self.batches_written += 1
+                break
+            except Exception:
+                if attempt == JOURNAL_MAX_RETRIES - 1:
+                    logger.exception("Dropping %d journaled rows after %d failed writes",
+                                     count, JOURNAL_MAX_RETRIES)
+                    self.rows_dropped += count
+                else:
+                    time.sleep(0.05 * (2 ** attempt))
+        with self._pending_lock:
+            self._pending -= count
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def configure_journal(mode=None, batch_size=None, flush_interval_ms=None):
+    """Select "strict" (synchronous commits) or "async" (write-behind) logging.
+
+    Switching away from "async" flushes and stops the running journal.
+    """
+    global JOURNAL_MODE, _journal
+    mode = mode or JOURNAL_MODE
+    if mode not in ("strict", "async"):
+        raise ValueError(f"Unknown journal mode {mode!r}; expected 'strict' or 'async'")
+    with _journal_lock:
+        if _journal is not None:
+            _journal.close()
+            _journal = None
+        JOURNAL_MODE = mode
+        if mode == "async":
+            _journal = WriteBehindJournal(
+                batch_size=batch_size or JOURNAL_BATCH_SIZE,
+                flush_interval_ms=flush_interval_ms or JOURNAL_FLUSH_INTERVAL_MS,
+            )
+
+
+def flush_journal(timeout=None):
+    """Block until every queued row has been written (no-op in strict mode)"""
+    journal = _journal
+    if journal is None or not journal.pending:
+        return True
+    return journal.flush(timeout)
+
+
+def shutdown_journal():
+    """Shutdown hook: flush pending rows and stop the writer thread"""
+    global _journal
+    with _journal_lock:
+        if _journal is not None:
+            _journal.close()
+            _journal = None
+
+
+def journal_stats():
+    journal = _journal
+    stats = {"mode": JOURNAL_MODE}
+    if journal is not None:
+        stats.update(journal.stats())
+    return stats
+
+
+# atexit runs hooks last-in first-out, so pending rows are flushed before
+# the pool is closed
+atexit.register(shutdown_journal)
+
+
+def _reset_after_fork():
+    # A forked worker (e.g. gunicorn --preload) must not reuse the parent's
+    # SQLite connections or its dead journal thread.  The parent still owns
+    # and closes those, so they are dropped here rather than closed.
+    global _pool, _pool_lock, _journal, _journal_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+    _journal_lock = threading.Lock()
+    if _journal is not None:
+        _journal = WriteBehindJournal(batch_size=_journal.batch_size,
+                                      flush_interval_ms=_journal.flush_interval * 1000)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _backfill_triage_levels(conn):
+    rows = conn.execute("SELECT session_id, result FROM results").fetchall()
+    updates = []
+    for session_id, result in rows:
+        try:
+            updates.append(_triage_level_update(session_id, json.loads(result)))
+        except (json.JSONDecodeError, TypeError):
+            continue
+    conn.executemany(_UPDATE_TRIAGE_LEVEL_SQL, updates)
+
+
+# Versioned schema migrations, applied in order on top of the base tables
+# created by init_db().  The applied version is kept in PRAGMA user_version,
+# so append new entries here rather than editing old ones.  A step is either
+# an SQL string or a callable taking the connection.
+SCHEMA_MIGRATIONS = [
+    (1, "index session lookups", [
+        # Session views filter on session_id and order by timestamp; the
+        # rowid tie-break in ORDER BY ... id is implicit in both indexes.
+        "CREATE INDEX IF NOT EXISTS idx_messages_session_ts ON messages (session_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_results_session_ts ON results (session_id, timestamp)",
+        # /history lists the newest sessions first
+        "CREATE INDEX IF NOT EXISTS idx_sessions_start_time ON sessions (start_time, id)",
+    ]),
+    (2, "session triage level and history filter indexes", [
+        "ALTER TABLE sessions ADD COLUMN triage_level TEXT",
+        _backfill_triage_levels,
+        "CREATE INDEX IF NOT EXISTS idx_sessions_gender_start ON sessions (gender, start_time, id)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_triage_start ON sessions (triage_level, start_time, id)",
+    ]),
+    (3, "shared conversation state", [
+        # Live chat state for conversation_store.SQLiteConversationStore, so
+        # every worker process sees the same conversations
+        '''
+        CREATE TABLE IF NOT EXISTS conversations (
+            id TEXT PRIMARY KEY,
+            state TEXT NOT NULL,  -- JSON
+            version INTEGER NOT NULL,
+            expires_at REAL NOT NULL,  -- unix time
+            updated_at REAL NOT NULL
         )
-    ''')
-    
-    # Messages table for conversation history
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_conversations_expires ON conversations (expires_at)",
+    ]),
+    (4, "persistent triage cache", [
+        # Second tier of triage_cache.TriageCache, so cached provider
+        # results survive restarts
+        '''
+        CREATE TABLE IF NOT EXISTS triage_cache (
+            key TEXT PRIMARY KEY,  -- triage_cache.cache_key()
+            api_name TEXT NOT NULL,
+            result TEXT NOT NULL,  -- JSON
+            expires_at REAL NOT NULL,  -- unix time
+            created_at REAL NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_triage_cache_expires ON triage_cache (expires_at)",
+    ]),
+    (5, "offline re-triage diffs", [
+        # Written by retriage.py: user messages whose stored result differs
+        # from what the current red flags and mock rules say
+        '''
+        CREATE TABLE IF NOT EXISTS retriage_diffs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,
+            message_id INTEGER NOT NULL,
             session_id INTEGER NOT NULL,
-            role TEXT NOT NULL,  -- 'user', 'bot', or 'meta'
-            content TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES sessions (id)
+            old_api_name TEXT NOT NULL,
+            old_triage TEXT,
+            old_level TEXT NOT NULL,
+            new_api_name TEXT NOT NULL,
+            new_triage TEXT,
+            new_level TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL
         )
-    ''')
-    
-    # Results table for analysis results
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS results (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_retriage_diffs_run ON retriage_diffs (run_id, message_id)",
+    ]),
+    (6, "legacy import bookkeeping", [
+        # import_legacy.py: which legacy session became which session, and
+        # how far each table of each legacy database has been copied
+        '''
+        CREATE TABLE IF NOT EXISTS legacy_session_map (
+            source TEXT NOT NULL,
+            legacy_id INTEGER NOT NULL,
             session_id INTEGER NOT NULL,
-            api_name TEXT NOT NULL,
-            result TEXT NOT NULL,  -- JSON stored as text
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES sessions (id)
+            PRIMARY KEY (source, legacy_id)
         )
-    ''')
-    
-    conn.commit()
-    conn.close()
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS legacy_import_checkpoints (
+            source TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            last_id INTEGER NOT NULL,
+            rows_imported INTEGER NOT NULL,
+            updated_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (source, table_name)
+        )
+        ''',
+    ]),
+]
 
-def create_session(start_time, age=None, gender=None, patient_name=None):
-    session_hash = hashlib.md5(f"{start_time}{age}{gender}{patient_name}".encode()).hexdigest()
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
-            INSERT INTO sessions (session_hash, start_time, age, gender, patient_name)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (session_hash, start_time, age, gender, patient_name))
-        
-        session_id = cursor.lastrowid
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn):
+    """Apply every migration newer than the database's user_version.
+
+    Each migration and its user_version bump commit together or not at
+    all: sqlite3 doesn't open a transaction for DDL on its own, so without
+    an explicit BEGIN a crash after an ALTER TABLE would leave the column
+    in place and the version behind.
+    """
+    current = get_schema_version(conn)
+    for version, description, statements in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info("Applying schema migration %d: %s", version, description)
+        conn.commit()
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            # PRAGMA doesn't take bound parameters
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        except BaseException:
+            conn.rollback()
+            raise
         conn.commit()
-        return session_id
+        current = version
+    return current
+
+
+def init_db(profile=None):
+    """Create the tables if needed and apply pending schema migrations.
+
+    ``profile`` picks a key from STORAGE_PROFILES (defaults to the
+    DB_STORAGE_PROFILE environment variable, else "default").
+    """
+    if profile is not None:
+        set_storage_profile(profile)
+    with get_pool().connection() as conn:
+        # Sessions table (updated - removed end_time)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_hash TEXT UNIQUE NOT NULL,
+                start_time TIMESTAMP NOT NULL,
+                age INTEGER,
+                gender TEXT,
+                patient_name TEXT
+            )
+        ''')
         
-    except sqlite3.IntegrityError:
-        # Session already exists, return existing ID
-        cursor.execute('SELECT id FROM sessions WHERE session_hash = ?', (session_hash,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+        # Messages table for conversation history
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id INTEGER NOT NULL,
+                role TEXT NOT NULL,  -- 'user', 'bot', or 'meta'
+                content TEXT NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (session_id) REFERENCES sessions (id)
+            )
+        ''')
         
-    finally:
-        conn.close()
+        # Results table for analysis results
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id INTEGER NOT NULL,
+                api_name TEXT NOT NULL,
+                result TEXT NOT NULL,  -- JSON stored as text
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (session_id) REFERENCES sessions (id)
+            )
+        ''')
 
-def update_session_patient_info(session_id, age=None, gender=None, patient_name=None):
-    conn = get_db_connection()
+        apply_migrations(conn)
+
+@metrics.timed(DB_CALL_SECONDS.labels("create_session"))
+def create_session(start_time, age=None, gender=None, patient_name=None):
+    session_hash = hashlib.md5(f"{start_time}{age}{gender}{patient_name}".encode()).hexdigest()
     
+    with get_pool().connection() as conn:
+        try:
+            cursor = conn.execute('''
+                INSERT INTO sessions (session_hash, start_time, age, gender, patient_name)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (session_hash, start_time, age, gender, patient_name))
+            return cursor.lastrowid
+            
+        except sqlite3.IntegrityError:
+            # Session already exists, return existing ID
+            cursor = conn.execute('SELECT id FROM sessions WHERE session_hash = ?', (session_hash,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+
+@metrics.timed(DB_CALL_SECONDS.labels("update_session_patient_info"))
+def update_session_patient_info(session_id, age=None, gender=None, patient_name=None):
     # Build update query dynamically based on provided fields
     updates = []
     params = []
@@ -320,68 +723,216 @@ def update_session_patient_info(session_id, age=None, gender=None, patient_name=
         params.append(session_id)
         query = f"UPDATE sessions SET {', '.join(updates)} WHERE id = ?"
         
-        conn.execute(query, params)
-        conn.commit()
-    
-    conn.close()
+        with get_pool().connection() as conn:
+            conn.execute(query, params)
 
+@metrics.timed(DB_CALL_SECONDS.labels("log_message"))
 def log_message(session_id, role, content):
-    conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO messages (session_id, role, content)
-        VALUES (?, ?, ?)
-    ''', (session_id, role, content))
-    conn.commit()
-    conn.close()
+    row = (session_id, role, content, _utc_timestamp())
+    journal = _journal
+    if journal is not None:
+        journal.submit("message", row)
+        return
+    with get_pool().connection() as conn:
+        conn.execute(_INSERT_MESSAGE_SQL, row)
 
+@metrics.timed(DB_CALL_SECONDS.labels("log_result"))
 def log_result(session_id, api_name, result):
-    conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO results (session_id, api_name, result)
-        VALUES (?, ?, ?)
-    ''', (session_id, api_name, json.dumps(result)))
-    conn.commit()
-    conn.close()
+    row = (session_id, api_name, json.dumps(result), _utc_timestamp())
+    journal = _journal
+    if journal is not None:
+        journal.submit("result", (row, _triage_level_update(session_id, result)))
+        return
+    with get_pool().connection() as conn:
+        conn.execute(_INSERT_RESULT_SQL, row)
+        conn.execute(_UPDATE_TRIAGE_LEVEL_SQL, _triage_level_update(session_id, result))
+
+@metrics.timed(DB_CALL_SECONDS.labels("log_sessions_batch"))
+def log_sessions_batch(entries):
+    """Write many complete sessions in one transaction.
+
+    Each entry is a dict with ``start_time``, ``age``, ``gender``,
+    ``patient_name``, ``messages`` (a list of ``(role, content)``) and,
+    optionally, ``api_name`` and ``result``.  Skips the write-behind
+    journal: everything is committed when this returns.  Returns the new
+    session ids in entry order.
+    """
+    session_ids = []
+    messages = []
+    results = []
+    triage_updates = []
+    with get_pool().connection() as conn:
+        for entry in entries:
+            start_time = entry["start_time"]
+            age, gender, patient_name = entry.get("age"), entry.get("gender"), entry.get("patient_name")
+            # Identical records (in this batch or another) still get their own session
+            session_hash = hashlib.md5(f"{start_time}{age}{gender}{patient_name}{uuid.uuid4().hex}".encode()).hexdigest()
+            cursor = conn.execute('''
+                INSERT INTO sessions (session_hash, start_time, age, gender, patient_name)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (session_hash, start_time, age, gender, patient_name))
+            session_id = cursor.lastrowid
+            session_ids.append(session_id)
+            timestamp = _utc_timestamp()
+            messages.extend((session_id, role, content, timestamp) for role, content in entry.get("messages", ()))
+            if entry.get("result") is not None:
+                results.append((session_id, entry["api_name"], json.dumps(entry["result"]), timestamp))
+                triage_updates.append(_triage_level_update(session_id, entry["result"]))
+        conn.executemany(_INSERT_MESSAGE_SQL, messages)
+        conn.executemany(_INSERT_RESULT_SQL, results)
+        conn.executemany(_UPDATE_TRIAGE_LEVEL_SQL, triage_updates)
+    return session_ids
 
 def close_session(session_id):
     # With the new schema, we don't need to do anything special to close a session
     # This function is kept for backward compatibility
     pass
 
+# Read queries are module constants so the query-plan tests can EXPLAIN
+# exactly what the helpers run.
+SELECT_SESSIONS_SQL = '''
+    SELECT id, session_hash, start_time, age, gender, patient_name
+    FROM sessions 
+    ORDER BY start_time DESC, id DESC 
+    LIMIT ?
+'''
+
+SELECT_MESSAGES_SQL = '''
+    SELECT role, content, timestamp
+    FROM messages 
+    WHERE session_id = ?
+    ORDER BY timestamp ASC, id ASC
+'''
+
+SELECT_RESULTS_SQL = '''
+    SELECT api_name, result, timestamp
+    FROM results 
+    WHERE session_id = ?
+    ORDER BY timestamp ASC, id ASC
+'''
+
+SELECT_RESULTS_NEWEST_FIRST_SQL = '''
+    SELECT api_name, result, timestamp
+    FROM results 
+    WHERE session_id = ?
+    ORDER BY timestamp DESC, id DESC
+'''
+
+@metrics.timed(DB_CALL_SECONDS.labels("get_sessions"))
 def get_sessions(limit=100):
-    conn = get_db_connection()
-    cursor = conn.execute('''
-        SELECT id, session_hash, start_time, age, gender, patient_name
-        FROM sessions 
-        ORDER BY start_time DESC 
-        LIMIT ?
-    ''', (limit,))
-    sessions = cursor.fetchall()
-    conn.close()
-    return sessions
+    flush_journal()
+    with get_pool().connection() as conn:
+        return conn.execute(SELECT_SESSIONS_SQL, (limit,)).fetchall()
 
+# /history age filter buckets: label -> (min age, max age or None)
+AGE_BANDS = {
+    "0-17": (0, 17),
+    "18-39": (18, 39),
+    "40-64": (40, 64),
+    "65+": (65, None),
+}
+
+
+def encode_session_cursor(start_time, session_id):
+    raw = json.dumps([str(start_time), int(session_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_session_cursor(cursor):
+    """Inverse of encode_session_cursor; raises ValueError on a bad cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        start_time, session_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(start_time), int(session_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError(f"Invalid history cursor: {cursor!r}")
+
+
+def _day_after(date_text):
+    return (datetime.strptime(date_text, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def build_sessions_page_query(limit=50, cursor=None, start_date=None, end_date=None,
+                              gender=None, age_band=None, triage_level=None):
+    """Return (sql, params) for one keyset page of sessions, newest first.
+
+    Pages continue from ``cursor`` (the last row of the previous page) with
+    a row-value comparison on (start_time, id), so every page is an index
+    seek no matter how deep it is.  Dates are inclusive YYYY-MM-DD strings.
+    One extra row is fetched so callers can tell whether another page exists.
+    """
+    where = []
+    params = []
+    if cursor:
+        where.append("(start_time, id) < (?, ?)")
+        params.extend(decode_session_cursor(cursor))
+    if start_date:
+        where.append("start_time >= ?")
+        params.append(start_date)
+    if end_date:
+        where.append("start_time < ?")
+        params.append(_day_after(end_date))
+    if gender:
+        where.append("gender = ?")
+        params.append(gender)
+    if age_band:
+        if age_band not in AGE_BANDS:
+            raise ValueError(f"Unknown age band {age_band!r}; expected one of {list(AGE_BANDS)}")
+        low, high = AGE_BANDS[age_band]
+        where.append("age >= ?")
+        params.append(low)
+        if high is not None:
+            where.append("age <= ?")
+            params.append(high)
+    if triage_level:
+        if triage_level not in TRIAGE_LEVELS:
+            raise ValueError(f"Unknown triage level {triage_level!r}; expected one of {list(TRIAGE_LEVELS)}")
+        where.append("triage_level = ?")
+        params.append(triage_level)
+
+    sql = '''
+        SELECT id, session_hash, start_time, age, gender, patient_name, triage_level
+        FROM sessions
+    '''
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY start_time DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+    return sql, params
+
+
+@metrics.timed(DB_CALL_SECONDS.labels("get_sessions_page"))
+def get_sessions_page(limit=50, cursor=None, **filters):
+    """One page of sessions plus the cursor for the next page (or None).
+
+    Filters: start_date, end_date, gender, age_band (a key of AGE_BANDS) and
+    triage_level (one of TRIAGE_LEVELS).
+    """
+    sql, params = build_sessions_page_query(limit=limit, cursor=cursor, **filters)
+    flush_journal()
+    with get_pool().connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_session_cursor(last["start_time"], last["id"])
+    return {"sessions": rows, "next_cursor": next_cursor}
+
+@metrics.timed(DB_CALL_SECONDS.labels("get_messages_for_session"))
 def get_messages_for_session(session_id):
-    conn = get_db_connection()
-    cursor = conn.execute('''
-        SELECT role, content, timestamp
-        FROM messages 
-        WHERE session_id = ?
-        ORDER BY timestamp ASC
-    ''', (session_id,))
-    messages = cursor.fetchall()
-    conn.close()
-    return messages
+    flush_journal()
+    with get_pool().connection() as conn:
+        return conn.execute(SELECT_MESSAGES_SQL, (session_id,)).fetchall()
 
+@metrics.timed(DB_CALL_SECONDS.labels("get_results_for_session"))
 def get_results_for_session(session_id):
-    conn = get_db_connection()
-    cursor = conn.execute('''
-        SELECT api_name, result, timestamp
-        FROM results 
-        WHERE session_id = ?
-        ORDER BY timestamp DESC
-    ''', (session_id,))
+    flush_journal()
+    with get_pool().connection() as conn:
+        rows = conn.execute(SELECT_RESULTS_NEWEST_FIRST_SQL, (session_id,)).fetchall()
+    
     results = []
-    for row in cursor.fetchall():
+    for row in rows:
         try:
             result_data = json.loads(row[1])
             results.append({
@@ -391,46 +942,92 @@ def get_results_for_session(session_id):
             })
         except json.JSONDecodeError:
             continue
-    conn.close()
     return results
 
+SELECT_TIMELINE_SQL = '''
+    SELECT 'message' AS kind, id, timestamp, role, content, NULL AS api_name, NULL AS result
+    FROM messages
+    WHERE session_id = ?
+    UNION ALL
+    SELECT 'analysis' AS kind, id, timestamp, NULL, NULL, api_name, result
+    FROM results
+    WHERE session_id = ?
+    ORDER BY timestamp ASC, kind DESC, id ASC
+'''
+
+
+class AnalysisEntry:
+    """One stored analysis whose JSON is only decoded when ``result`` is read.
+
+    Supports both attribute and item access (``entry.result`` and
+    ``entry['result']``) so templates and older dict-based callers work
+    unchanged.  A row whose JSON doesn't parse has ``readable`` False and
+    an empty ``result``; views show it as unreadable rather than as {}.
+    """
+
+    __slots__ = ("api_name", "timestamp", "_raw", "_result", "_readable")
+    kind = "analysis"
+
+    def __init__(self, api_name, timestamp, raw):
+        self.api_name = api_name
+        self.timestamp = timestamp
+        self._raw = raw
+        self._result = None
+        self._readable = None
+
+    def _decode(self):
+        try:
+            self._result, self._readable = json.loads(self._raw), True
+        except (json.JSONDecodeError, TypeError):
+            self._result, self._readable = {}, False
+
+    @property
+    def result(self):
+        if self._result is None:
+            self._decode()
+        return self._result
+
+    @property
+    def readable(self):
+        if self._readable is None:
+            self._decode()
+        return self._readable
+
+    def __getitem__(self, key):
+        if key in ("kind", "api_name", "timestamp", "result", "readable"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def to_dict(self):
+        return {"api_name": self.api_name, "result": self.result, "timestamp": self.timestamp}
+
+
+@metrics.timed(DB_CALL_SECONDS.labels("get_session_timeline"))
+def get_session_timeline(session_id):
+    """Fetch a session's messages and analyses in one round trip.
+
+    Returns ``{'messages': [...], 'analyses': [...], 'timeline': [...]}``.
+    ``timeline`` interleaves both in timestamp order (within the same second
+    messages come before analyses).  Messages are plain dicts and analyses
+    are AnalysisEntry objects, both with a ``kind`` key.
+    """
+    flush_journal()
+    with get_pool().connection() as conn:
+        rows = conn.execute(SELECT_TIMELINE_SQL, (session_id, session_id)).fetchall()
+
+    messages, analyses, timeline = [], [], []
+    for kind, _id, timestamp, role, content, api_name, result in rows:
+        if kind == "message":
+            entry = {"kind": "message", "role": role, "content": content, "timestamp": timestamp}
+            messages.append(entry)
+        else:
+            entry = AnalysisEntry(api_name, timestamp, result)
+            analyses.append(entry)
+        timeline.append(entry)
+    return {"messages": messages, "analyses": analyses, "timeline": timeline}
+
+
+@metrics.timed(DB_CALL_SECONDS.labels("get_conversation_history"))
 def get_conversation_history(session_id):
     """Get complete conversation history for a session"""
-    conn = get_db_connection()
-    
-    # Get messages
-    cursor = conn.execute('''
-        SELECT role, content, timestamp
-        FROM messages 
-        WHERE session_id = ?
-        ORDER BY timestamp ASC
-    ''', (session_id,))
-    messages = [dict(row) for row in cursor.fetchall()]
-    
-    # Get analysis results
-    cursor = conn.execute('''
-        SELECT api_name, result, timestamp
-        FROM results 
-        WHERE session_id = ?
-        ORDER BY timestamp ASC
-    ''', (session_id,))
-    
-    analyses = []
-    for row in cursor.fetchall():
-        try:
-            result_data = json.loads(row[1])
-            analyses.append({
-                'api_name': row[0],
-                'result': result_data,
-                'timestamp': row[2]
-            })
-        except json.JSONDecodeError:
-            continue
-    
-    conn.close()
-    
-    return {
-        'messages': messages,
-        'analyses': analyses
->>>>>>> c90d239 (Initial commit)
-    }
\ No newline at end of file
+    return get_session_timeline(session_id)
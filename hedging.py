@@ -0,0 +1,74 @@
+# hedging.py
+import math
+import threading
+from collections import deque
+
+
+class HedgePolicy:
+    """When to send a backup ("hedged") copy of a slow upstream request.
+
+    Keeps the latencies of the last ``window`` successful calls.  A request
+    still unanswered after their ``percentile`` (p95 by default) has taken
+    longer than most ever do, so a second copy is likely to beat it.  Hedges
+    are budgeted: every call earns ``max_rate`` of a hedge and each hedge
+    spends one, so at most that share of calls is doubled, with up to
+    ``burst`` saved up.  No hedging until ``min_samples`` latencies have
+    been seen.
+    """
+
+    def __init__(self, percentile=95, max_rate=0.1, window=1000, min_samples=50, min_delay=0.01, burst=10):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.burst = burst
+        self._latencies = deque(maxlen=window)
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+        self._delay = None
+        self._stale = 0
+        self.calls = 0
+        self.hedges = 0
+
+    def observe(self, seconds):
+        """Record the latency of a successful upstream call"""
+        with self._lock:
+            self._latencies.append(seconds)
+            self._stale += 1
+
+    def delay(self):
+        """Seconds to wait before hedging, or None while there's too little data"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            # Re-sort only every few dozen samples; the percentile moves slowly
+            if self._delay is None or self._stale >= 32:
+                ordered = sorted(self._latencies)
+                index = min(len(ordered) - 1, math.ceil(self.percentile / 100.0 * len(ordered)) - 1)
+                self._delay = max(self.min_delay, ordered[index])
+                self._stale = 0
+            return self._delay
+
+    def note_call(self):
+        """Count a primary request; earns a fraction of a hedge"""
+        with self._lock:
+            self.calls += 1
+            self._tokens = min(self.burst, self._tokens + self.max_rate)
+
+    def try_acquire(self):
+        """Spend one hedge from the budget; False if it's used up"""
+        with self._lock:
+            if self._tokens < 1 - 1e-9:  # ten 0.1s don't quite add up to 1.0
+                return False
+            self._tokens -= 1
+            self.hedges += 1
+            return True
+
+    def stats(self):
+        delay = self.delay()
+        return {
+            "hedge_after_ms": round(delay * 1000, 1) if delay is not None else None,
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.calls, 4) if self.calls else None,
+        }
@@ -0,0 +1,171 @@
+# import_legacy.py
+"""Copy a legacy symptom_chatbot.db into the current schema.
+
+The legacy layout keeps ``end_time`` on sessions, message bodies in
+``messages.text``, results in ``results.response_json`` and ISO-8601
+(``T``-separated) TEXT timestamps.  Sessions are imported first and get
+new ids, recorded in legacy_session_map; messages and results follow,
+re-pointed at the new ids.  Legacy results without an api_name are filed
+as "legacy", and sessions pick up their triage_level as usual.
+
+Each table is copied in id order, ``--batch`` rows per transaction, with
+the legacy database ATTACHed so rows go straight from one file to the
+other.  The transaction that copies a batch also advances that table's
+row in legacy_import_checkpoints, so an interrupted import resumes where
+it stopped and importing the same file again adds nothing.
+
+    python import_legacy.py symptom_chatbot.db --db symptom_checker.db
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import db_helpers
+from db_helpers import _UPDATE_TRIAGE_LEVEL_SQL, _triage_level_update, get_pool
+
+LEGACY_TABLES = ("sessions", "messages", "results")
+
+# ISO "2025-11-16T09:35:01.436344" -> "2025-11-16 09:35:01.436344", the
+# format the app writes
+_TS = "replace({}, 'T', ' ')"
+
+_BATCH_END_SQL = "SELECT MAX(id) FROM (SELECT id FROM legacy.{table} WHERE id > ? ORDER BY id LIMIT ?)"
+
+_COPY_SQL = {
+    # Legacy hashes are kept, prefixed so they can't collide with ours; the
+    # UNIQUE session_hash makes re-copying a session a no-op
+    "sessions": f'''
+        INSERT OR IGNORE INTO sessions (session_hash, start_time, age, gender, patient_name)
+        SELECT 'legacy:' || COALESCE(l.session_hash, l.id), {_TS.format("l.start_time")}, l.age, l.gender, l.patient_name
+        FROM legacy.sessions l
+        WHERE l.id > ? AND l.id <= ?
+        ORDER BY l.id
+    ''',
+    "messages": f'''
+        INSERT INTO messages (session_id, role, content, timestamp)
+        SELECT map.session_id, l.role, l.text, {_TS.format("l.timestamp")}
+        FROM legacy.messages l
+        JOIN legacy_session_map map ON map.source = ? AND map.legacy_id = l.session_id
+        WHERE l.id > ? AND l.id <= ?
+        ORDER BY l.id
+    ''',
+    "results": f'''
+        INSERT INTO results (session_id, api_name, result, timestamp)
+        SELECT map.session_id, COALESCE(l.api_name, 'legacy'), l.response_json, {_TS.format("l.timestamp")}
+        FROM legacy.results l
+        JOIN legacy_session_map map ON map.source = ? AND map.legacy_id = l.session_id
+        WHERE l.id > ? AND l.id <= ?
+        ORDER BY l.id
+    ''',
+}
+
+_MAP_SESSIONS_SQL = '''
+    INSERT OR IGNORE INTO legacy_session_map (source, legacy_id, session_id)
+    SELECT ?, l.id, s.id
+    FROM legacy.sessions l
+    JOIN sessions s ON s.session_hash = 'legacy:' || COALESCE(l.session_hash, l.id)
+    WHERE l.id > ? AND l.id <= ?
+'''
+
+_RESULT_LEVELS_SQL = '''
+    SELECT map.session_id, l.response_json
+    FROM legacy.results l
+    JOIN legacy_session_map map ON map.source = ? AND map.legacy_id = l.session_id
+    WHERE l.id > ? AND l.id <= ?
+'''
+
+_CHECKPOINT_SQL = '''
+    INSERT INTO legacy_import_checkpoints (source, table_name, last_id, rows_imported, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (source, table_name)
+    DO UPDATE SET last_id = excluded.last_id, rows_imported = rows_imported + excluded.rows_imported,
+                  updated_at = excluded.updated_at
+'''
+
+
+def _checkpoint(conn, source, table):
+    row = conn.execute("SELECT last_id FROM legacy_import_checkpoints WHERE source = ? AND table_name = ?",
+                       (source, table)).fetchone()
+    return row[0] if row else 0
+
+
+def _copy_batch(conn, source, table, low, high):
+    if table == "sessions":
+        copied = conn.execute(_COPY_SQL[table], (low, high)).rowcount
+        conn.execute(_MAP_SESSIONS_SQL, (source, low, high))
+        return copied
+    copied = conn.execute(_COPY_SQL[table], (source, low, high)).rowcount
+    if table == "results":
+        updates = []
+        for session_id, response_json in conn.execute(_RESULT_LEVELS_SQL, (source, low, high)):
+            try:
+                updates.append(_triage_level_update(session_id, json.loads(response_json)))
+            except (json.JSONDecodeError, TypeError):
+                continue
+        conn.executemany(_UPDATE_TRIAGE_LEVEL_SQL, updates)
+    return copied
+
+
+def import_legacy(legacy_path, batch_size=50000, progress=None):
+    """Import (or finish importing) ``legacy_path`` into db_helpers.DB_PATH.
+
+    ``progress``, if given, is called with ``(table, last_id, rows)`` after
+    each committed batch.  Returns ``{table: rows imported}`` for this run
+    plus ``seconds`` and ``rows_per_second``.
+    """
+    source = os.path.realpath(legacy_path)
+    stats = dict.fromkeys(LEGACY_TABLES, 0)
+    started = time.perf_counter()
+    with get_pool().connection() as conn:
+        # ATTACH can't run inside a transaction
+        conn.commit()
+        conn.execute("ATTACH DATABASE ? AS legacy", (source,))
+        try:
+            for table in LEGACY_TABLES:
+                last_id = _checkpoint(conn, source, table)
+                while True:
+                    high = conn.execute(_BATCH_END_SQL.format(table=table), (last_id, batch_size)).fetchone()[0]
+                    if high is None:
+                        break
+                    copied = _copy_batch(conn, source, table, last_id, high)
+                    conn.execute(_CHECKPOINT_SQL, (source, table, high, copied, datetime.utcnow()))
+                    conn.commit()
+                    last_id = high
+                    stats[table] += copied
+                    if progress:
+                        progress(table, last_id, stats[table])
+        finally:
+            conn.commit()
+            conn.execute("DETACH DATABASE legacy")
+    seconds = time.perf_counter() - started
+    rows = sum(stats[table] for table in LEGACY_TABLES)
+    return dict(stats, seconds=round(seconds, 2), rows_per_second=round(rows / seconds, 1) if seconds else None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("legacy_db", help="legacy database to import, e.g. symptom_chatbot.db")
+    parser.add_argument("--db", default=db_helpers.DB_PATH, help="database to import into (default: %(default)s)")
+    parser.add_argument("--batch", type=int, default=50000, help="rows per transaction (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.legacy_db):
+        parser.error(f"{args.legacy_db} does not exist")
+
+    db_helpers.DB_PATH = args.db
+    db_helpers.init_db()
+
+    def progress(table, last_id, rows):
+        print(f"{table}: {rows} rows imported (legacy id {last_id})", file=sys.stderr)
+
+    stats = import_legacy(args.legacy_db, batch_size=args.batch, progress=progress)
+    print(f"Imported {stats['sessions']} sessions, {stats['messages']} messages and {stats['results']} results "
+          f"in {stats['seconds']} s ({stats['rows_per_second']} rows/s)")
+    db_helpers.close_pool()
+    return stats
+
+
+if __name__ == "__main__":
+    main()
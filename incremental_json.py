@@ -0,0 +1,107 @@
+# incremental_json.py
+import json
+
+
+class JSONFieldStream:
+    """Pull the top-level fields out of a JSON object that arrives in pieces.
+
+    ``feed()`` takes the next chunk of text and returns the ``(key, value)``
+    pairs completed by it, so a consumer can use ``"triage"`` while the
+    model is still writing ``"summary"``.  Anything before the first ``{``
+    (a markdown fence, say) is skipped.  String values are emitted when their
+    closing quote arrives, arrays and objects when their closing bracket
+    does, and numbers, booleans and null at the following ``,`` or ``}``.
+    A value that doesn't decode is dropped; the caller still has the full
+    text to parse at the end.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "key"  # key -> colon -> value -> comma -> key ...
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+
+    def feed(self, chunk):
+        if self.done or not chunk:
+            return []
+        self._text += chunk
+        fields = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._expect == "key":
+                            self._key = self._decode(self._key_start, i + 1)
+                            self._expect = "colon"
+                        elif self._expect == "value":
+                            self._emit(fields, i + 1)
+                continue
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._expect == "key":
+                        self._key_start = i
+                    elif self._expect == "value" and self._value_start is None:
+                        self._value_start = i
+                continue
+            if self._depth == 1 and self._expect == "colon":
+                if c == ":":
+                    self._expect = "value"
+                    self._value_start = None
+                continue
+            if self._depth == 1 and self._expect == "value" and self._value_start is None and not c.isspace():
+                self._value_start = i
+            if c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._expect == "value":
+                    # A nested array/object value just closed
+                    self._emit(fields, i + 1)
+                elif self._depth == 0:
+                    if self._expect == "value" and self._value_start is not None:
+                        self._emit(fields, i)
+                    self.done = True
+                    break
+            elif c == "," and self._depth == 1:
+                if self._expect == "value" and self._value_start is not None:
+                    self._emit(fields, i)
+                self._expect = "key"
+        self._pos = len(text)
+        return fields
+
+    def _decode(self, start, end):
+        try:
+            return json.loads(self._text[start:end])
+        except ValueError:
+            return None
+
+    def _emit(self, fields, end):
+        value_text = self._text[self._value_start:end].strip()
+        self._value_start = None
+        self._expect = "comma"
+        try:
+            value = json.loads(value_text)
+        except ValueError:
+            return
+        if self._key is not None:
+            fields.append((self._key, value))
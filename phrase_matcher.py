@@ -0,0 +1,149 @@
+# phrase_matcher.py
+from collections import deque, namedtuple
+
+# One hit: the phrase as registered, its tag, [start, end) offsets into the
+# lower-cased text, and whether a negation cue governs it.
+PhraseMatch = namedtuple("PhraseMatch", "phrase tag start end negated")
+
+# A phrase only counts as negated when a denial cue governs it directly:
+# the cue is the word right before it ("no chest pain", "denies shortness of
+# breath", "without any severe bleeding", "never had chest pain").  A cue
+# anywhere else in the sentence may belong to another verb ("the painkillers
+# don't help my chest pain", "no relief from chest pain"), and a missed
+# negation only over-triages while a false one hides an emergency.
+NEGATION_CUES = frozenset(["no", "without", "nor", "denies", "denied", "deny", "denying"])
+NEGATION_CUE_PAIRS = frozenset([("never", "had"), ("never", "have"), ("never", "experienced")])
+# May stand between the cue and the phrase ("denies any chest pain")
+NEGATION_FILLERS = frozenset(["any"])
+# "never had chest pain this bad" / "like this" compares, it doesn't deny
+COMPARATIVE_AFTER_PHRASE = frozenset(["this", "that", "so", "like", "as", "before", "until"])
+# The cue must be in the same clause
+CLAUSE_BREAK_CHARS = frozenset(".,;:!?\n()/&+")
+# Enough text to hold the cue words
+NEGATION_LOOKBACK_CHARS = 40
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class PhraseMatcher:
+    """Aho-Corasick matcher over a fixed set of lower-case phrases.
+
+    The automaton is built once; each scan is a single pass over the text,
+    so its cost grows with the text length (plus the number of hits), not
+    with the number of phrases.
+
+    ``phrases`` is an iterable of strings or ``(phrase, tag)`` pairs.  With
+    ``word_start`` a match must begin at a word boundary ("cold" doesn't
+    match "scold"); it may still end mid-word, so "breath" matches
+    "breathing" and "chest pain" matches "chest pains".  With
+    ``word_end`` it must end at one too.  ``negation=True`` marks matches
+    directly governed by a negation cue (see NEGATION_CUES); pass a set of tags
+    instead to only check phrases carrying those tags.
+    """
+
+    def __init__(self, phrases, word_start=True, word_end=False, negation=False):
+        self.word_start = word_start
+        self.word_end = word_end
+        self.negation = negation
+        self._negation_tags = None if negation is True or not negation else frozenset(negation)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        self.phrases = []
+        for item in phrases:
+            phrase, tag = item if isinstance(item, tuple) else (item, None)
+            phrase = phrase.lower()
+            if phrase:
+                self._add(phrase, tag)
+        self._build_failure_links()
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def _add(self, phrase, tag):
+        state = 0
+        for ch in phrase:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + ((phrase, tag, len(phrase)),)
+        self.phrases.append((phrase, tag))
+
+    def _build_failure_links(self):
+        goto, fail, out = self._goto, self._fail, self._out
+        pending = deque(goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, nxt in goto[state].items():
+                pending.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                # Inherit the outputs of the longest proper suffix
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+
+    def _accept(self, text, start, end):
+        if self.word_start and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if self.word_end and end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
+
+    def _is_negated(self, text, start, end):
+        window = text[max(0, start - NEGATION_LOOKBACK_CHARS):start]
+        for i in range(len(window) - 1, -1, -1):
+            if window[i] in CLAUSE_BREAK_CHARS:
+                window = window[i + 1:]
+                break
+        words = window.split()
+        while words and words[-1] in NEGATION_FILLERS:
+            words.pop()
+        if not words:
+            return False
+        if words[-1] in NEGATION_CUES:
+            return True
+        if tuple(words[-2:]) in NEGATION_CUE_PAIRS:
+            following = text[end:end + 20].split()
+            return not (following and following[0].strip(".,;:!?") in COMPARATIVE_AFTER_PHRASE)
+        return False
+
+    def _scan(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for phrase, tag, length in out[state]:
+                    start = i + 1 - length
+                    if self._accept(text, start, i + 1):
+                        yield phrase, tag, start, i + 1
+
+    def finditer(self, text):
+        """Yield every PhraseMatch in ``text`` (matching is case-insensitive)"""
+        text = (text or "").lower()
+        for phrase, tag, start, end in self._scan(text):
+            negated = (bool(self.negation)
+                       and (self._negation_tags is None or tag in self._negation_tags)
+                       and self._is_negated(text, start, end))
+            yield PhraseMatch(phrase, tag, start, end, negated)
+
+    def findall(self, text):
+        return list(self.finditer(text))
+
+    def search(self, text, tag=None):
+        """First non-negated match (optionally with the given tag), or None"""
+        for match in self.finditer(text):
+            if not match.negated and (tag is None or match.tag == tag):
+                return match
+        return None
@@ -0,0 +1,233 @@
+# request_profiler.py
+"""Opt-in, in-place profiling of individual requests.
+
+install_profiler() wraps the app's WSGI callable.  A request is profiled
+if it carries the trigger header (``X-Profile: 1``, or the configured
+token when one is set) or if it is picked at ``sample_rate``.  A profiled
+request runs under cProfile, and a sampler thread records its stack every
+``interval`` seconds.  When the response body has been sent, two files
+are written to ``directory``:
+
+    <stem>.pstats     cProfile stats (python -m pstats, snakeviz)
+    <stem>.collapsed  "frame;frame;frame count" lines, the input
+                      flamegraph.pl, inferno and speedscope expect
+
+Async views run their coroutine on an asgiref event-loop thread, not the
+request thread.  That thread gets its own cProfile pass and is sampled
+too.  Work handed to the shared DeepSeek loop (symptom_api) is not
+followed; it is network wait anyway.  The response carries
+``X-Profile-Id: <stem>``.  Only the newest ``keep`` profiles are kept.
+
+When the profiler is not installed, the app has no hooks at all.  When
+it is installed, a request that isn't picked costs one header lookup and
+one random().
+"""
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIXES = (".pstats", ".collapsed")
+
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class _ProfiledRequest:
+    """cProfile passes and stack samples for one request"""
+
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.profile = cProfile.Profile()
+        self.extra_profiles = []
+        self.thread_ids = {threading.get_ident()}
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profiler-{name}", daemon=True)
+
+    def start(self):
+        self._sampler.start()
+        self.resume()
+
+    def resume(self):
+        self.thread_ids.add(threading.get_ident())
+        self.profile.enable()
+
+    def pause(self):
+        self.profile.disable()
+
+    def stop(self):
+        self.pause()
+        self._stop.set()
+        self._sampler.join()
+        return time.perf_counter() - self.started
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.thread_ids):
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, directory):
+        stats = pstats.Stats(self.profile)
+        for profile in self.extra_profiles:
+            stats.add(profile)
+        stem = os.path.join(directory, self.name)
+        stats.dump_stats(stem + ".pstats")
+        with open(stem + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return stem
+
+
+class _ProfiledBody:
+    """Keeps profiling while the server iterates the response, then writes it out"""
+
+    def __init__(self, body, run, profiler):
+        self._body = body
+        self._run = run
+        self._profiler = profiler
+
+    def __iter__(self):
+        iterator = iter(self._body)
+        while True:
+            self._run.resume()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._run.pause()
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            self._profiler.finish(self._run)
+
+
+class RequestProfiler:
+    """WSGI middleware; see the module docstring"""
+
+    def __init__(self, wsgi_app, directory, sample_rate=0.0, header="X-Profile", token=None, keep=200,
+                 interval=0.005):
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.environ_key = "HTTP_" + header.upper().replace("-", "_")
+        self.token = token
+        self.keep = keep
+        self.interval = interval
+        self.profiled = 0
+        self._local = threading.local()
+        self._rotate_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def wanted(self, environ):
+        value = environ.get(self.environ_key)
+        if value:
+            # With a token configured, the header must carry it; anyone can
+            # send a header, and profiles reveal code paths
+            return value == self.token if self.token else value.lower() in ("1", "true", "yes")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self.wanted(environ):
+            return self.wsgi_app(environ, start_response)
+
+        path = re.sub(r"[^A-Za-z0-9]+", "_", environ.get("PATH_INFO", "")).strip("_") or "root"
+        name = (f"{datetime.now():%Y%m%dT%H%M%S}-{environ.get('REQUEST_METHOD', 'GET')}-{path[:60]}-"
+                f"{uuid.uuid4().hex[:8]}")
+        run = _ProfiledRequest(name, self.interval)
+
+        def profiled_start_response(status, headers, exc_info=None):
+            return start_response(status, headers + [("X-Profile-Id", name)], exc_info)
+
+        self._local.run = run
+        run.start()
+        try:
+            body = self.wsgi_app(environ, profiled_start_response)
+        except BaseException:
+            self.finish(run)
+            raise
+        finally:
+            run.pause()
+            self._local.run = None
+        return _ProfiledBody(body, run, self)
+
+    def wrap_async_to_sync(self, async_to_sync):
+        """Profile the coroutine of an async view on the loop thread it runs on"""
+        def wrapped(func):
+            run = getattr(self._local, "run", None)
+            if run is None:
+                return async_to_sync(func)
+
+            async def profiled(*args, **kwargs):
+                profile = cProfile.Profile()
+                run.thread_ids.add(threading.get_ident())
+                profile.enable()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    profile.disable()
+                    run.extra_profiles.append(profile)
+
+            return async_to_sync(profiled)
+        return wrapped
+
+    def finish(self, run):
+        seconds = run.stop()
+        try:
+            stem = run.write(self.directory)
+        except OSError as e:
+            logger.error("Could not write request profile %s: %s", run.name, e)
+            return
+        self.profiled += 1
+        logger.info("Profiled request in %.1f ms: %s.{pstats,collapsed}", seconds * 1000, stem)
+        self.rotate()
+
+    def rotate(self):
+        """Delete all but the newest ``keep`` profiles"""
+        with self._rotate_lock:
+            stems = {}
+            for entry in os.scandir(self.directory):
+                stem, ext = os.path.splitext(entry.name)
+                if ext in PROFILE_SUFFIXES:
+                    stems[stem] = max(stems.get(stem, 0), entry.stat().st_mtime)
+            for stem in sorted(stems, key=stems.get)[:max(0, len(stems) - self.keep)]:
+                for suffix in PROFILE_SUFFIXES:
+                    try:
+                        os.remove(os.path.join(self.directory, stem + suffix))
+                    except FileNotFoundError:
+                        pass
+
+
+def install_profiler(app, directory, **options):
+    """Wrap a Flask ``app`` with a RequestProfiler writing to ``directory``"""
+    profiler = RequestProfiler(app.wsgi_app, directory, **options)
+    app.wsgi_app = profiler
+    app.async_to_sync = profiler.wrap_async_to_sync(app.async_to_sync)
+    return profiler
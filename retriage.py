@@ -0,0 +1,217 @@
+# retriage.py
+"""Re-run triage over stored sessions and record what would change.
+
+Each user message that got a result is triaged again with the current
+RED_FLAGS and mock rules, and the pair is written to the retriage_diffs
+table (or a CSV file) when the outcome differs from the stored one: a
+different provider (red flag vs. mock), triage level, or mock triage text.
+Only results from the providers in ``--apis`` (mock and redflag by
+default) are compared; DeepSeek answers can't be reproduced offline.
+
+Sessions are read in id order, ``--chunk`` at a time, so memory stays flat
+however large the database is, and each chunk is triaged on a
+multiprocessing pool with a bounded number of chunks in flight.
+
+    python retriage.py --db symptom_checker.db --workers 4
+    python retriage.py --csv diffs.csv
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import sys
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+import db_helpers
+from db_helpers import classify_triage_level, get_pool
+from symptom_api import call_symptom_api_mock, screen_symptoms
+
+DIFF_COLUMNS = ("message_id", "session_id", "old_api_name", "old_triage", "old_level",
+                "new_api_name", "new_triage", "new_level")
+
+_SESSION_IDS_SQL = "SELECT id FROM sessions WHERE id > ? ORDER BY id LIMIT ?"
+_USER_MESSAGES_SQL = '''
+    SELECT session_id, id, content, timestamp
+    FROM messages
+    WHERE session_id BETWEEN ? AND ? AND role = 'user'
+'''
+_RESULTS_SQL = '''
+    SELECT session_id, id, api_name, result, timestamp
+    FROM results
+    WHERE session_id BETWEEN ? AND ?
+'''
+_INSERT_DIFF_SQL = '''
+    INSERT INTO retriage_diffs (run_id, message_id, session_id, old_api_name, old_triage, old_level,
+                                new_api_name, new_triage, new_level, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def read_chunks(chunk_sessions=500):
+    """Yield lists of ``(message_id, session_id, content, api_name, result_json)``.
+
+    A result belongs to the latest user message of its session logged at
+    or before it; a message with no result (small talk in the chat) is
+    left out, as is any result after the first for the same message.
+    """
+    last_id = 0
+    while True:
+        with get_pool().connection() as conn:
+            ids = [row[0] for row in conn.execute(_SESSION_IDS_SQL, (last_id, chunk_sessions))]
+            if not ids:
+                return
+            bounds = (ids[0], ids[-1])
+            events = [(ts or "", 0, msg_id, session_id, content)
+                      for session_id, msg_id, content, ts in conn.execute(_USER_MESSAGES_SQL, bounds)]
+            events += [(ts or "", 1, result_id, session_id, (api_name, result))
+                       for session_id, result_id, api_name, result, ts in conn.execute(_RESULTS_SQL, bounds)]
+        last_id = ids[-1]
+        # Messages sort ahead of results logged in the same (second-resolution) tick
+        events.sort(key=lambda e: (e[3], e[0], e[1], e[2]))
+        pairs = []
+        pending = {}  # session_id -> (message_id, content) awaiting its result
+        for _, kind, row_id, session_id, payload in events:
+            if kind == 0:
+                pending[session_id] = (row_id, payload)
+            elif session_id in pending:
+                message_id, content = pending.pop(session_id)
+                pairs.append((message_id, session_id, content) + payload)
+        if pairs:
+            yield pairs
+
+
+def _new_triage(content):
+    red_flags = screen_symptoms(content)["red_flags"]
+    if red_flags:
+        return "redflag", "red flag: " + ", ".join(sorted({m.phrase for m in red_flags})), "emergency"
+    result = call_symptom_api_mock(content)
+    return "mock", result.get("triage"), classify_triage_level(result)
+
+
+def retriage_rows(rows, apis=("mock", "redflag")):
+    """Triage a chunk again; returns ``(diffs, compared)``"""
+    diffs = []
+    compared = 0
+    for message_id, session_id, content, old_api, old_json in rows:
+        if old_api not in apis:
+            continue
+        compared += 1
+        try:
+            old = json.loads(old_json)
+        except ValueError:
+            old = {}
+        old_triage = old.get("triage") if isinstance(old, dict) else None
+        old_level = classify_triage_level(old if isinstance(old, dict) else None)
+        new_api, new_triage, new_level = _new_triage(content)
+        if (new_api, new_level) != (old_api, old_level) or (new_api == "mock" and new_triage != old_triage):
+            diffs.append((message_id, session_id, old_api, old_triage, old_level, new_api, new_triage, new_level))
+    return diffs, compared
+
+
+class TableSink:
+    """Append diffs to retriage_diffs under one run id"""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+
+    def write(self, diffs):
+        created_at = datetime.utcnow()
+        with get_pool().connection() as conn:
+            conn.executemany(_INSERT_DIFF_SQL, [(self.run_id,) + diff + (created_at,) for diff in diffs])
+
+    def close(self):
+        pass
+
+
+class CSVSink:
+    def __init__(self, path):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(DIFF_COLUMNS)
+
+    def write(self, diffs):
+        self._writer.writerows(diffs)
+
+    def close(self):
+        self._file.close()
+
+
+def run_retriage(sink, workers=None, chunk_sessions=500, apis=("mock", "redflag"), progress=None):
+    """Re-triage every stored user message, sending diffs to ``sink``.
+
+    ``workers=0`` triages in this process.  ``progress``, if given, is
+    called with the running stats after every chunk.  Returns the stats:
+    rows read, rows compared, diffs, seconds and rows per second.
+    """
+    stats = {"rows": 0, "compared": 0, "diffs": 0}
+    started = time.perf_counter()
+
+    def collect(rows, outcome):
+        diffs, compared = outcome
+        sink.write(diffs)
+        stats["rows"] += rows
+        stats["compared"] += compared
+        stats["diffs"] += len(diffs)
+        if progress:
+            progress(_with_rate(stats, started))
+
+    if workers == 0:
+        for chunk in read_chunks(chunk_sessions):
+            collect(len(chunk), retriage_rows(chunk, apis))
+    else:
+        workers = workers or multiprocessing.cpu_count()
+        with multiprocessing.Pool(workers) as pool:
+            # Bounded queue of chunks in flight, so a fast reader can't pile
+            # the whole table up in memory ahead of the workers
+            in_flight = deque()
+            for chunk in read_chunks(chunk_sessions):
+                in_flight.append((len(chunk), pool.apply_async(retriage_rows, (chunk, apis))))
+                if len(in_flight) >= 2 * workers:
+                    rows, pending = in_flight.popleft()
+                    collect(rows, pending.get())
+            while in_flight:
+                rows, pending = in_flight.popleft()
+                collect(rows, pending.get())
+    sink.close()
+    return _with_rate(stats, started)
+
+
+def _with_rate(stats, started):
+    seconds = time.perf_counter() - started
+    return dict(stats, seconds=round(seconds, 2), rows_per_second=round(stats["rows"] / seconds, 1) if seconds else None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=db_helpers.DB_PATH, help="database to re-triage (default: %(default)s)")
+    parser.add_argument("--csv", help="write diffs to this CSV file instead of the retriage_diffs table")
+    parser.add_argument("--workers", type=int, default=None, help="pool size; 0 runs in-process (default: CPU count)")
+    parser.add_argument("--chunk", type=int, default=500, help="sessions per chunk (default: %(default)s)")
+    parser.add_argument("--apis", default="mock,redflag", help="stored providers to compare (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    db_helpers.DB_PATH = args.db
+    db_helpers.init_db()
+    run_id = uuid.uuid4().hex[:12]
+    sink = CSVSink(args.csv) if args.csv else TableSink(run_id)
+    last_report = [time.perf_counter()]
+
+    def progress(stats):
+        if time.perf_counter() - last_report[0] >= 5:
+            last_report[0] = time.perf_counter()
+            print(f"{stats['rows']} rows, {stats['diffs']} diffs, {stats['rows_per_second']} rows/s", file=sys.stderr)
+
+    stats = run_retriage(sink, workers=args.workers, chunk_sessions=args.chunk,
+                         apis=tuple(api.strip() for api in args.apis.split(",")), progress=progress)
+    target = args.csv or f"retriage_diffs (run_id {run_id})"
+    print(f"Re-triaged {stats['rows']} messages ({stats['compared']} compared) in {stats['seconds']} s, "
+          f"{stats['rows_per_second']} rows/s; {stats['diffs']} diffs written to {target}")
+    db_helpers.close_pool()
+    return stats
+
+
+if __name__ == "__main__":
+    main()
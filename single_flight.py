@@ -0,0 +1,62 @@
+# single_flight.py
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one in-flight call.
+
+    The first caller for a key (the leader) starts the work; everyone who
+    asks for that key before it finishes gets the same
+    concurrent.futures.Future, so its result, or its exception, reaches
+    every waiter.  The key is forgotten as soon as the call completes:
+    this only merges calls that overlap in time, caching is someone
+    else's job.  A waiter that gives up (``timeout``) doesn't cancel the
+    shared call.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def submit(self, key, start):
+        """Return ``(future, is_leader)`` for ``key``.
+
+        ``start()`` is only called by the leader and must return a
+        concurrent.futures.Future without blocking (e.g.
+        ``asyncio.run_coroutine_threadsafe``).
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = start()
+            self._inflight[key] = future
+            self.leaders += 1
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future, True
+
+    def do(self, key, fn, timeout=None):
+        """Blocking flavour: run ``fn()`` once per overlapping group of callers.
+
+        The leader runs ``fn`` on its own thread; the others wait up to
+        ``timeout`` seconds for its outcome (TimeoutError after that).
+        """
+        future, is_leader = self.submit(key, Future)
+        if is_leader:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+        return future.result(timeout=None if is_leader else timeout)
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "coalesced": self.coalesced}
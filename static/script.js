@@ -138,11 +138,13 @@ document.addEventListener("DOMContentLoaded", () => {
     // Medical query - proceed with analysis
     showLoading(true);
 
-    fetch("/check", {
+    // Streamed: the advice shows up as soon as the model has written it,
+    // the full assessment card when the result is complete
+    fetch("/check/stream", {
       method: "POST",
       headers: { 
         "Content-Type": "application/json",
-        "Accept": "application/json"
+        "Accept": "text/event-stream"
       },
       body: JSON.stringify({ 
         age: age || null, 
@@ -154,34 +156,38 @@ document.addEventListener("DOMContentLoaded", () => {
     })
     .then(response => {
       if (!response.ok) {
-        throw new Error(`Server error: ${response.status}`);
+        return response.json().then(
+          result => { throw new Error(result.error || `Server error: ${response.status}`); },
+          () => { throw new Error(`Server error: ${response.status}`); }
+        );
       }
-      return response.json();
-    })
-    .then(result => {
-      hideTypingIndicator();
-      showLoading(false);
-      
-      if (result.error) {
-        addMessage("bot", `I encountered an error: ${result.error}`);
-        return;
-      }
-
-      // Store session ID for follow-up questions
-      currentSessionId = result.session_id;
-      
-      // Add bot response with analysis
-      const analysis = result.result;
-      addMessage("bot", analysis.advice || "I've analyzed your symptoms.");
-      
-      // Show detailed analysis results
-      displayAnalysisResults(analysis);
-      
-      // Add follow-up suggestion
-      setTimeout(() => {
-        addMessage("bot", "Is there anything else you'd like to know about your symptoms or would you like to describe additional symptoms?");
-      }, 500);
-      
+      let adviceShown = false;
+      return readEventStream(response, (event, data) => {
+        if (event === "session") {
+          // Store session ID for follow-up questions
+          currentSessionId = data.session_id;
+        } else if (event === "field" && data.name === "advice" && !adviceShown) {
+          adviceShown = true;
+          hideTypingIndicator();
+          showLoading(false);
+          addMessage("bot", data.value || "I've analyzed your symptoms.");
+        } else if (event === "result") {
+          hideTypingIndicator();
+          showLoading(false);
+          const analysis = data.result;
+          if (!adviceShown) {
+            addMessage("bot", analysis.advice || "I've analyzed your symptoms.");
+          }
+          
+          // Show detailed analysis results
+          displayAnalysisResults(analysis);
+          
+          // Add follow-up suggestion
+          setTimeout(() => {
+            addMessage("bot", "Is there anything else you'd like to know about your symptoms or would you like to describe additional symptoms?");
+          }, 500);
+        }
+      });
     })
     .catch(error => {
       hideTypingIndicator();
@@ -195,6 +201,43 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   }
 
+  // Read a text/event-stream response, calling onEvent(event, data) per event
+  function readEventStream(response, onEvent) {
+    let buffer = "";
+    const dispatch = (block) => {
+      let event = "message";
+      let data = "";
+      block.split("\n").forEach(line => {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      });
+      if (data) onEvent(event, JSON.parse(data));
+    };
+    const drain = (final) => {
+      const blocks = buffer.split("\n\n");
+      buffer = final ? "" : blocks.pop();
+      blocks.filter(block => block.trim()).forEach(dispatch);
+    };
+
+    if (!response.body || !window.TextDecoder) {
+      // No streaming support: handle everything once it has arrived
+      return response.text().then(text => { buffer = text; drain(true); });
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const pump = () => reader.read().then(({ done, value }) => {
+      if (done) {
+        buffer += decoder.decode();
+        drain(true);
+        return;
+      }
+      buffer += decoder.decode(value, { stream: true });
+      drain(false);
+      return pump();
+    });
+    return pump();
+  }
+
   function addMessage(sender, text) {
     const messageDiv = document.createElement("div");
     messageDiv.className = `message ${sender}-message`;
@@ -0,0 +1,150 @@
+# structured_logging.py
+"""JSON-lines logging written by a background thread.
+
+configure_logging() puts a single QueueHandler on the root logger.  A
+request thread that logs pays for the level check, the sampling decision
+and the message merge, then puts the record on an in-memory queue.  A
+QueueListener thread does the JSON encoding, traceback formatting and the
+write to stderr.  Log calls use %-style arguments, so a disabled statement
+is only a level check and its message is never built.
+
+Levels are per logger: LOG_LEVEL sets the root and LOG_LEVELS overrides
+individual loggers ("symptom_api=DEBUG,werkzeug=WARNING").  High-volume
+events are logged with ``extra={"event": name}``.  LOG_SAMPLE keeps only a
+fraction of each named event ("deepseek.raw_response=0.01"; see
+DEFAULT_SAMPLE_RATES), and every sampled line records the rate it was
+kept at.  Other ``extra`` fields
+appear as top-level JSON keys.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+# Used when LOG_SAMPLE isn't set: one raw LLM reply and request line in a hundred
+DEFAULT_SAMPLE_RATES = {"deepseek.raw_response": 0.01, "deepseek.request": 0.01}
+
+_listener = None
+
+
+def parse_levels(spec):
+    """"symptom_api=DEBUG,werkzeug=WARNING" -> {"symptom_api": "DEBUG", "werkzeug": "WARNING"}"""
+    levels = {}
+    for part in (spec or "").split(","):
+        name, sep, level = part.partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def parse_sample_rates(spec):
+    """"deepseek.raw_response=0.01" -> {"deepseek.raw_response": 0.01}"""
+    rates = {}
+    for name, rate in parse_levels(spec).items():
+        try:
+            rates[name] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, extras, exc"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep ``rate`` of the records for each sampled ``event``; the rest pass through"""
+
+    def __init__(self, rates, rng=random.random):
+        super().__init__()
+        self.rates = dict(rates)
+        self._rng = rng
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None:
+            return True
+        if rate < 1.0 and self._rng() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Merge the arguments now, while they still hold the values that were
+        # logged, but leave the JSON encoding and traceback to the listener
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def configure_logging(level=None, levels=None, sample_rates=None, stream=None, force=False):
+    """Route all logging through the background JSON writer.
+
+    Arguments default to the LOG_LEVEL, LOG_LEVELS and LOG_SAMPLE
+    environment variables.  Like logging.basicConfig this does nothing if
+    the root logger already has handlers, unless ``force``.  Returns the
+    running QueueListener, or None if nothing was changed.
+    """
+    global _listener
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return None
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    stop_logging()
+
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    for name, logger_level in (parse_levels(os.getenv("LOG_LEVELS")) if levels is None else levels).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    if sample_rates is None:
+        spec = os.getenv("LOG_SAMPLE")
+        sample_rates = DEFAULT_SAMPLE_RATES if spec is None else parse_sample_rates(spec)
+    handler.addFilter(SamplingFilter(sample_rates))
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JSONFormatter())
+    _listener = logging.handlers.QueueListener(records, writer, respect_handler_level=True)
+    _listener.start()
+    root.addHandler(handler)
+    return _listener
+
+
+def stop_logging():
+    """Drain the queue and stop the writer thread (also run at exit)"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+atexit.register(stop_logging)
@@ -1,245 +1,29 @@
-<<<<<<< HEAD
-# symptom_api.py
-import os
-import requests
-import json
-from datetime import datetime
-
-RED_FLAGS = [
-    "chest pain",
-    "difficulty breathing",
-    "loss of consciousness",
-    "severe bleeding", 
-    "sudden numbness",
-    "severe headache",
-    "shortness of breath",
-    "persistent vomiting"
-]
-
-def has_red_flag(symptoms_text):
-    s = (symptoms_text or "").lower()
-    return any(flag in s for flag in RED_FLAGS)
-
-def call_symptom_api_mock(symptoms_text, age=None, gender=None):
-    s = (symptoms_text or "").lower()
-    
-    # Enhanced mock responses for better chatbot interaction
-    if "chest pain" in s and ("breath" in s or "dizzy" in s):
-        return {
-            "triage": "🚨 Emergency — seek immediate care",
-            "conditions": [
-                {"name": "Possible heart attack or cardiac issue", "probability": 0.75},
-                {"name": "Severe anxiety or panic attack", "probability": 0.15},
-                {"name": "Pulmonary embolism", "probability": 0.10}
-            ],
-            "advice": "This could be a medical emergency. Call emergency services immediately. Do not drive yourself.",
-            "selfcare": ["Sit down and try to stay calm", "Chew aspirin if available and not allergic", "Loosen tight clothing"],
-            "warning": ["Chest pressure or pain", "Pain spreading to arm/jaw", "Difficulty breathing", "Nausea or dizziness"],
-            "summary": "Chest pain with breathing difficulties requires immediate emergency evaluation."
-        }
-    elif "fever" in s and "cough" in s and "sore throat" in s:
-        return {
-            "triage": "See GP within 24-48 hours",
-            "conditions": [
-                {"name": "Viral upper respiratory infection", "probability": 0.65},
-                {"name": "Influenza (flu)", "probability": 0.25},
-                {"name": "Strep throat", "probability": 0.10}
-            ],
-            "advice": "Rest, stay hydrated, use throat lozenges. Monitor temperature. Consider seeing a doctor if symptoms worsen.",
-            "selfcare": ["Drink warm tea with honey", "Gargle salt water", "Use humidifier", "Rest adequately"],
-            "warning": ["Fever over 102°F", "Difficulty swallowing", "Rash develops", "Symptoms worsen after 3 days"],
-            "summary": "Symptoms suggest common respiratory infection; see doctor if no improvement in 3 days."
-        }
-    elif "fever" in s and "cough" in s:
-        return {
-            "triage": "See GP within 24–48 hours; urgent if breathing worsens",
-            "conditions": [
-                {"name": "Common cold / viral upper respiratory infection", "probability": 0.55},
-                {"name": "Influenza (flu)", "probability": 0.30},
-                {"name": "Acute bronchitis", "probability": 0.10}
-            ],
-            "advice": "Rest, stay hydrated; consider paracetamol for fever. Monitor breathing closely.",
-            "selfcare": ["Drink warm fluids and rest.", "Take paracetamol for fever (follow dosing).", "Gargle warm salt water."],
-            "warning": ["Difficulty breathing", "High fever >3 days", "Bluish lips or chest pain"],
-            "summary": "Your symptoms suggest a viral respiratory infection; monitor breathing closely and see GP if worsening."
-        }
-    elif "headache" in s and "stiff neck" in s:
-        return {
-            "triage": "See doctor immediately",
-            "conditions": [{"name":"Meningitis (possible)","probability":0.45},{"name":"Migraine","probability":0.35}],
-            "advice": "Seek immediate medical attention; this could be serious.",
-            "selfcare": ["Avoid bright lights", "Do not delay medical evaluation"],
-            "warning": ["High fever with neck stiffness", "Seizures or loss of consciousness"],
-            "summary": "Severe headache with neck stiffness can indicate a serious condition. Please seek urgent care."
-        }
-    elif "rash" in s and "fever" in s:
-        return {
-            "triage": "See GP within 24 hours",
-            "conditions": [
-                {"name": "Viral exanthem", "probability": 0.50},
-                {"name": "Allergic reaction", "probability": 0.30},
-                {"name": "Bacterial infection", "probability": 0.15}
-            ],
-            "advice": "Avoid scratching, monitor for spreading. Identify potential allergens.",
-            "selfcare": ["Apply cool compresses", "Use calamine lotion", "Avoid new soaps/detergents"],
-            "warning": ["Rash spreads rapidly", "Difficulty breathing", "Swelling of face/tongue"],
-            "summary": "Rash with fever could be viral or allergic; medical evaluation recommended."
-        }
-    elif "stomach pain" in s and "vomiting" in s:
-        return {
-            "triage": "See GP within 24 hours",
-            "conditions": [
-                {"name": "Gastroenteritis", "probability": 0.60},
-                {"name": "Food poisoning", "probability": 0.25},
-                {"name": "Indigestion", "probability": 0.10}
-            ],
-            "advice": "Rest, clear fluids only for 24 hours, then bland diet.",
-            "selfcare": ["Sip clear fluids", "BRAT diet (bananas, rice, applesauce, toast)", "Rest"],
-            "warning": ["Severe abdominal pain", "Blood in vomit/stool", "Dehydration signs"],
-            "summary": "Likely stomach bug or food poisoning; seek care if symptoms worsen or persist."
-        }
-    elif "back pain" in s and "fever" in s:
-        return {
-            "triage": "See GP within 24 hours",
-            "conditions": [
-                {"name": "Kidney infection", "probability": 0.40},
-                {"name": "Muscular strain", "probability": 0.35},
-                {"name": "Urinary tract infection", "probability": 0.20}
-            ],
-            "advice": "Drink plenty of fluids and rest. See doctor for proper diagnosis.",
-            "selfcare": ["Apply heat pad", "Stay hydrated", "Gentle stretching if muscular"],
-            "warning": ["High fever", "Pain spreading", "Difficulty urinating"],
-            "summary": "Back pain with fever could indicate infection; medical evaluation recommended."
-        }
-    else:
-        return {
-            "triage": "Self-care / monitor",
-            "conditions": [
-                {"name":"Allergic rhinitis or mild viral illness","probability":0.45},
-                {"name":"Indigestion","probability":0.20},
-                {"name":"Stress-related symptoms","probability":0.15}
-            ],
-            "advice": "Monitor symptoms; use OTC medicines as needed. Consult doctor if symptoms persist.",
-            "selfcare": ["Rest and stay hydrated.", "Avoid allergens.", "Practice stress reduction techniques."],
-            "warning": ["High or prolonged fever", "Severe dehydration", "Symptoms worsen after 3 days"],
-            "summary": "Symptoms likely mild and manageable at home; seek care if they worsen."
-        }
-
-def call_deepseek(symptoms_text, age=None, gender=None):
-    API_KEY = os.getenv("DEEPSEEK_API_KEY")
-    
-    if not API_KEY:
-        print("❌ DEEPSEEK_API_KEY not found in environment")
-        return call_symptom_api_mock(symptoms_text, age, gender)
-    
-    print(f"🔑 API Key found: {API_KEY[:8]}...")
-    
-    url = "https://api.deepseek.com/chat/completions"
-    
-    prompt = f"""Analyze these symptoms and provide medical triage advice in JSON format only:
-
-SYMPTOMS: {symptoms_text}
-AGE: {age or 'Not specified'}
-GENDER: {gender or 'Not specified'}
-
-Return ONLY valid JSON with this exact structure:
-{{
-  "triage": "string (e.g., 'Self-care', 'See GP within 24-48 hours', 'Emergency care needed')",
-  "conditions": [{{"name": "condition name", "probability": 0.0}}],
-  "advice": "string with general advice", 
-  "selfcare": ["tip 1", "tip 2"],
-  "warning": ["warning sign 1", "warning sign 2"],
-  "summary": "string with brief summary"
-}}
-
-Be conservative and recommend medical care when uncertain."""
-
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "model": "deepseek-chat",
-        "messages": [
-            {"role": "system", "content": "You are a medical triage assistant. Provide responses in valid JSON format only, no additional text."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.1,
-        "max_tokens": 800,
-        "stream": False
-    }
-
-    try:
-        print(f"🔍 Calling DeepSeek API with symptoms: {symptoms_text[:50]}...")
-        response = requests.post(url, headers=headers, json=payload, timeout=15)
-        
-        print(f"📡 Response Status: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"❌ API Error {response.status_code}: {response.text}")
-            return call_symptom_api_mock(symptoms_text, age, gender)
-        
-        data = response.json()
-        print("✅ Received API response")
-        
-        # Extract the response content
-        if "choices" in data and len(data["choices"]) > 0:
-            content = data["choices"][0]["message"]["content"]
-            print(f"📝 Raw response: {content[:200]}...")
-            
-            # Try to parse JSON from the response
-            try:
-                # Clean the response - remove markdown code blocks if present
-                content_clean = content.replace('```json', '').replace('```', '').strip()
-                parsed = json.loads(content_clean)
-                
-                # Validate required fields
-                required_fields = ["triage", "conditions", "advice", "selfcare", "warning", "summary"]
-                if all(field in parsed for field in required_fields):
-                    print("✅ Successfully parsed JSON response")
-                    return parsed
-                else:
-                    print("❌ Missing required fields in API response")
-                    missing = [field for field in required_fields if field not in parsed]
-                    print(f"Missing fields: {missing}")
-                    
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON parse error: {e}")
-                print(f"Trying to extract JSON from response...")
-                
-                # Try to find JSON in the text
-                start = content.find('{')
-                end = content.rfind('}')
-                if start != -1 and end != -1:
-                    json_str = content[start:end+1]
-                    try:
-                        parsed = json.loads(json_str)
-                        if "triage" in parsed:
-                            print("✅ Extracted JSON from text response")
-                            return parsed
-                    except:
-                        pass
-                
-                print("❌ Could not parse JSON from response")
-                
-        print("❌ Invalid response format from API")
-        return call_symptom_api_mock(symptoms_text, age, gender)
-        
-    except requests.exceptions.Timeout:
-        print("❌ API request timed out")
-    except requests.exceptions.ConnectionError:
-        print("❌ Connection error - check internet connection")
-    except Exception as e:
-        print(f"❌ Unexpected error: {e}")
-    
-    # Fallback to mock data
-=======
 # symptom_api.py
 import os
+import asyncio
+import bisect
 import requests
 import json
+import logging
+import threading
+import atexit
+import time
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # optional: only the async client uses it
+    httpx = None
+
+import metrics
+from circuit_breaker import CircuitBreaker
+from hedging import HedgePolicy
+from phrase_matcher import PhraseMatcher
+from triage_rules import RuleEngine
+
+logger = logging.getLogger(__name__)
 
 RED_FLAGS = [
     "chest pain",
@@ -252,126 +36,162 @@ RED_FLAGS = [
     "persistent vomiting"
 ]
 
+# Words that mark a chat message as a medical query rather than small talk
+MEDICAL_KEYWORDS = [
+    'pain', 'hurt', 'sick', 'fever', 'cough', 'headache', 'nausea', 
+    'vomit', 'dizzy', 'rash', 'swollen', 'bleed', 'breath', 'chest',
+    'stomach', 'throat', 'cold', 'flu', 'symptom', 'feel', 'unwell'
+]
+
+# Built once: a single pass over a message finds both red flags (negation
+# aware, so "no chest pain" doesn't trigger) and medical keywords.
+SYMPTOM_MATCHER = PhraseMatcher(
+    [(flag, "red_flag") for flag in RED_FLAGS] +
+    [(keyword, "keyword") for keyword in MEDICAL_KEYWORDS],
+    negation={"red_flag"}
+)
+
+def screen_symptoms(symptoms_text):
+    """Scan a message once; returns red-flag and keyword PhraseMatch lists"""
+    red_flags, negated_red_flags, keywords = [], [], []
+    for match in SYMPTOM_MATCHER.finditer(symptoms_text):
+        if match.tag == "red_flag":
+            (negated_red_flags if match.negated else red_flags).append(match)
+        else:
+            keywords.append(match)
+    return {"red_flags": red_flags, "negated_red_flags": negated_red_flags, "keywords": keywords}
+
 def has_red_flag(symptoms_text):
-    s = (symptoms_text or "").lower()
-    return any(flag in s for flag in RED_FLAGS)
+    return SYMPTOM_MATCHER.search(symptoms_text, tag="red_flag") is not None
+
+def has_red_flags(texts):
+    """has_red_flag for a whole batch in one matcher pass.
+
+    The texts are joined with newlines, which no phrase contains and which
+    end a negation clause, so nothing matches or negates across records.
+    """
+    lowered = [(text or "").lower() for text in texts]
+    starts = []
+    offset = 0
+    for text in lowered:
+        starts.append(offset)
+        offset += len(text) + 1
+    flagged = [False] * len(lowered)
+    for match in SYMPTOM_MATCHER.finditer("\n".join(lowered)):
+        if match.tag == "red_flag" and not match.negated:
+            flagged[bisect.bisect_right(starts, match.start) - 1] = True
+    return flagged
+
+# DeepSeek HTTP client settings
+DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/chat/completions")
+DEEPSEEK_TIMEOUT = float(os.getenv("DEEPSEEK_TIMEOUT", "15"))
+DEEPSEEK_POOL_SIZE = int(os.getenv("DEEPSEEK_POOL_SIZE", "20"))
+DEEPSEEK_MAX_RETRIES = int(os.getenv("DEEPSEEK_MAX_RETRIES", "2"))
+DEEPSEEK_BACKOFF_FACTOR = float(os.getenv("DEEPSEEK_BACKOFF_FACTOR", "0.3"))
+
+# Shared by the blocking and async clients.  While DeepSeek is failing or
+# slow the breaker opens and calls fall back to the mock immediately instead
+# of each waiting out DEEPSEEK_TIMEOUT.
+DEEPSEEK_BREAKER = CircuitBreaker(
+    window_seconds=float(os.getenv("DEEPSEEK_BREAKER_WINDOW_SECONDS", "60")),
+    min_calls=int(os.getenv("DEEPSEEK_BREAKER_MIN_CALLS", "10")),
+    failure_rate=float(os.getenv("DEEPSEEK_BREAKER_FAILURE_RATE", "0.5")),
+    slow_call_seconds=float(os.getenv("DEEPSEEK_BREAKER_SLOW_CALL_SECONDS", "8")),
+    open_seconds=float(os.getenv("DEEPSEEK_BREAKER_OPEN_SECONDS", "30")),
+    half_open_probes=int(os.getenv("DEEPSEEK_BREAKER_HALF_OPEN_PROBES", "3")),
+)
+
+# Async calls can send a backup request once the primary has taken longer
+# than the recent p95, for at most DEEPSEEK_HEDGE_MAX_RATE of calls.  Off
+# unless DEEPSEEK_HEDGE=1 or the caller asks for it.
+DEEPSEEK_HEDGE = os.getenv("DEEPSEEK_HEDGE", "0") == "1"
+DEEPSEEK_HEDGING = HedgePolicy(
+    percentile=float(os.getenv("DEEPSEEK_HEDGE_PERCENTILE", "95")),
+    max_rate=float(os.getenv("DEEPSEEK_HEDGE_MAX_RATE", "0.1")),
+)
+
+def remaining_seconds(deadline):
+    """Time left before a time.monotonic() ``deadline``, capped at DEEPSEEK_TIMEOUT"""
+    if deadline is None:
+        return DEEPSEEK_TIMEOUT
+    return min(DEEPSEEK_TIMEOUT, deadline - time.monotonic())
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def _build_http_session(pool_size=None, max_retries=None, backoff_factor=None):
+    retry = Retry(
+        total=DEEPSEEK_MAX_RETRIES if max_retries is None else max_retries,
+        connect=DEEPSEEK_MAX_RETRIES if max_retries is None else max_retries,
+        # Don't resend after a read timeout: that would stack another full
+        # timeout onto an already slow request
+        read=0,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["POST"]),
+        backoff_factor=DEEPSEEK_BACKOFF_FACTOR if backoff_factor is None else backoff_factor,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    pool_size = pool_size or DEEPSEEK_POOL_SIZE
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+def get_http_session():
+    """Process-wide keep-alive session for the DeepSeek API, shared by all threads"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                _http_session = _build_http_session()
+    return _http_session
+
+def close_http_session():
+    global _http_session
+    with _http_session_lock:
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
+
+atexit.register(close_http_session)
+
+def _reset_http_session_after_fork():
+    # Pooled sockets belong to the parent process
+    global _http_session, _http_session_lock
+    _http_session = None
+    _http_session_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_http_session_after_fork)
+
+# Mock triage rules live in a JSON table compiled once at import
+TRIAGE_RULES_PATH = os.getenv(
+    "TRIAGE_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "triage_rules.json"))
+MOCK_RULES = RuleEngine.from_file(TRIAGE_RULES_PATH)
 
 def call_symptom_api_mock(symptoms_text, age=None, gender=None):
-    s = (symptoms_text or "").lower()
-    
-    # Enhanced mock responses for better chatbot interaction
-    if "chest pain" in s and ("breath" in s or "dizzy" in s):
-        return {
-            "triage": "🚨 Emergency — seek immediate care",
-            "conditions": [
-                {"name": "Possible heart attack or cardiac issue", "probability": 0.75},
-                {"name": "Severe anxiety or panic attack", "probability": 0.15},
-                {"name": "Pulmonary embolism", "probability": 0.10}
-            ],
-            "advice": "This could be a medical emergency. Call emergency services immediately. Do not drive yourself.",
-            "selfcare": ["Sit down and try to stay calm", "Chew aspirin if available and not allergic", "Loosen tight clothing"],
-            "warning": ["Chest pressure or pain", "Pain spreading to arm/jaw", "Difficulty breathing", "Nausea or dizziness"],
-            "summary": "Chest pain with breathing difficulties requires immediate emergency evaluation."
-        }
-    elif "fever" in s and "cough" in s and "sore throat" in s:
-        return {
-            "triage": "See GP within 24-48 hours",
-            "conditions": [
-                {"name": "Viral upper respiratory infection", "probability": 0.65},
-                {"name": "Influenza (flu)", "probability": 0.25},
-                {"name": "Strep throat", "probability": 0.10}
-            ],
-            "advice": "Rest, stay hydrated, use throat lozenges. Monitor temperature. Consider seeing a doctor if symptoms worsen.",
-            "selfcare": ["Drink warm tea with honey", "Gargle salt water", "Use humidifier", "Rest adequately"],
-            "warning": ["Fever over 102°F", "Difficulty swallowing", "Rash develops", "Symptoms worsen after 3 days"],
-            "summary": "Symptoms suggest common respiratory infection; see doctor if no improvement in 3 days."
-        }
-    elif "fever" in s and "cough" in s:
-        return {
-            "triage": "See GP within 24–48 hours; urgent if breathing worsens",
-            "conditions": [
-                {"name": "Common cold / viral upper respiratory infection", "probability": 0.55},
-                {"name": "Influenza (flu)", "probability": 0.30},
-                {"name": "Acute bronchitis", "probability": 0.10}
-            ],
-            "advice": "Rest, stay hydrated; consider paracetamol for fever. Monitor breathing closely.",
-            "selfcare": ["Drink warm fluids and rest.", "Take paracetamol for fever (follow dosing).", "Gargle warm salt water."],
-            "warning": ["Difficulty breathing", "High fever >3 days", "Bluish lips or chest pain"],
-            "summary": "Your symptoms suggest a viral respiratory infection; monitor breathing closely and see GP if worsening."
-        }
-    elif "headache" in s and "stiff neck" in s:
-        return {
-            "triage": "See doctor immediately",
-            "conditions": [{"name":"Meningitis (possible)","probability":0.45},{"name":"Migraine","probability":0.35}],
-            "advice": "Seek immediate medical attention; this could be serious.",
-            "selfcare": ["Avoid bright lights", "Do not delay medical evaluation"],
-            "warning": ["High fever with neck stiffness", "Seizures or loss of consciousness"],
-            "summary": "Severe headache with neck stiffness can indicate a serious condition. Please seek urgent care."
-        }
-    elif "rash" in s and "fever" in s:
-        return {
-            "triage": "See GP within 24 hours",
-            "conditions": [
-                {"name": "Viral exanthem", "probability": 0.50},
-                {"name": "Allergic reaction", "probability": 0.30},
-                {"name": "Bacterial infection", "probability": 0.15}
-            ],
-            "advice": "Avoid scratching, monitor for spreading. Identify potential allergens.",
-            "selfcare": ["Apply cool compresses", "Use calamine lotion", "Avoid new soaps/detergents"],
-            "warning": ["Rash spreads rapidly", "Difficulty breathing", "Swelling of face/tongue"],
-            "summary": "Rash with fever could be viral or allergic; medical evaluation recommended."
-        }
-    elif "stomach pain" in s and "vomiting" in s:
-        return {
-            "triage": "See GP within 24 hours",
-            "conditions": [
-                {"name": "Gastroenteritis", "probability": 0.60},
-                {"name": "Food poisoning", "probability": 0.25},
-                {"name": "Indigestion", "probability": 0.10}
-            ],
-            "advice": "Rest, clear fluids only for 24 hours, then bland diet.",
-            "selfcare": ["Sip clear fluids", "BRAT diet (bananas, rice, applesauce, toast)", "Rest"],
-            "warning": ["Severe abdominal pain", "Blood in vomit/stool", "Dehydration signs"],
-            "summary": "Likely stomach bug or food poisoning; seek care if symptoms worsen or persist."
-        }
-    elif "back pain" in s and "fever" in s:
-        return {
-            "triage": "See GP within 24 hours",
-            "conditions": [
-                {"name": "Kidney infection", "probability": 0.40},
-                {"name": "Muscular strain", "probability": 0.35},
-                {"name": "Urinary tract infection", "probability": 0.20}
-            ],
-            "advice": "Drink plenty of fluids and rest. See doctor for proper diagnosis.",
-            "selfcare": ["Apply heat pad", "Stay hydrated", "Gentle stretching if muscular"],
-            "warning": ["High fever", "Pain spreading", "Difficulty urinating"],
-            "summary": "Back pain with fever could indicate infection; medical evaluation recommended."
-        }
-    else:
-        return {
-            "triage": "Self-care / monitor",
-            "conditions": [
-                {"name":"Allergic rhinitis or mild viral illness","probability":0.45},
-                {"name":"Indigestion","probability":0.20},
-                {"name":"Stress-related symptoms","probability":0.15}
-            ],
-            "advice": "Monitor symptoms; use OTC medicines as needed. Consult doctor if symptoms persist.",
-            "selfcare": ["Rest and stay hydrated.", "Avoid allergens.", "Practice stress reduction techniques."],
-            "warning": ["High or prolonged fever", "Severe dehydration", "Symptoms worsen after 3 days"],
-            "summary": "Symptoms likely mild and manageable at home; seek care if they worsen."
-        }
-
-def call_deepseek(symptoms_text, age=None, gender=None):
-    API_KEY = os.getenv("DEEPSEEK_API_KEY")
-    
-    if not API_KEY:
-        print("❌ DEEPSEEK_API_KEY not found in environment")
-        return call_symptom_api_mock(symptoms_text, age, gender)
-    
-    print(f"🔑 API Key found: {API_KEY[:8]}...")
-    
-    url = "https://api.deepseek.com/chat/completions"
-    
+    # Shallow copy so callers can add keys; nested values stay shared and
+    # read-only
+    return dict(MOCK_RULES.evaluate(symptoms_text))
+
+TRIAGE_FALLBACKS = metrics.counter(
+    "triage_fallbacks_total", "Triages answered by the mock because the chosen provider failed, by reason", ["reason"])
+DEEPSEEK_JSON_PARSE_SECONDS = metrics.histogram(
+    "deepseek_json_parse_seconds", "Decoding a completion body and the triage JSON inside it", ["part"])
+
+def _deepseek_fallback(symptoms_text, age=None, gender=None, reason="error"):
+    # Marked, so a stand-in answer is never mistaken for (or cached as) a
+    # DeepSeek one
+    TRIAGE_FALLBACKS.labels(reason).inc()
+    result = call_symptom_api_mock(symptoms_text, age, gender)
+    result["api_note"] = "Primary API unavailable - using backup analysis"
+    return result
+
+def _deepseek_request(symptoms_text, age, gender, api_key):
+    """Headers and JSON payload for one triage completion"""
     prompt = f"""Analyze these symptoms and provide medical triage advice in JSON format only:
 
 SYMPTOMS: {symptoms_text}
@@ -391,7 +211,7 @@ Return ONLY valid JSON with this exact structure:
 Be conservative and recommend medical care when uncertain."""
 
     headers = {
-        "Authorization": f"Bearer {API_KEY}",
+        "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
 
@@ -405,70 +225,301 @@ Be conservative and recommend medical care when uncertain."""
         "max_tokens": 800,
         "stream": False
     }
+    return headers, payload
 
-    try:
-        print(f"🔍 Calling DeepSeek API with symptoms: {symptoms_text[:50]}...")
-        response = requests.post(url, headers=headers, json=payload, timeout=15)
-        
-        print(f"📡 Response Status: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"❌ API Error {response.status_code}: {response.text}")
-            return call_symptom_api_mock(symptoms_text, age, gender)
-        
+def _triage_from_completion(data):
+    """The triage dict from a completion body, or None if it can't be used"""
+    # Extract the response content
+    if "choices" in data and len(data["choices"]) > 0:
+        return parse_triage_content(data["choices"][0]["message"]["content"])
+    logger.warning("Invalid response format from DeepSeek API")
+    return None
+
+def _triage_from_response(response):
+    with DEEPSEEK_JSON_PARSE_SECONDS.labels("body").time():
         data = response.json()
-        print("✅ Received API response")
+    return _triage_from_completion(data)
+
+@metrics.timed(DEEPSEEK_JSON_PARSE_SECONDS.labels("content"))
+def parse_triage_content(content):
+    """The triage dict from the model's reply text, or None if it can't be used"""
+    # Sampled (LOG_SAMPLE) and DEBUG: the prefix is patient-derived text
+    logger.debug("DeepSeek raw response: %.200s", content, extra={"event": "deepseek.raw_response"})
+    
+    # Try to parse JSON from the response
+    try:
+        # Clean the response - remove markdown code blocks if present
+        content_clean = content.replace('```json', '').replace('```', '').strip()
+        parsed = json.loads(content_clean)
         
-        # Extract the response content
-        if "choices" in data and len(data["choices"]) > 0:
-            content = data["choices"][0]["message"]["content"]
-            print(f"📝 Raw response: {content[:200]}...")
+        # Validate required fields
+        required_fields = ["triage", "conditions", "advice", "selfcare", "warning", "summary"]
+        if all(field in parsed for field in required_fields):
+            return parsed
+        else:
+            missing = [field for field in required_fields if field not in parsed]
+            logger.warning("DeepSeek response is missing required fields: %s", missing)
             
-            # Try to parse JSON from the response
+    except json.JSONDecodeError as e:
+        logger.info("DeepSeek response is not bare JSON (%s); extracting the JSON object", e)
+        
+        # Try to find JSON in the text
+        start = content.find('{')
+        end = content.rfind('}')
+        if start != -1 and end != -1:
+            json_str = content[start:end+1]
             try:
-                # Clean the response - remove markdown code blocks if present
-                content_clean = content.replace('```json', '').replace('```', '').strip()
-                parsed = json.loads(content_clean)
-                
-                # Validate required fields
-                required_fields = ["triage", "conditions", "advice", "selfcare", "warning", "summary"]
-                if all(field in parsed for field in required_fields):
-                    print("✅ Successfully parsed JSON response")
+                parsed = json.loads(json_str)
+                if "triage" in parsed:
                     return parsed
-                else:
-                    print("❌ Missing required fields in API response")
-                    missing = [field for field in required_fields if field not in parsed]
-                    print(f"Missing fields: {missing}")
-                    
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON parse error: {e}")
-                print(f"Trying to extract JSON from response...")
-                
-                # Try to find JSON in the text
-                start = content.find('{')
-                end = content.rfind('}')
-                if start != -1 and end != -1:
-                    json_str = content[start:end+1]
-                    try:
-                        parsed = json.loads(json_str)
-                        if "triage" in parsed:
-                            print("✅ Extracted JSON from text response")
-                            return parsed
-                    except:
-                        pass
-                
-                print("❌ Could not parse JSON from response")
-                
-        print("❌ Invalid response format from API")
-        return call_symptom_api_mock(symptoms_text, age, gender)
+            except:
+                pass
+        
+        logger.warning("Could not parse JSON from DeepSeek response")
+    return None
+
+def call_deepseek(symptoms_text, age=None, gender=None, deadline=None):
+    """Blocking DeepSeek triage; ``deadline`` (time.monotonic()) bounds the wait"""
+    API_KEY = os.getenv("DEEPSEEK_API_KEY")
+    
+    if not API_KEY:
+        logger.error("DEEPSEEK_API_KEY not found in environment")
+        return _deepseek_fallback(symptoms_text, age, gender, "no_api_key")
+    
+    timeout = remaining_seconds(deadline)
+    if timeout <= 0:
+        logger.warning("Request deadline already passed - using backup analysis")
+        return _deepseek_fallback(symptoms_text, age, gender, "deadline")
+    if not DEEPSEEK_BREAKER.allow():
+        logger.warning("DeepSeek circuit open - using backup analysis", extra={"event": "deepseek.circuit_open"})
+        return _deepseek_fallback(symptoms_text, age, gender, "circuit_open")
+    headers, payload = _deepseek_request(symptoms_text, age, gender, API_KEY)
+
+    try:
+        logger.debug("Calling DeepSeek API", extra={"event": "deepseek.request"})
+        started = time.monotonic()
+        try:
+            response = get_http_session().post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=timeout)
+        except Exception:
+            DEEPSEEK_BREAKER.record(False, time.monotonic() - started)
+            raise
+        DEEPSEEK_BREAKER.record(response.status_code == 200, time.monotonic() - started)
+        
+        if response.status_code != 200:
+            logger.error("DeepSeek API error %s: %.500s", response.status_code, response.text)
+            return _deepseek_fallback(symptoms_text, age, gender, "http_status")
+        
+        parsed = _triage_from_response(response)
+        if parsed is not None:
+            return parsed
+        return _deepseek_fallback(symptoms_text, age, gender, "bad_response")
         
     except requests.exceptions.Timeout:
-        print("❌ API request timed out")
+        logger.error("DeepSeek API request timed out")
     except requests.exceptions.ConnectionError:
-        print("❌ Connection error - check internet connection")
+        logger.error("DeepSeek connection error - check internet connection")
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        logger.exception("Unexpected DeepSeek client error: %s", e)
     
     # Fallback to mock data
->>>>>>> c90d239 (Initial commit)
-    return call_symptom_api_mock(symptoms_text, age, gender)
\ No newline at end of file
+    return _deepseek_fallback(symptoms_text, age, gender)
+
+class DeepSeekUnavailable(Exception):
+    """A streamed triage couldn't be had; the caller should use its fallback"""
+
+def stream_deepseek(symptoms_text, age=None, gender=None, deadline=None):
+    """Yield the model's reply text piece by piece as DeepSeek streams it.
+
+    Raises DeepSeekUnavailable (no key, breaker open, deadline passed, HTTP
+    error) or a requests exception; either may come after some pieces were
+    already yielded.  ``deadline`` bounds the whole stream, not just the
+    wait for the first token.
+    """
+    API_KEY = os.getenv("DEEPSEEK_API_KEY")
+    if not API_KEY:
+        raise DeepSeekUnavailable("DEEPSEEK_API_KEY not set")
+    timeout = remaining_seconds(deadline)
+    if timeout <= 0:
+        raise DeepSeekUnavailable("request deadline already passed")
+    if not DEEPSEEK_BREAKER.allow():
+        raise DeepSeekUnavailable("circuit open")
+    headers, payload = _deepseek_request(symptoms_text, age, gender, API_KEY)
+    payload["stream"] = True
+
+    started = time.monotonic()
+    try:
+        response = get_http_session().post(DEEPSEEK_API_URL, headers=headers, json=payload,
+                                           timeout=timeout, stream=True)
+    except Exception:
+        DEEPSEEK_BREAKER.record(False, time.monotonic() - started)
+        raise
+    # Judge the upstream on time to first byte; a long reply isn't a slow server
+    DEEPSEEK_BREAKER.record(response.status_code == 200, time.monotonic() - started)
+    with response:
+        if response.status_code != 200:
+            raise DeepSeekUnavailable(f"API error {response.status_code}")
+        response.encoding = "utf-8"  # text/event-stream is always UTF-8
+        for line in response.iter_lines(decode_unicode=True):
+            if deadline is not None and time.monotonic() > deadline:
+                raise DeepSeekUnavailable("request deadline passed mid-stream")
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            try:
+                delta = json.loads(data)["choices"][0]["delta"].get("content")
+            except (ValueError, KeyError, IndexError):
+                continue
+            if delta:
+                yield delta
+
+# Async client: one event loop thread per process owns an httpx.AsyncClient,
+# so any number of in-flight triage calls share a connection pool and cost a
+# coroutine each rather than a blocked worker thread.  Without httpx the
+# coroutine falls back to the blocking client on a thread.
+DEEPSEEK_ASYNC_MAX_CONNECTIONS = int(os.getenv("DEEPSEEK_ASYNC_MAX_CONNECTIONS", "200"))
+
+_async_loop = None
+_async_client = None
+_async_loop_lock = threading.Lock()
+
+def get_async_loop():
+    """The background event loop that runs call_deepseek_async, started on first use"""
+    global _async_loop
+    if _async_loop is None:
+        with _async_loop_lock:
+            if _async_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="deepseek-async", daemon=True).start()
+                _async_loop = loop
+    return _async_loop
+
+def run_on_async_loop(coro):
+    """Schedule ``coro`` on the shared loop; returns a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_async_loop())
+
+def _get_async_client():
+    # Only touched from the loop thread, so no lock needed
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=DEEPSEEK_TIMEOUT,
+            limits=httpx.Limits(max_connections=DEEPSEEK_ASYNC_MAX_CONNECTIONS,
+                                max_keepalive_connections=DEEPSEEK_ASYNC_MAX_CONNECTIONS),
+            # Connect failures only, like the blocking client's Retry
+            transport=httpx.AsyncHTTPTransport(retries=DEEPSEEK_MAX_RETRIES),
+        )
+    return _async_client
+
+async def _post_completion(headers, payload, timeout):
+    """One upstream attempt, reported to the breaker (and, if it worked, the hedge policy)"""
+    started = time.monotonic()
+    try:
+        response = await _get_async_client().post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=timeout)
+    except asyncio.CancelledError:
+        # Abandoned (a losing hedge, or the caller gave up): no verdict
+        DEEPSEEK_BREAKER.cancel()
+        raise
+    except BaseException:
+        DEEPSEEK_BREAKER.record(False, time.monotonic() - started)
+        raise
+    seconds = time.monotonic() - started
+    DEEPSEEK_BREAKER.record(response.status_code == 200, seconds)
+    if response.status_code == 200:
+        DEEPSEEK_HEDGING.observe(seconds)
+    return response
+
+async def _hedged_post(headers, payload, timeout, hedge):
+    """Post, and maybe race a second copy if the first is slower than usual"""
+    DEEPSEEK_HEDGING.note_call()
+    primary = asyncio.ensure_future(_post_completion(headers, payload, timeout))
+    delay = DEEPSEEK_HEDGING.delay() if hedge else None
+    if delay is None or delay >= timeout:
+        return await primary
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+    except asyncio.CancelledError:
+        primary.cancel()
+        raise
+    # Budget first: a breaker slot taken for a hedge we then skip would leak
+    if done or not DEEPSEEK_HEDGING.try_acquire() or not DEEPSEEK_BREAKER.allow():
+        return await primary
+    backup = asyncio.ensure_future(_post_completion(headers, payload, timeout - delay))
+    pending = {primary, backup}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code == 200:
+                    return task.result()
+        # Neither worked; report the primary's outcome
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def call_deepseek_async(symptoms_text, age=None, gender=None, deadline=None, hedge=None):
+    """call_deepseek as a coroutine; run it on the shared loop (run_on_async_loop).
+
+    ``hedge`` (default DEEPSEEK_HEDGE) allows a backup request when the
+    first one runs past the recent p95 latency.
+    """
+    if httpx is None:
+        return await asyncio.to_thread(call_deepseek, symptoms_text, age, gender, deadline)
+
+    API_KEY = os.getenv("DEEPSEEK_API_KEY")
+    if not API_KEY:
+        logger.error("DEEPSEEK_API_KEY not found in environment")
+        return _deepseek_fallback(symptoms_text, age, gender, "no_api_key")
+
+    timeout = remaining_seconds(deadline)
+    if timeout <= 0:
+        logger.warning("Request deadline already passed - using backup analysis")
+        return _deepseek_fallback(symptoms_text, age, gender, "deadline")
+    if not DEEPSEEK_BREAKER.allow():
+        logger.warning("DeepSeek circuit open - using backup analysis", extra={"event": "deepseek.circuit_open"})
+        return _deepseek_fallback(symptoms_text, age, gender, "circuit_open")
+    headers, payload = _deepseek_request(symptoms_text, age, gender, API_KEY)
+    try:
+        response = await _hedged_post(headers, payload, timeout, DEEPSEEK_HEDGE if hedge is None else hedge)
+        if response.status_code != 200:
+            logger.error("DeepSeek API error %s: %.500s", response.status_code, response.text)
+            return _deepseek_fallback(symptoms_text, age, gender, "http_status")
+        parsed = _triage_from_response(response)
+        if parsed is not None:
+            return parsed
+        return _deepseek_fallback(symptoms_text, age, gender, "bad_response")
+    except httpx.TimeoutException:
+        logger.error("DeepSeek API request timed out")
+    except httpx.TransportError:
+        logger.error("DeepSeek connection error - check internet connection")
+    except Exception as e:
+        logger.exception("Unexpected DeepSeek client error: %s", e)
+
+    return _deepseek_fallback(symptoms_text, age, gender)
+
+def close_async_client():
+    global _async_loop, _async_client
+    with _async_loop_lock:
+        loop, client = _async_loop, _async_client
+        _async_loop = _async_client = None
+    if loop is None:
+        return
+    if client is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+        except Exception:
+            pass
+    loop.call_soon_threadsafe(loop.stop)
+
+atexit.register(close_async_client)
+
+def _reset_async_client_after_fork():
+    # The loop thread doesn't survive fork; start a fresh one on next use
+    global _async_loop, _async_client, _async_loop_lock
+    _async_loop = _async_client = None
+    _async_loop_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_async_client_after_fork)
@@ -0,0 +1,82 @@
+# test_circuit_breaker.py
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def make_breaker(clock, **options):
+    settings = dict(window_seconds=60, min_calls=4, failure_rate=0.5, slow_call_seconds=5,
+                    open_seconds=30, half_open_probes=2, clock=clock)
+    settings.update(options)
+    return CircuitBreaker(**settings)
+
+
+def test_opens_once_bad_share_reaches_threshold(clock):
+    breaker = make_breaker(clock)
+    for ok in (False, True, False):
+        assert breaker.allow()
+        breaker.record(ok, 0.1)
+    assert breaker.state == CLOSED  # below min_calls
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_slow_calls_count_as_bad(clock):
+    breaker = make_breaker(clock)
+    for seconds in (6, 7, 0.1, 0.2):
+        breaker.record(True, seconds)
+    assert breaker.state == OPEN
+
+
+def test_old_outcomes_leave_the_window(clock):
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    clock.now += 61
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 1
+
+
+def open_breaker(clock):
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_half_open_limits_probes_and_closes_after_successes(clock):
+    breaker = open_breaker(clock)
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow() and breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # both probe slots taken
+    breaker.record(True, 0.1)
+    assert breaker.allow()  # a slot freed up
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_bad_probe_reopens(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN and breaker.stats()["opened_count"] == 2
+    assert breaker.stats()["retry_in_seconds"] == 30
+
+
+def test_open_circuit_skips_upstream(fake_deepseek, clock, monkeypatch):
+    import symptom_api
+
+    server = fake_deepseek()
+    monkeypatch.setattr(symptom_api, "DEEPSEEK_BREAKER", open_breaker(clock))
+    result = symptom_api.call_deepseek("fever and cough")
+    assert result["api_note"] == "Primary API unavailable - using backup analysis"
+    result = symptom_api.run_on_async_loop(symptom_api.call_deepseek_async("fever and cough")).result(5)
+    assert "api_note" in result
+    assert server.requests == 0
@@ -0,0 +1,181 @@
+# test_conversation_store.py
+import multiprocessing
+
+import pytest
+
+import db_helpers
+from conversation_store import InMemoryConversationStore, SQLiteConversationStore, create_conversation_store
+
+
+def new_conversation(session_id=1):
+    return {"session_id": session_id, "patient_info": {}, "message_history": [], "created_at": None}
+
+
+def test_lru_eviction_keeps_recently_used():
+    evicted = []
+    store = InMemoryConversationStore(max_conversations=2, on_evict=lambda cid, conv, reason: evicted.append((cid, reason)))
+    store.create("a", new_conversation(1))
+    store.create("b", new_conversation(2))
+    assert store.get("a") is not None  # "b" is now least recently used
+    store.create("c", new_conversation(3))
+
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+    assert evicted == [("b", "lru")]
+    assert store.stats()["evictions"] == {"lru": 1, "ttl": 0}
+
+
+def test_idle_ttl_expiry_and_touch(clock):
+    evicted = []
+    store = InMemoryConversationStore(ttl_seconds=10, clock=clock,
+                                      on_evict=lambda cid, conv, reason: evicted.append((cid, reason)))
+    store.create("a", new_conversation(1))
+    store.create("b", new_conversation(2))
+
+    clock.now = 8
+    store.append_messages("a", {"role": "user", "content": "still here"})
+    clock.now = 15
+    assert store.purge_expired() == 1
+    assert evicted == [("b", "ttl")]
+    assert store.get("a") is not None
+
+    clock.now = 100
+    assert store.get("a") is None
+    assert len(store) == 0
+
+
+def test_history_window_and_memory_accounting():
+    store = InMemoryConversationStore(max_history=3)
+    store.create("a", new_conversation())
+    empty = store.stats()["approx_bytes"]
+
+    for i in range(5):
+        length = store.append_messages("a", {"role": "user", "content": "x" * 100})
+    assert length == 3
+    assert len(store.get("a")["message_history"]) == 3
+    grown = store.stats()["approx_bytes"]
+    assert grown > empty
+
+    store.append_messages("a", {"role": "user", "content": "x" * 100})
+    assert store.stats()["approx_bytes"] == grown
+
+    store.delete("a")
+    assert store.stats()["approx_bytes"] == 0
+
+
+def test_unknown_conversation():
+    store = InMemoryConversationStore()
+    assert store.get("missing") is None
+    assert store.append_messages("missing", {"role": "user", "content": "hi"}) is None
+    assert store.update_patient_info("missing", {"age": 3}) is False
+    assert store.delete("missing") is None
+
+
+def test_sqlite_store_is_shared_between_workers(db_path):
+    worker_a = SQLiteConversationStore(max_history=3)
+    worker_b = SQLiteConversationStore(max_history=3)
+    worker_a.create("c1", new_conversation(7))
+
+    assert worker_b.get("c1")["session_id"] == 7
+    assert worker_b.append_messages("c1", {"role": "user", "content": "hi"}) == 1
+    # worker_a's cached copy is stale; the version check picks up b's write
+    assert [m["content"] for m in worker_a.get("c1")["message_history"]] == ["hi"]
+
+    for i in range(5):
+        worker_a.append_messages("c1", {"role": "bot", "content": str(i)})
+    assert [m["content"] for m in worker_b.get("c1")["message_history"]] == ["2", "3", "4"]
+
+    assert worker_b.update_patient_info("c1", {"age": "40"})
+    assert worker_a.get("c1")["patient_info"] == {"age": "40"}
+
+    worker_a.delete("c1")
+    assert worker_b.get("c1") is None
+
+
+def test_sqlite_store_serves_unchanged_conversations_from_cache(db_path):
+    store = SQLiteConversationStore()
+    store.create("c1", new_conversation())
+    first = store.get("c1")
+    assert store.get("c1") is first
+    assert store.stats()["cache_hits"] == 2
+
+
+def test_sqlite_store_ttl_purge(db_path, clock):
+    evicted = []
+    store = SQLiteConversationStore(ttl_seconds=10, clock=clock,
+                                    on_evict=lambda cid, conv, reason: evicted.append((cid, conv["session_id"])))
+    store.create("old", new_conversation(1))
+    clock.now = 5
+    store.create("new", new_conversation(2))
+    clock.now = 12
+    assert store.get("old") is None
+    assert store.purge_expired() == 1
+    assert evicted == [("old", 1)]
+    assert len(store) == 1
+
+
+def test_sqlite_store_purges_expired_rows_on_its_own(db_path, clock):
+    evicted = []
+    store = SQLiteConversationStore(ttl_seconds=10, purge_interval=60, clock=clock,
+                                    on_evict=lambda cid, conv, reason: evicted.append((cid, reason)))
+    store.create("old", new_conversation(1))
+    clock.now = 30
+    store.create("recent", new_conversation(2))
+    assert evicted == []  # not due yet
+    clock.now = 61
+    assert store.get("recent") is None  # expired too by now
+    with db_helpers.get_pool().connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 0
+    assert sorted(evicted) == [("old", "ttl"), ("recent", "ttl")]
+
+
+def test_sqlite_store_count_is_not_a_scan_per_probe(db_path, clock, monkeypatch):
+    store = SQLiteConversationStore(count_interval=15, clock=clock)
+    other_worker = SQLiteConversationStore(clock=clock)
+    store.create("a", new_conversation(1))
+    assert len(store) == 1
+
+    counts = []
+    real_pool = store._pool
+
+    def counting_pool():
+        counts.append(1)
+        return real_pool()
+
+    monkeypatch.setattr(store, "_pool", counting_pool)
+    store.create("b", new_conversation(2))
+    other_worker.create("c", new_conversation(3))
+    assert store.delete("a") is not None
+    counts.clear()
+    assert len(store) == store.stats()["conversations"] == 1  # own writes tracked, the other worker's not yet
+    assert counts == []
+    clock.now = 16
+    assert len(store) == 2
+    assert counts == [1]
+
+
+def _append_from_process(db_path, conversation_id, count):
+    import db_helpers
+    db_helpers.DB_PATH = db_path
+    store = SQLiteConversationStore(max_history=1000)
+    for i in range(count):
+        store.append_messages(conversation_id, {"role": "user", "content": str(i)})
+
+
+def test_sqlite_store_concurrent_processes(db_path):
+    db_helpers.init_db(profile="wal")
+    SQLiteConversationStore(max_history=1000).create("shared", new_conversation())
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_append_from_process, args=(db_path, "shared", 25)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert all(w.exitcode == 0 for w in workers)
+    assert len(SQLiteConversationStore().get("shared")["message_history"]) == 100
+
+
+def test_create_conversation_store_by_name():
+    assert isinstance(create_conversation_store("memory", max_conversations=5), InMemoryConversationStore)
+    with pytest.raises(ValueError):
+        create_conversation_store("redis")
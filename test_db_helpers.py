@@ -0,0 +1,255 @@
+# test_db_helpers.py
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import db_helpers
+
+
+def test_helpers_round_trip(db_path):
+    session_id = db_helpers.create_session(start_time=datetime.utcnow(), age=30, gender="female")
+    db_helpers.log_message(session_id, "user", "fever and cough")
+    db_helpers.log_result(session_id, "mock", {"triage": "Self-care / monitor"})
+
+    messages = db_helpers.get_messages_for_session(session_id)
+    assert [(m["role"], m["content"]) for m in messages] == [("user", "fever and cough")]
+    results = db_helpers.get_results_for_session(session_id)
+    assert results[0]["result"]["triage"] == "Self-care / monitor"
+
+
+def test_pool_reuses_connections(db_path):
+    pool = db_helpers.get_pool()
+    with pool.connection() as first:
+        with pool.connection() as nested:
+            assert nested is first
+    with pool.connection() as again:
+        assert again is first
+    assert pool.stats()["size"] == 1
+
+
+def test_pool_is_bounded_across_threads(db_path):
+    pool = db_helpers.ConnectionPool(db_path, max_size=2, timeout=0.2)
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.set()
+            release.wait()
+
+    workers = [threading.Thread(target=hold) for _ in range(2)]
+    for w in workers:
+        w.start()
+    held.wait()
+    while pool.stats()["size"] < 2:
+        pass
+
+    with pytest.raises(db_helpers.PoolTimeout):
+        with pool.connection():
+            pass
+
+    release.set()
+    for w in workers:
+        w.join()
+    assert pool.stats() == {"size": 2, "idle": 2, "max_size": 2}
+    pool.close()
+
+
+def test_pool_rolls_back_on_error(db_path):
+    session_id = db_helpers.create_session(start_time=datetime.utcnow())
+    with pytest.raises(RuntimeError):
+        with db_helpers.get_pool().connection() as conn:
+            conn.execute("INSERT INTO messages (session_id, role, content) VALUES (?, 'user', 'x')",
+                         (session_id,))
+            raise RuntimeError("boom")
+    assert db_helpers.get_messages_for_session(session_id) == []
+
+
+def test_close_pool_is_idempotent(db_path):
+    db_helpers.get_pool()
+    db_helpers.close_pool()
+    db_helpers.close_pool()
+    # A fresh pool is created on next use
+    assert db_helpers.get_sessions(10) == []
+
+
+def test_wal_storage_profile(db_path, monkeypatch):
+    monkeypatch.setattr(db_helpers, "_storage_profile", db_helpers.get_storage_profile())
+    db_helpers.init_db(profile="wal")
+    with db_helpers.get_pool().connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+
+def test_unknown_storage_profile_rejected(db_path):
+    with pytest.raises(ValueError):
+        db_helpers.init_db(profile="turbo")
+
+
+@pytest.fixture
+def async_journal(db_path):
+    db_helpers.configure_journal("async", batch_size=50, flush_interval_ms=20)
+    yield
+    db_helpers.configure_journal("strict")
+
+
+def test_write_behind_journal_batches_rows(async_journal):
+    session_id = db_helpers.create_session(start_time=datetime.utcnow())
+    for i in range(120):
+        db_helpers.log_message(session_id, "user", f"message {i}")
+    db_helpers.log_result(session_id, "mock", {"triage": "Self-care / monitor"})
+
+    assert db_helpers.flush_journal(timeout=5)
+    stats = db_helpers.journal_stats()
+    assert stats["mode"] == "async"
+    assert stats["pending"] == 0
+    assert stats["rows_written"] == 121
+    assert stats["batches_written"] < 121
+
+    contents = [m["content"] for m in db_helpers.get_messages_for_session(session_id)]
+    assert contents == [f"message {i}" for i in range(120)]
+
+
+def test_write_behind_journal_flushes_on_interval(async_journal):
+    session_id = db_helpers.create_session(start_time=datetime.utcnow())
+    db_helpers.log_message(session_id, "user", "hello")
+    with db_helpers.get_pool().connection() as conn:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            if count:
+                break
+            time.sleep(0.01)
+    assert count == 1
+
+
+def test_shutdown_flushes_pending_rows(async_journal):
+    session_id = db_helpers.create_session(start_time=datetime.utcnow())
+    db_helpers.log_message(session_id, "bot", "bye")
+    db_helpers.shutdown_journal()
+    assert db_helpers.journal_stats() == {"mode": "async"}
+    assert [m["content"] for m in db_helpers.get_messages_for_session(session_id)] == ["bye"]
+
+
+def test_strict_mode_writes_synchronously(db_path):
+    db_helpers.configure_journal("strict")
+    session_id = db_helpers.create_session(start_time=datetime.utcnow())
+    db_helpers.log_message(session_id, "user", "now")
+    with db_helpers.get_pool().connection() as conn:
+        assert conn.execute("SELECT content FROM messages").fetchone()[0] == "now"
+
+
+def _seed_sessions(count):
+    ids = []
+    for i in range(count):
+        session_id = db_helpers.create_session(
+            start_time=f"2025-01-{1 + i % 28:02d} 10:00:{i % 60:02d}",
+            age=10 + (i * 7) % 80,
+            gender=("male", "female")[i % 2],
+            patient_name=f"patient {i}",
+        )
+        triage = "🚨 Emergency — seek immediate care" if i % 5 == 0 else "Self-care / monitor"
+        db_helpers.log_result(session_id, "mock", {"triage": triage})
+        ids.append(session_id)
+    return ids
+
+
+def test_sessions_page_walks_every_row_once(db_path):
+    _seed_sessions(37)
+    seen, cursor = [], None
+    while True:
+        page = db_helpers.get_sessions_page(limit=10, cursor=cursor)
+        seen.extend((r["start_time"], r["id"]) for r in page["sessions"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 37
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_sessions_page_filters(db_path):
+    _seed_sessions(40)
+    page = db_helpers.get_sessions_page(limit=100, gender="female", triage_level="emergency")
+    assert page["sessions"]
+    assert all(r["gender"] == "female" and r["triage_level"] == "emergency" for r in page["sessions"])
+
+    page = db_helpers.get_sessions_page(limit=100, age_band="65+", start_date="2025-01-05", end_date="2025-01-10")
+    for r in page["sessions"]:
+        assert r["age"] >= 65
+        assert "2025-01-05" <= r["start_time"][:10] <= "2025-01-10"
+
+
+def test_sessions_page_rejects_bad_input(db_path):
+    with pytest.raises(ValueError):
+        db_helpers.get_sessions_page(cursor="not-a-cursor")
+    with pytest.raises(ValueError):
+        db_helpers.get_sessions_page(triage_level="critical")
+
+
+def test_session_timeline_interleaves_and_decodes_lazily(db_path):
+    session_id = db_helpers.create_session(start_time=datetime.utcnow())
+    db_helpers.log_message(session_id, "user", "fever and cough")
+    db_helpers.log_result(session_id, "mock", {"triage": "See GP within 24 hours"})
+    db_helpers.log_message(session_id, "bot", "Rest and stay hydrated.")
+    with db_helpers.get_pool().connection() as conn:
+        conn.execute("INSERT INTO results (session_id, api_name, result, timestamp) "
+                     "VALUES (?, 'mock', '{bad json', '9999-01-01 00:00:00')",
+                     (session_id,))
+
+    timeline = db_helpers.get_session_timeline(session_id)
+    assert [e["kind"] for e in timeline["timeline"]] == ["message", "analysis", "message", "analysis"]
+    assert [m["role"] for m in timeline["messages"]] == ["user", "bot"]
+
+    analysis = timeline["analyses"][0]
+    assert analysis._result is None
+    assert analysis.result["triage"] == "See GP within 24 hours"
+    assert analysis["api_name"] == "mock"
+    assert timeline["analyses"][1].result == {} and not timeline["analyses"][1].readable
+    assert analysis.readable
+
+
+def test_conversation_view_renders_the_timeline(db_path):
+    import app as app_module
+
+    session_id = db_helpers.create_session(start_time=datetime.utcnow())
+    db_helpers.log_message(session_id, "user", "fever and cough")
+    db_helpers.log_result(session_id, "mock", {"triage": "See GP within 24 hours", "summary": "Likely viral"})
+    db_helpers.log_message(session_id, "bot", "Rest and stay hydrated.")
+    with db_helpers.get_pool().connection() as conn:
+        conn.execute("INSERT INTO results (session_id, api_name, result, timestamp) "
+                     "VALUES (?, 'mock', '{bad json', '9999-01-01 00:00:00')",
+                     (session_id,))
+
+    page = app_module.app.test_client().get(f"/conversation/{session_id}").get_data(as_text=True)
+    positions = [page.index(text) for text in ("fever and cough", "See GP within 24 hours",
+                                               "Rest and stay hydrated.", "Unreadable analysis")]
+    assert positions == sorted(positions)
+
+
+def test_sessions_batch_written_in_one_transaction(db_path):
+    start = datetime.utcnow()
+    entries = [
+        {"start_time": start, "age": 30, "gender": "male", "patient_name": "Ann",
+         "messages": [("user", "fever"), ("bot", "rest")], "api_name": "mock",
+         "result": {"triage": "Self-care / monitor"}},
+        # Identical to the first but still its own session
+        {"start_time": start, "age": 30, "gender": "male", "patient_name": "Ann",
+         "messages": [("user", "fever"), ("bot", "rest")], "api_name": "mock",
+         "result": {"triage": "Self-care / monitor"}},
+        {"start_time": start, "messages": [("user", "chest pain")], "api_name": "redflag",
+         "result": {"triage": "Emergency", "red_flag": True}},
+    ]
+    first, second, third = db_helpers.log_sessions_batch(entries)
+    assert len({first, second, third}) == 3
+    assert [m["content"] for m in db_helpers.get_messages_for_session(second)] == ["fever", "rest"]
+    with db_helpers.get_pool().connection() as conn:
+        assert conn.execute("SELECT triage_level FROM sessions WHERE id = ?", (third,)).fetchone()[0] == "emergency"
+        assert conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 3
+
+    with pytest.raises(KeyError):
+        db_helpers.log_sessions_batch([entries[0], {"messages": []}])
+    with db_helpers.get_pool().connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 3
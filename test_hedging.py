@@ -0,0 +1,59 @@
+# test_hedging.py
+import itertools
+import time
+
+import pytest
+
+from hedging import HedgePolicy
+
+
+def test_delay_is_recent_percentile_after_min_samples():
+    policy = HedgePolicy(percentile=95, min_samples=20, min_delay=0)
+    for ms in range(1, 20):
+        policy.observe(ms / 1000.0)
+    assert policy.delay() is None
+    for ms in range(20, 101):
+        policy.observe(ms / 1000.0)
+    assert policy.delay() == pytest.approx(0.095)
+
+
+def test_hedges_are_budgeted_by_max_rate():
+    policy = HedgePolicy(max_rate=0.1, burst=2)
+    granted = 0
+    for _ in range(100):
+        policy.note_call()
+        granted += policy.try_acquire()
+    assert granted == 10
+    assert policy.stats()["hedge_rate"] == 0.1
+
+
+def test_slow_primary_is_beaten_by_hedge(fake_deepseek, monkeypatch):
+    import symptom_api
+    # First request stalls for 2 s, every later one answers in 10 ms
+    latencies = itertools.chain([2000], itertools.repeat(10))
+    server = fake_deepseek(latency_ms=lambda: next(latencies))
+    policy = HedgePolicy(min_samples=1, max_rate=1.0, burst=1)
+    policy.observe(0.02)
+    policy.note_call()  # bank one hedge
+    monkeypatch.setattr(symptom_api, "DEEPSEEK_HEDGING", policy)
+
+    t0 = time.perf_counter()
+    result = symptom_api.run_on_async_loop(symptom_api.call_deepseek_async("fever", hedge=True)).result(5)
+    assert time.perf_counter() - t0 < 1.0
+    assert "api_note" not in result
+    assert server.requests == 2 and policy.hedges == 1
+
+
+def test_deadline_bounds_the_upstream_wait(fake_deepseek, db_path, monkeypatch):
+    import app as app_module
+    from triage_cache import TriageCache
+
+    fake_deepseek(latency_ms=2000)
+    monkeypatch.setattr(app_module.pipeline, "deepseek_available", True)
+    monkeypatch.setattr(app_module.pipeline, "cache", TriageCache())
+    t0 = time.perf_counter()
+    response = app_module.app.test_client().post(
+        "/check", json={"symptoms": "fever and cough", "use_api": "deepseek"},
+        headers={"X-Request-Deadline-Ms": "200"})
+    assert time.perf_counter() - t0 < 1.0
+    assert response.get_json()["result"]["api_note"] == "Primary API unavailable - using backup analysis"
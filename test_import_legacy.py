@@ -0,0 +1,72 @@
+# test_import_legacy.py
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import db_helpers
+import import_legacy
+
+LEGACY_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "symptom_chatbot.db")
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    path = str(tmp_path / "symptom_chatbot.db")
+    shutil.copy(LEGACY_DB, path)
+    return path
+
+
+def _counts():
+    with db_helpers.get_pool().connection() as conn:
+        return tuple(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                     for table in ("sessions", "messages", "results"))
+
+
+def _legacy_counts(path):
+    conn = sqlite3.connect(path)
+    try:
+        return tuple(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                     for table in ("sessions", "messages", "results"))
+    finally:
+        conn.close()
+
+
+def test_imports_shipped_legacy_database(db_path, legacy_db):
+    existing = db_helpers.create_session(start_time="2025-01-01 10:00:00")
+    stats = import_legacy.import_legacy(legacy_db)
+    expected = _legacy_counts(legacy_db)
+    assert (stats["sessions"], stats["messages"], stats["results"]) == expected
+    assert _counts() == (expected[0] + 1, expected[1], expected[2])
+
+    page = db_helpers.get_sessions_page(limit=100)
+    imported = [s for s in page["sessions"] if s["id"] != existing]
+    assert all("T" not in str(s["start_time"]) for s in imported)
+    # The oldest legacy session: meta, user message, result, bot reply
+    timeline = db_helpers.get_session_timeline(imported[-1]["id"])
+    assert [m["role"] for m in timeline["messages"]] == ["meta", "user", "bot"]
+    assert [entry["kind"] for entry in timeline["timeline"]] == ["message", "message", "analysis", "message"]
+    assert timeline["analyses"][0]["result"]["triage"] == "Self-care / monitor"
+
+
+def test_import_is_idempotent_and_resumable(db_path, legacy_db):
+    class Interrupted(Exception):
+        pass
+
+    def stop_in_messages(table, last_id, rows):
+        if table == "messages":
+            raise Interrupted
+
+    with pytest.raises(Interrupted):
+        import_legacy.import_legacy(legacy_db, batch_size=5, progress=stop_in_messages)
+    # The batch that raised was already committed; nothing after it was
+    assert _counts()[1:] == (5, 0)
+
+    import_legacy.import_legacy(legacy_db, batch_size=5)
+    assert _counts() == _legacy_counts(legacy_db)
+    again = import_legacy.import_legacy(legacy_db, batch_size=5)
+    assert (again["sessions"], again["messages"], again["results"]) == (0, 0, 0)
+    assert _counts() == _legacy_counts(legacy_db)
+    with db_helpers.get_pool().connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sessions WHERE triage_level IS NULL").fetchone()[0] == 0
@@ -0,0 +1,43 @@
+# test_incremental_json.py
+import json
+
+import pytest
+
+from incremental_json import JSONFieldStream
+
+DOC = {
+    "triage": "See GP within 24-48 hours",
+    "conditions": [{"name": 'Flu, "classic" {type}', "probability": 0.6}],
+    "score": 3.5,
+    "red_flag": False,
+    "note": None,
+    "nested": {"a": [1, {"b": "}"}]},
+    "summary": "Rest.",
+}
+
+
+@pytest.mark.parametrize("piece_size", [1, 3, 7, 1000])
+def test_fields_match_json_loads_for_any_chunking(piece_size):
+    text = "```json\n" + json.dumps(DOC, indent=2) + "\n```"
+    stream = JSONFieldStream()
+    fields = []
+    for i in range(0, len(text), piece_size):
+        fields.extend(stream.feed(text[i:i + piece_size]))
+    assert dict(fields) == DOC
+    assert [name for name, _ in fields] == list(DOC)
+    assert stream.done
+
+
+def test_string_field_is_emitted_before_the_object_closes():
+    stream = JSONFieldStream()
+    assert stream.feed('{"triage": "Self-') == []
+    assert stream.feed('care", "summ') == [("triage", "Self-care")]
+    assert stream.feed('ary": "ok"') == [("summary", "ok")]
+    assert stream.feed("}") == [] and stream.done
+
+
+def test_scalars_wait_for_the_delimiter():
+    stream = JSONFieldStream()
+    assert stream.feed('{"probability": 0.') == []
+    assert stream.feed("75") == []
+    assert stream.feed(", ") == [("probability", 0.75)]
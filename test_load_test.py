@@ -0,0 +1,60 @@
+# test_load_test.py
+import threading
+
+import requests
+from werkzeug.serving import make_server
+
+import symptom_api
+from benchmarks import load_test
+from benchmarks.fake_deepseek import FakeDeepSeekServer
+
+
+def test_fake_server_injects_errors_and_malformed_replies():
+    payload = {"messages": [], "stream": False}
+    with requests.Session() as http:
+        server = FakeDeepSeekServer(error_rate=1.0).start()
+        try:
+            assert http.post(server.url, json=payload).status_code == 503
+        finally:
+            server.stop()
+        server = FakeDeepSeekServer(malformed_rate=1.0, seed=3).start()
+        try:
+            content = http.post(server.url, json=payload).json()["choices"][0]["message"]["content"]
+            assert symptom_api.parse_triage_content(content) is None
+            assert server.stats() == {"requests": 1, "connections": 1, "errors": 0, "malformed": 1}
+        finally:
+            server.stop()
+
+
+def test_percentiles_and_compare():
+    values = [i / 1000 for i in range(1, 101)]
+    summary = load_test.latency_summary(values)
+    assert (summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]) == (50.0, 95.0, 99.0)
+
+    baseline = {"rps": 100.0, "error_rate": 0.0, "latency": {"p50_ms": 50.0, "p95_ms": 100.0, "p99_ms": 200.0}}
+    steady = {"rps": 95.0, "error_rate": 0.005, "latency": {"p50_ms": 52.0, "p95_ms": 110.0, "p99_ms": 190.0}}
+    slower = dict(steady, latency={"p50_ms": 52.0, "p95_ms": 130.0, "p99_ms": 190.0})
+    assert not load_test.compare(baseline, steady, 0.15)[1]
+    assert load_test.compare(baseline, slower, 0.15)[1]
+    assert load_test.compare(baseline, dict(steady, error_rate=0.05), 0.15)[1]
+
+
+def test_load_run_drives_chat_flows(db_path, fake_deepseek, monkeypatch):
+    import app as app_module
+    upstream = fake_deepseek(latency_ms=5, malformed_rate=0.5, seed=7)
+    monkeypatch.setattr(app_module.pipeline, "deepseek_available", True)
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        run = load_test.LoadRun(f"http://127.0.0.1:{server.server_port}", users=3, conversations=6, messages=3,
+                                api="deepseek")
+        report = run.report(run.run())
+    finally:
+        server.shutdown()
+    assert report["flows_completed"] == 6
+    assert report["requests"] == 6 * (3 + 2)
+    assert report["error_rate"] == 0
+    endpoints = report["endpoints"]
+    assert {"/api/start_conversation", "/check", "/api/end_conversation"} <= set(endpoints)
+    assert endpoints["/check"]["count"] + endpoints.get("/api/send_message", {"count": 0})["count"] == 18
+    assert upstream.requests > 0 and 0 < report["fallback_rate"] < 1
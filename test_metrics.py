@@ -0,0 +1,57 @@
+# test_metrics.py
+import pytest
+
+import metrics
+
+
+def test_counter_and_histogram_render():
+    registry = metrics.Registry()
+    requests = registry.counter("requests_total", "Requests", ["route"])
+    requests.labels("/check").inc()
+    requests.labels("/check").inc(2)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(3)
+    text = registry.render()
+    assert 'requests_total{route="/check"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_count 3" in text
+    assert "latency_seconds_sum 3.55" in text
+
+
+def test_labels_are_checked_and_metrics_shared_by_name():
+    registry = metrics.Registry()
+    counter = registry.counter("hits_total", "Hits", ["tier"])
+    assert registry.counter("hits_total", "Hits", ["tier"]) is counter
+    with pytest.raises(ValueError):
+        counter.labels("memory", "extra")
+    with pytest.raises(ValueError):
+        registry.histogram("hits_total", "Hits", ["tier"])
+
+
+def test_collectors_are_read_at_scrape_time():
+    registry = metrics.Registry()
+    state = {"open": 0}
+    registry.register_collector(lambda: [("breaker_open", "gauge", "Open", [({}, state["open"])])])
+    assert "breaker_open 0" in registry.render()
+    state["open"] = 1
+    assert "breaker_open 1" in registry.render()
+
+
+def test_metrics_endpoint_after_check(db_path):
+    import app as app_module
+    client = app_module.app.test_client()
+    assert client.post("/check", json={"symptoms": "fever and cough", "age": 30}).status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+    for stage in ("screen", "provide", "persist"):
+        assert f'triage_stage_seconds_count{{stage="{stage}"}}' in text
+    assert 'db_call_seconds_count{function="log_result"}' in text
+    assert 'http_request_seconds_count{endpoint="check",method="POST"}' in text
+    assert "triage_cache_misses_total" in text
+    assert "active_conversations" in text
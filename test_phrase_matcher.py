@@ -0,0 +1,69 @@
+# test_phrase_matcher.py
+import pytest
+
+from phrase_matcher import PhraseMatcher
+from symptom_api import has_red_flag, screen_symptoms
+
+
+def test_matches_overlapping_phrases_with_offsets():
+    matcher = PhraseMatcher(["he", "she", "hers", "his"], word_start=False)
+    hits = [(m.phrase, m.start, m.end) for m in matcher.finditer("ushers")]
+    assert sorted(hits) == [("he", 2, 4), ("hers", 2, 6), ("she", 1, 4)]
+
+
+def test_word_start_boundary():
+    matcher = PhraseMatcher(["cold", "breath"])
+    assert matcher.search("I scolded him") is None
+    assert matcher.search("I have a COLD").phrase == "cold"
+    assert matcher.search("breathing is hard").phrase == "breath"
+    assert PhraseMatcher(["cold"], word_end=True).search("colder weather") is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("I have chest pain", True),
+    ("Chest pains since this morning", True),
+    ("no chest pain", False),
+    # Bare "not" may negate another verb, so it doesn't hide a flag
+    ("I do not have chest pain", True),
+    ("denies shortness of breath", False),
+    ("I have no fever but severe headache", True),
+    ("no fever, severe headache", True),
+    ("No idea why, but I have difficulty breathing", True),
+    ("fever and cough", False),
+    # Negation must not hide an emergency
+    ("no fever and chest pain", True),
+    ("I have never had chest pain this bad", True),
+    ("not only chest pain but also dizzy", True),
+    ("no cough or shortness of breath", True),
+    ("no fever/chest pain", True),
+    ("no fever with chest pain", True),
+    ("not just a severe headache", True),
+    ("the painkillers don't help my chest pain", True),
+    ("doesn't stop severe bleeding", True),
+    ("no relief from chest pain", True),
+    ("no way this chest pain is normal", True),
+    ("I have not had chest pain before but now I do", True),
+    ("no new chest pain", True),
+    # Cues that govern the phrase directly still negate it
+    ("denies any chest pain", False),
+    ("without severe bleeding", False),
+    ("never had chest pain", False),
+    ("no\nchest pain", True),
+])
+def test_has_red_flag(text, expected):
+    assert has_red_flag(text) is expected
+
+
+def test_screen_symptoms_single_pass():
+    screening = screen_symptoms("No chest pain, just a cough and sore throat")
+    assert [m.phrase for m in screening["red_flags"]] == []
+    assert [m.phrase for m in screening["negated_red_flags"]] == ["chest pain"]
+    assert {m.phrase for m in screening["keywords"]} >= {"chest", "pain", "cough", "throat"}
+
+
+def test_scales_to_thousands_of_phrases():
+    phrases = [f"symptom{i:05d}" for i in range(5000)] + ["chest pain"]
+    matcher = PhraseMatcher(phrases)
+    assert len(matcher) == 5001
+    assert matcher.search("x " * 1000 + "chest pain").phrase == "chest pain"
+    assert matcher.search("symptom04999 reported").phrase == "symptom04999"
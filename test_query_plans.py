@@ -0,0 +1,65 @@
+# test_query_plans.py
+import pytest
+
+import db_helpers
+
+
+def query_plan(sql, params):
+    with db_helpers.get_pool().connection() as conn:
+        return [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+@pytest.mark.parametrize("sql, params, index", [
+    (db_helpers.SELECT_SESSIONS_SQL, (100,), "idx_sessions_start_time"),
+    (db_helpers.SELECT_MESSAGES_SQL, (1,), "idx_messages_session_ts"),
+    (db_helpers.SELECT_RESULTS_SQL, (1,), "idx_results_session_ts"),
+    (db_helpers.SELECT_RESULTS_NEWEST_FIRST_SQL, (1,), "idx_results_session_ts"),
+])
+def test_helper_queries_use_an_index(db_path, sql, params, index):
+    plan = query_plan(sql, params)
+    assert any(f"INDEX {index}" in step for step in plan), plan
+    # No full-table scans, and no sorting step on top of the index
+    assert not any(step.startswith("SCAN") and "INDEX" not in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_migrations_are_versioned_and_idempotent(db_path):
+    latest = db_helpers.SCHEMA_MIGRATIONS[-1][0]
+    with db_helpers.get_pool().connection() as conn:
+        assert db_helpers.get_schema_version(conn) == latest
+        assert db_helpers.apply_migrations(conn) == latest
+    db_helpers.init_db()
+    with db_helpers.get_pool().connection() as conn:
+        assert db_helpers.get_schema_version(conn) == latest
+
+
+def test_failed_migration_rolls_back_with_its_version(db_path, monkeypatch):
+    def crash(conn):
+        raise RuntimeError("crash mid-migration")
+
+    latest = db_helpers.SCHEMA_MIGRATIONS[-1][0]
+    monkeypatch.setattr(db_helpers, "SCHEMA_MIGRATIONS", db_helpers.SCHEMA_MIGRATIONS + [
+        (latest + 1, "half-applied", ["ALTER TABLE sessions ADD COLUMN scratch TEXT", crash]),
+    ])
+    with db_helpers.get_pool().connection() as conn:
+        with pytest.raises(RuntimeError):
+            db_helpers.apply_migrations(conn)
+        assert db_helpers.get_schema_version(conn) == latest
+        assert "scratch" not in [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+    # The rerun doesn't trip over a half-applied "duplicate column"
+    db_helpers.SCHEMA_MIGRATIONS[-1] = (latest + 1, "retry", ["ALTER TABLE sessions ADD COLUMN scratch TEXT"])
+    with db_helpers.get_pool().connection() as conn:
+        assert db_helpers.apply_migrations(conn) == latest + 1
+
+
+@pytest.mark.parametrize("filters, index", [
+    ({}, "idx_sessions_start_time"),
+    ({"cursor": "WyIyMDI1LTAxLTAxIDAwOjAwOjAwIiwgNV0"}, "idx_sessions_start_time"),
+    ({"gender": "female"}, "idx_sessions_gender_start"),
+    ({"triage_level": "emergency", "cursor": "WyIyMDI1LTAxLTAxIDAwOjAwOjAwIiwgNV0"}, "idx_sessions_triage_start"),
+])
+def test_sessions_page_uses_an_index(db_path, filters, index):
+    sql, params = db_helpers.build_sessions_page_query(limit=50, **filters)
+    plan = query_plan(sql, params)
+    assert any(f"INDEX {index}" in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
@@ -0,0 +1,101 @@
+# test_request_profiler.py
+import asyncio
+import os
+import pstats
+import time
+
+from flask import Flask
+
+from request_profiler import install_profiler
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def make_app():
+    app = Flask(__name__)
+
+    @app.route("/sync")
+    def sync_view():
+        busy_wait(0.03)
+        return "ok"
+
+    @app.route("/async")
+    async def async_view():
+        await asyncio.sleep(0)
+        busy_wait(0.03)
+        return "ok"
+
+    @app.route("/stream")
+    def stream_view():
+        def chunks():
+            for _ in range(3):
+                busy_wait(0.01)
+                yield "chunk"
+        return app.response_class(chunks())
+
+    return app
+
+
+def _profiles(directory):
+    return sorted(os.listdir(directory))
+
+
+def _get(client, path, **headers):
+    response = client.get(path, headers=headers)
+    response.get_data()
+    response.close()
+    return response
+
+
+def test_header_triggers_profile_with_both_outputs(tmp_path):
+    app = make_app()
+    profiler = install_profiler(app, str(tmp_path), interval=0.001)
+    client = app.test_client()
+
+    assert "X-Profile-Id" not in _get(client, "/sync").headers
+    assert _profiles(tmp_path) == []
+
+    response = _get(client, "/sync", **{"X-Profile": "1"})
+    stem = response.headers["X-Profile-Id"]
+    assert _profiles(tmp_path) == [stem + ".collapsed", stem + ".pstats"]
+    assert profiler.profiled == 1
+    functions = {func for _, _, func in pstats.Stats(str(tmp_path / (stem + ".pstats"))).stats}
+    assert "sync_view" in functions
+    collapsed = (tmp_path / (stem + ".collapsed")).read_text().splitlines()
+    assert collapsed and all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed)
+    assert any("busy_wait" in line for line in collapsed)
+
+
+def test_async_view_and_streamed_body_are_covered(tmp_path):
+    app = make_app()
+    install_profiler(app, str(tmp_path), interval=0.001)
+    client = app.test_client()
+    for path in ("/async", "/stream"):
+        stem = _get(client, path, **{"X-Profile": "yes"}).headers["X-Profile-Id"]
+        stats = pstats.Stats(str(tmp_path / (stem + ".pstats"))).stats
+        assert "busy_wait" in {func for _, _, func in stats}
+        if path == "/async":
+            assert "async_view" in {func for _, _, func in stats}
+
+
+def test_token_sampling_and_rotation(tmp_path):
+    app = make_app()
+    profiler = install_profiler(app, str(tmp_path), token="s3cret", keep=2, interval=0.001)
+    client = app.test_client()
+    _get(client, "/sync", **{"X-Profile": "1"})
+    assert _profiles(tmp_path) == []
+
+    stems = [_get(client, "/sync", **{"X-Profile": "s3cret"}).headers["X-Profile-Id"] for _ in range(3)]
+    assert _profiles(tmp_path) == sorted(f"{stem}{ext}" for stem in stems[1:] for ext in (".collapsed", ".pstats"))
+
+    profiler.token, profiler.sample_rate = None, 1.0
+    assert "X-Profile-Id" in _get(client, "/sync").headers
+
+
+def test_app_is_not_wrapped_without_profile_dir():
+    import app as app_module
+    assert app_module.app.wsgi_app.__class__.__name__ != "RequestProfiler"
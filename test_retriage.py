@@ -0,0 +1,62 @@
+# test_retriage.py
+import csv
+from datetime import datetime
+
+import pytest
+
+import db_helpers
+import retriage
+from symptom_api import call_symptom_api_mock
+
+
+def _session(turns):
+    session_id = db_helpers.create_session(start_time=datetime.utcnow())
+    for text, api_name, result in turns:
+        db_helpers.log_message(session_id, "user", text)
+        if api_name:
+            db_helpers.log_result(session_id, api_name, result)
+        db_helpers.log_message(session_id, "bot", "ok")
+    return session_id
+
+
+@pytest.fixture
+def history(db_path):
+    sessions = {
+        "stale_text": _session([("fever and cough", "mock", {"triage": "Old advice"})]),
+        "now_red_flag": _session([("chest pain", "mock", {"triage": "Self-care / monitor"})]),
+        "deepseek": _session([("chest pain", "deepseek", {"triage": "Self-care / monitor"})]),
+        "unchanged": _session([("hello", None, None),
+                               ("I have chest pain", "redflag", {"triage": "Emergency", "red_flag": True}),
+                               ("fever and cough", "mock", call_symptom_api_mock("fever and cough"))]),
+    }
+    db_helpers.flush_journal()
+    return sessions
+
+
+def test_pairs_results_with_the_message_they_answer(history):
+    rows = [row for chunk in retriage.read_chunks(chunk_sessions=2) for row in chunk]
+    assert [(row[2], row[3]) for row in rows if row[1] == history["unchanged"]] == [
+        ("I have chest pain", "redflag"), ("fever and cough", "mock")]
+    assert len(rows) == 5
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_writes_only_changed_outcomes_to_table(history, workers):
+    stats = retriage.run_retriage(retriage.TableSink("run1"), workers=workers, chunk_sessions=1)
+    assert (stats["rows"], stats["compared"], stats["diffs"]) == (5, 4, 2)
+    with db_helpers.get_pool().connection() as conn:
+        diffs = {row["session_id"]: row for row in conn.execute(
+            "SELECT * FROM retriage_diffs WHERE run_id = 'run1' ORDER BY message_id")}
+    assert set(diffs) == {history["stale_text"], history["now_red_flag"]}
+    flagged = diffs[history["now_red_flag"]]
+    assert (flagged["old_level"], flagged["new_api_name"], flagged["new_level"]) == ("routine", "redflag", "emergency")
+    assert flagged["new_triage"] == "red flag: chest pain"
+
+
+def test_cli_writes_csv(history, db_path, tmp_path, capsys):
+    out = tmp_path / "diffs.csv"
+    retriage.main(["--db", db_path, "--csv", str(out), "--workers", "0"])
+    with open(out, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["old_triage"] for row in rows] == ["Old advice", "Self-care / monitor"]
+    assert "rows/s" in capsys.readouterr().out
@@ -0,0 +1,94 @@
+# test_single_flight.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_overlapping_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return {"triage": "Self-care"}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flights.do, "k", work, 5) for _ in range(8)]
+        while flights.stats()["coalesced"] < 7:
+            time.sleep(0.01)
+        release.set()
+        results = [f.result() for f in futures]
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 7}
+
+
+def test_key_is_forgotten_once_the_call_completes():
+    flights = SingleFlight()
+    assert flights.do("k", lambda: 1) == 1
+    assert flights.do("k", lambda: 2) == 2
+    assert flights.stats()["leaders"] == 2
+
+
+def test_errors_reach_every_waiter():
+    flights = SingleFlight()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise ConnectionError("upstream down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, "k", fail)
+        started.wait(5)
+        follower = pool.submit(flights.do, "k", lambda: "unused", 5)
+        for f in (leader, follower):
+            with pytest.raises(ConnectionError):
+                f.result()
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_follower_timeout_leaves_the_shared_call_running():
+    flights = SingleFlight()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.3)
+        return "done"
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, "k", slow)
+        started.wait(5)
+        with pytest.raises(TimeoutError):
+            flights.do("k", lambda: "unused", timeout=0.05)
+        assert leader.result() == "done"
+
+
+def test_concurrent_identical_checks_make_one_upstream_call(fake_deepseek, db_path, monkeypatch):
+    import app as app_module
+    from triage_cache import TriageCache
+
+    server = fake_deepseek(latency_ms=300)
+    monkeypatch.setattr(app_module.pipeline, "deepseek_available", True)
+    monkeypatch.setattr(app_module.pipeline, "cache", TriageCache())
+    monkeypatch.setattr(app_module.pipeline, "flights", SingleFlight())
+
+    def check(_):
+        return app_module.app.test_client().post(
+            "/check", json={"symptoms": "I have fever", "age": "30", "use_api": "deepseek"}).get_json()
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(check, range(10)))
+    assert {r["result"]["triage"] for r in results} == {"See GP within 24-48 hours"}
+    assert len({r["session_id"] for r in results}) == 10
+    assert server.requests == 1
+    assert app_module.pipeline.flights.stats()["coalesced"] == 9
+    assert len(app_module.pipeline.cache) == 1
@@ -0,0 +1,92 @@
+# test_structured_logging.py
+import io
+import json
+import logging
+
+import pytest
+
+import structured_logging
+from structured_logging import SamplingFilter, configure_logging, parse_levels, parse_sample_rates
+
+
+@pytest.fixture
+def log_output():
+    """Route logging through the JSON writer into a buffer; restore the root after"""
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    stream = io.StringIO()
+
+    def lines():
+        structured_logging.stop_logging()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield stream, lines
+    structured_logging.stop_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in saved_handlers:
+        root.addHandler(handler)
+    root.setLevel(saved_level)
+    logging.getLogger("test.quiet").setLevel(logging.NOTSET)
+
+
+def test_records_are_json_lines_with_extras(log_output):
+    stream, lines = log_output
+    configure_logging(level="INFO", levels={}, sample_rates={}, stream=stream, force=True)
+    logger = logging.getLogger("test.app")
+    logger.info("Session %s completed", 42, extra={"route": "/check"})
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Failed")
+    first, second = lines()
+    assert first["msg"] == "Session 42 completed"
+    assert (first["level"], first["logger"], first["route"]) == ("INFO", "test.app", "/check")
+    assert second["level"] == "ERROR" and "ValueError: boom" in second["exc"]
+
+
+def test_per_logger_levels_and_lazy_formatting(log_output):
+    stream, lines = log_output
+    configure_logging(level="INFO", levels={"test.quiet": "WARNING"}, sample_rates={}, stream=stream, force=True)
+
+    class Expensive:
+        formatted = 0
+
+        def __str__(self):
+            Expensive.formatted += 1
+            return "expensive"
+
+    logging.getLogger("test.app").debug("%s", Expensive())
+    logging.getLogger("test.quiet").info("%s", Expensive())
+    logging.getLogger("test.quiet").warning("kept %s", Expensive())
+    assert [line["msg"] for line in lines()] == ["kept expensive"]
+    assert Expensive.formatted == 1
+
+
+def test_sampling_filter_keeps_a_fraction_of_an_event():
+    draws = iter([0.005, 0.5, 0.009, 0.99])
+    sampler = SamplingFilter({"deepseek.raw_response": 0.01}, rng=lambda: next(draws))
+
+    def record(event=None):
+        rec = logging.LogRecord("symptom_api", logging.DEBUG, __file__, 1, "raw", (), None)
+        if event:
+            rec.event = event
+        return rec
+
+    kept = [sampler.filter(record("deepseek.raw_response")) for _ in range(4)]
+    assert kept == [True, False, True, False]
+    assert sampler.filter(record()) and sampler.filter(record("other.event"))
+    sampled = record("deepseek.raw_response")
+    SamplingFilter({"deepseek.raw_response": 1.0}).filter(sampled)
+    assert sampled.sample_rate == 1.0
+
+
+def test_env_specs_are_parsed():
+    assert parse_levels("symptom_api=debug, werkzeug=WARNING,junk") == {"symptom_api": "DEBUG", "werkzeug": "WARNING"}
+    assert parse_sample_rates("a=0.5,b=2,c=x") == {"a": 0.5, "b": 1.0}
+
+
+def test_configure_leaves_existing_handlers_alone(log_output):
+    root = logging.getLogger()
+    root.addHandler(logging.NullHandler())
+    assert configure_logging() is None
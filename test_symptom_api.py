@@ -0,0 +1,186 @@
+# test_symptom_api.py
+import asyncio
+import json
+import time
+
+import symptom_api
+from triage_pipeline import FALLBACK_NOTE
+
+
+def test_async_client_matches_blocking_client(fake_deepseek):
+    fake_deepseek(latency_ms=50)
+    blocking = symptom_api.call_deepseek("fever and cough", age=30)
+    concurrent = symptom_api.run_on_async_loop(symptom_api.call_deepseek_async("fever and cough", age=30))
+    assert concurrent.result(timeout=5) == blocking
+    assert blocking["triage"] == "See GP within 24-48 hours"
+
+
+def test_async_calls_overlap_on_one_loop(fake_deepseek):
+    server = fake_deepseek(latency_ms=50)
+
+    async def fan_out(n):
+        return await asyncio.gather(*(symptom_api.call_deepseek_async(f"fever {i}") for i in range(n)))
+
+    t0 = time.perf_counter()
+    results = symptom_api.run_on_async_loop(fan_out(40)).result(timeout=5)
+    elapsed = time.perf_counter() - t0
+    assert len(results) == 40 and all(r["triage"] == "See GP within 24-48 hours" for r in results)
+    # 40 x 50 ms one after another would take 2 s
+    assert server.requests == 40 and elapsed < 1.0
+
+
+def test_async_client_falls_back_to_mock_when_upstream_is_down(monkeypatch):
+    monkeypatch.setattr(symptom_api, "DEEPSEEK_API_URL", "http://127.0.0.1:9/chat/completions")
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    result = symptom_api.run_on_async_loop(symptom_api.call_deepseek_async("fever and cough")).result(timeout=10)
+    assert result.pop("api_note") == "Primary API unavailable - using backup analysis"
+    assert result == symptom_api.call_symptom_api_mock("fever and cough")
+
+
+def test_check_route_awaits_async_client(fake_deepseek, db_path, monkeypatch):
+    import app as app_module
+    server = fake_deepseek(latency_ms=50)
+    monkeypatch.setattr(app_module.pipeline, "deepseek_available", True)
+    response = app_module.app.test_client().post(
+        "/check", json={"symptoms": "fever and cough", "age": "30", "use_api": "deepseek"})
+    assert response.status_code == 200
+    assert response.get_json()["result"]["triage"] == "See GP within 24-48 hours"
+    assert server.requests == 1
+
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_deepseek_yields_reply_text(fake_deepseek):
+    fake_deepseek(latency_ms=50)
+    text = "".join(symptom_api.stream_deepseek("fever and cough"))
+    assert symptom_api.parse_triage_content(text)["triage"] == "See GP within 24-48 hours"
+
+
+def test_check_stream_sends_fields_before_the_reply_finishes(fake_deepseek, db_path, monkeypatch):
+    import app as app_module
+    from triage_cache import TriageCache
+
+    fake_deepseek(latency_ms=20, token_interval_ms=5)
+    monkeypatch.setattr(app_module.pipeline, "deepseek_available", True)
+    monkeypatch.setattr(app_module.pipeline, "cache", TriageCache())
+    response = app_module.app.test_client().post(
+        "/check/stream", json={"symptoms": "fever and cough", "use_api": "deepseek"}, buffered=False)
+    assert response.mimetype == "text/event-stream"
+    t0 = time.perf_counter()
+    received, first_field_at = [], None
+    for chunk in response.response:
+        received.append(chunk.decode() if isinstance(chunk, bytes) else chunk)
+        if first_field_at is None and "event: field" in received[-1]:
+            first_field_at = time.perf_counter() - t0
+    total = time.perf_counter() - t0
+    events = parse_sse("".join(received))
+
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] == "session" and kinds[-1] == "result" and "token" in kinds
+    fields = [data["name"] for kind, data in events if kind == "field"]
+    assert fields == ["triage", "conditions", "advice", "selfcare", "warning", "summary"]
+    # "triage" comes first in the reply, so it lands well before the end
+    assert first_field_at < total / 2
+    assert events[-1][1]["result"]["triage"] == "See GP within 24-48 hours"
+
+
+def test_check_stream_mock_sends_whole_result(db_path):
+    import app as app_module
+
+    response = app_module.app.test_client().post("/check/stream", json={"symptoms": "I have chest pain"})
+    events = parse_sse(response.get_data(as_text=True))
+    assert [kind for kind, _ in events][0] == "session"
+    assert events[-1][1]["result"]["red_flag"] is True
+    assert ("field", {"name": "red_flag", "value": True}) in events
+
+
+def test_check_stream_resets_fields_when_the_reply_does_not_parse(fake_deepseek, db_path, monkeypatch):
+    import app as app_module
+    from triage_cache import TriageCache
+
+    fake_deepseek(token_interval_ms=1, malformed_rate=1.0)
+    monkeypatch.setattr(app_module.pipeline, "deepseek_available", True)
+    monkeypatch.setattr(app_module.pipeline, "cache", TriageCache())
+    response = app_module.app.test_client().post(
+        "/check/stream", json={"symptoms": "fever and cough", "use_api": "deepseek"})
+    events = parse_sse(response.get_data(as_text=True))
+
+    kinds = [kind for kind, _ in events]
+    reset = kinds.index("reset")
+    assert "field" in kinds[:reset]  # the truncated reply got some fields out first
+    result = events[-1][1]["result"]
+    assert result["api_note"] == FALLBACK_NOTE
+    after = {data["name"]: data["value"] for kind, data in events[reset:] if kind == "field"}
+    assert after == result
+
+
+def test_check_stream_shares_its_upstream_call_with_identical_checks(fake_deepseek, db_path, monkeypatch):
+    import threading
+    import app as app_module
+    from single_flight import SingleFlight
+    from triage_cache import TriageCache
+
+    server = fake_deepseek(latency_ms=20, token_interval_ms=5)
+    monkeypatch.setattr(app_module.pipeline, "deepseek_available", True)
+    monkeypatch.setattr(app_module.pipeline, "cache", TriageCache())
+    monkeypatch.setattr(app_module.pipeline, "flights", SingleFlight())
+    body = {"symptoms": "fever and cough", "use_api": "deepseek"}
+    response = app_module.app.test_client().post("/check/stream", json=body, buffered=False)
+    chunks = iter(response.response)
+    received = [next(chunks), next(chunks)]  # the session event, then the first token
+    joined = {}
+    follower = threading.Thread(
+        target=lambda: joined.update(app_module.app.test_client().post("/check", json=body).get_json()["result"]))
+    follower.start()
+    received.extend(chunks)
+    follower.join(timeout=5)
+
+    events = parse_sse("".join(c.decode() if isinstance(c, bytes) else c for c in received))
+    assert server.requests == 1
+    assert app_module.pipeline.flights.coalesced == 1
+    assert events[-1][1]["result"]["triage"] == joined["triage"] == "See GP within 24-48 hours"
+
+
+def test_has_red_flags_screens_each_record_separately():
+    texts = ["I have chest pain", "no", "chest pain today", "fever", "", "denies shortness of breath"]
+    assert symptom_api.has_red_flags(texts) == [symptom_api.has_red_flag(text) for text in texts]
+    assert symptom_api.has_red_flags(texts) == [True, False, True, False, False, False]
+
+
+def test_check_batch_streams_ndjson_and_stores_every_session(fake_deepseek, db_path, monkeypatch):
+    import app as app_module
+    from triage_cache import TriageCache
+    server = fake_deepseek(latency_ms=50)
+    monkeypatch.setattr(app_module.pipeline, "deepseek_available", True)
+    monkeypatch.setattr(app_module.pipeline, "cache", TriageCache())
+    records = [{"id": "a", "symptoms": "fever and cough", "age": "30"},
+               {"id": "b", "symptoms": "severe headache", "patient_name": "Bo"},
+               {"id": "c", "symptoms": "  "},
+               {"id": "d", "symptoms": "Fever and cough.", "age": "35"}]
+    response = app_module.app.test_client().post(
+        "/check/batch", json={"records": records, "use_api": "deepseek"})
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["id"] for line in lines] == ["a", "b", "c", "d"]
+    assert lines[0]["result"]["triage"] == lines[3]["result"]["triage"] == "See GP within 24-48 hours"
+    assert lines[1]["result"]["red_flag"] is True and lines[1]["result"]["patient_name"] == "Bo"
+    assert "error" in lines[2] and "session_id" not in lines[2]
+    # "a" and "d" are the same presentation: one upstream call
+    assert server.requests == 1
+    import db_helpers
+    for line in (lines[0], lines[1], lines[3]):
+        assert [m["role"] for m in db_helpers.get_messages_for_session(line["session_id"])][-2:] == ["user", "bot"]
+
+
+def test_check_batch_rejects_bad_requests(db_path, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, "BATCH_MAX_RECORDS", 2)
+    client = app_module.app.test_client()
+    assert client.post("/check/batch", json={"records": []}).status_code == 400
+    assert client.post("/check/batch", json={"records": [{"symptoms": "fever"}] * 3}).status_code == 413
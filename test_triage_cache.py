@@ -0,0 +1,109 @@
+# test_triage_cache.py
+import json
+
+import pytest
+
+import db_helpers
+from triage_cache import TriageCache, age_band, cache_key, normalize_symptoms
+
+
+RESULT = {"triage": "Self-care", "conditions": [{"name": "Common cold", "probability": 0.7}]}
+
+
+def as_json(result):
+    # Cached results are frozen (lists become tuples); compare what clients see
+    return json.loads(json.dumps(result))
+
+
+def test_key_normalizes_text_and_buckets_age():
+    assert normalize_symptoms("  I have FEVER!! ") == "i have fever"
+    assert age_band("30") == age_band(39) == "18-39"
+    assert age_band(None) is None and age_band("old") is None
+    assert cache_key("mock", "I have fever", 30, "Male") == cache_key("mock", "i have  fever.", "35", "male")
+    assert cache_key("mock", "I have fever", 30, "male") != cache_key("mock", "I have fever", 70, "male")
+    assert cache_key("mock", "I have fever") != cache_key("deepseek", "I have fever")
+
+
+def test_non_latin_text_keeps_distinct_keys():
+    assert normalize_symptoms("सीने में दर्द!") == "सीने में दर्द"
+    assert normalize_symptoms("Fièvre, TOUX") == "fièvre toux"
+    assert cache_key("mock", "सीने में दर्द", 40, "male") != cache_key("mock", "बुखार", 40, "male")
+    assert cache_key("mock", "胸痛") != cache_key("mock", "发烧")
+
+
+def test_text_without_words_is_never_cached():
+    assert normalize_symptoms("?!...") == "" and cache_key("mock", "?!...") is None
+    cache = TriageCache()
+    cache.put(None, "mock", RESULT)
+    assert cache.get(None) is None and len(cache) == 0
+
+
+def test_hit_returns_copy_of_frozen_result():
+    cache = TriageCache()
+    cache.put("k", "mock", RESULT)
+    first, second = cache.get("k"), cache.get("k")
+    assert as_json(first) == RESULT and first is not second
+    first["patient_name"] = "Ann"
+    with pytest.raises(TypeError):
+        first["conditions"][0]["probability"] = 1.0
+    assert cache.stats()["memory_hits"] == 2
+
+
+def test_lru_eviction_and_ttl(clock):
+    cache = TriageCache(max_entries=2, ttl_seconds=60, clock=clock)
+    cache.put("a", "mock", RESULT)
+    cache.put("b", "mock", RESULT)
+    cache.get("a")
+    cache.put("c", "mock", RESULT)
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+    clock.now += 61
+    assert cache.get("a") is None
+    assert cache.purge_expired() == 1 and len(cache) == 0
+
+
+def test_bypass_and_disabled_cache():
+    cache = TriageCache()
+    cache.put("k", "mock", RESULT)
+    assert cache.get("k", bypass=True) is None
+    assert cache.stats()["bypasses"] == 1
+    off = TriageCache(max_entries=0)
+    off.put("k", "mock", RESULT)
+    assert off.get("k") is None and len(off) == 0
+
+
+def test_sqlite_tier_survives_restart(db_path, clock):
+    TriageCache(persistent=True, ttl_seconds=60, clock=clock).put("k", "deepseek", RESULT)
+    restarted = TriageCache(persistent=True, ttl_seconds=60, clock=clock)
+    assert as_json(restarted.get("k")) == RESULT
+    assert as_json(restarted.get("k")) == RESULT
+    assert restarted.stats()["sqlite_hits"] == 1 and restarted.stats()["memory_hits"] == 1
+    clock.now += 61
+    assert TriageCache(persistent=True, clock=clock).get("k") is None
+    assert restarted.purge_expired() == 2
+
+
+def test_check_serves_repeat_presentations_from_cache(db_path, monkeypatch):
+    import app as app_module
+    import triage_pipeline
+    monkeypatch.setattr(app_module.pipeline, "cache", TriageCache())
+    calls = []
+    monkeypatch.setattr(triage_pipeline, "call_symptom_api_mock",
+                        lambda *args, **kwargs: calls.append(args) or {"triage": "Self-care"})
+    client = app_module.app.test_client()
+    for text in ("I have fever", "i have FEVER.", "I have fever"):
+        assert client.post("/check", json={"symptoms": text, "age": "30"}).get_json()["result"]["triage"] == "Self-care"
+    assert len(calls) == 1
+    client.post("/check", json={"symptoms": "I have fever", "age": "30", "bypass_cache": True})
+    assert len(calls) == 2
+    stats = client.get("/health").get_json()["triage_cache"]
+    assert (stats["hits"], stats["misses"], stats["bypasses"]) == (2, 1, 1)
+
+
+def test_sqlite_tier_purges_expired_rows_on_put(db_path, clock):
+    cache = TriageCache(persistent=True, ttl_seconds=10, purge_interval=60, clock=clock)
+    cache.put("old", "deepseek", RESULT)
+    clock.now += 61
+    cache.put("new", "deepseek", RESULT)
+    with db_helpers.get_pool().connection() as conn:
+        assert [row[0] for row in conn.execute("SELECT key FROM triage_cache")] == ["new"]
@@ -0,0 +1,117 @@
+# test_triage_pipeline.py
+import asyncio
+import time
+
+import pytest
+
+import db_helpers
+import metrics
+import symptom_api
+import triage_pipeline
+from single_flight import SingleFlight
+from triage_cache import TriageCache
+from triage_pipeline import EMERGENCY, GENERAL, MEDICAL, TriagePipeline
+
+
+@pytest.fixture
+def pipeline():
+    return TriagePipeline(cache=TriageCache(), flights=SingleFlight())
+
+
+def _run(pipeline, text, **kwargs):
+    session_id = db_helpers.create_session(start_time="2025-01-01 10:00:00")
+    return session_id, asyncio.run(pipeline.run(text, session_id, **kwargs))
+
+
+def test_classify(pipeline):
+    assert pipeline.classify(pipeline.screen("I have chest pain")) == EMERGENCY
+    assert pipeline.classify(pipeline.screen("hello there")) == MEDICAL
+    assert pipeline.classify(pipeline.screen("hello there"), require_medical=True) == GENERAL
+    assert pipeline.classify(pipeline.screen("no chest pain"), require_medical=True) == MEDICAL
+
+
+def test_emergency_uses_shared_template(db_path, pipeline):
+    session_id, outcome = _run(pipeline, "sudden numbness in my arm", patient_name="Ann")
+    assert (outcome.kind, outcome.api_name) == (EMERGENCY, "redflag")
+    assert outcome.result["patient_name"] == "Ann" and triage_pipeline.EMERGENCY_RESULT["patient_name"] is None
+    assert outcome.result["conditions"] is triage_pipeline.EMERGENCY_RESULT["conditions"]
+    with pytest.raises(TypeError):
+        outcome.result["conditions"][0]["probability"] = 1.0
+    db_helpers.flush_journal()
+    assert [m["role"] for m in db_helpers.get_messages_for_session(session_id)] == ["bot"]
+
+
+def test_stages_are_timed_and_result_persisted(db_path, pipeline):
+    session_id, outcome = _run(pipeline, "fever and cough", age="30", patient_name="Bo")
+    assert outcome.kind == MEDICAL and outcome.api_name == "mock" and not outcome.cache_hit
+    assert list(outcome.timings) == list(triage_pipeline.STAGES)
+    assert all(seconds >= 0 for seconds in outcome.timings.values())
+    assert outcome.result["patient_name"] == "Bo" and outcome.result["summary"]
+    _, again = _run(pipeline, "Fever and cough!", age="35")
+    assert again.cache_hit
+    db_helpers.flush_journal()
+    assert db_helpers.get_results_for_session(session_id)[0]["api_name"] == "mock"
+
+
+def test_general_chat_stops_after_classify(db_path, pipeline):
+    session_id, outcome = _run(pipeline, "what's the weather like", require_medical=True)
+    assert outcome.kind == GENERAL and outcome.result is None
+    assert list(outcome.timings) == ["screen", "classify"]
+
+
+def test_provider_errors_fall_back_to_mock(db_path, pipeline, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("cache down")
+
+    monkeypatch.setattr(pipeline.cache, "get", broken)
+    _, outcome = _run(pipeline, "fever and cough")
+    assert outcome.api_name == "mock_fallback"
+    assert outcome.result["api_note"] == triage_pipeline.FALLBACK_NOTE
+
+
+def test_deadline_fallback_is_recorded_as_mock_fallback(fake_deepseek, db_path):
+    fake_deepseek(latency_ms=500)
+    pipeline = TriagePipeline(cache=TriageCache(), flights=SingleFlight(), deepseek_available=True)
+    fallback_timings = triage_pipeline.PROVIDER_SECONDS.labels("mock_fallback")
+    deepseek_timings = triage_pipeline.PROVIDER_SECONDS.labels("deepseek")
+    before = (sum(fallback_timings.counts), sum(deepseek_timings.counts))
+    session_id, outcome = _run(pipeline, "fever and cough", use_api="deepseek", deadline=time.monotonic() + 0.05)
+    assert outcome.api_name == "mock_fallback"
+    assert outcome.result["api_note"] == triage_pipeline.FALLBACK_NOTE
+    assert db_helpers.get_results_for_session(session_id)[0]["api_name"] == "mock_fallback"
+    assert len(pipeline.cache) == 0
+    # The latency breakdown files it under the fallback, not under DeepSeek
+    assert (sum(fallback_timings.counts), sum(deepseek_timings.counts)) == (before[0] + 1, before[1])
+    assert 'triage_provider_seconds_count{api_name="mock_fallback"}' in metrics.render()
+
+
+def test_follower_is_not_bound_by_the_leaders_deadline(fake_deepseek, db_path):
+    server = fake_deepseek(latency_ms=200)
+    pipeline = TriagePipeline(cache=TriageCache(), flights=SingleFlight(), deepseek_available=True)
+
+    async def leader_and_follower():
+        now = time.monotonic()
+        return await asyncio.gather(
+            pipeline.call_deepseek("fever and cough", deadline=now + 0.05),
+            pipeline.call_deepseek("fever and cough", deadline=now + 5))
+
+    leader, follower = asyncio.run(leader_and_follower())
+    assert leader["api_note"] == triage_pipeline.FALLBACK_NOTE
+    assert "api_note" not in follower and follower["triage"] == "See GP within 24-48 hours"
+    assert server.requests == 1 and pipeline.flights.coalesced == 1
+
+
+def test_send_message_routes_through_pipeline(db_path):
+    import app as app_module
+
+    client = app_module.app.test_client()
+    conversation_id = client.post("/api/start_conversation", json={"patient_name": "Cy"}).get_json()["conversation_id"]
+    chat = client.post("/api/send_message", json={"conversation_id": conversation_id, "message": "hi"}).get_json()
+    assert chat["is_medical"] is False and chat["response"] in triage_pipeline.GENERAL_RESPONSES
+    medical = client.post("/api/send_message",
+                          json={"conversation_id": conversation_id, "message": "I have a fever"}).get_json()
+    assert medical["is_medical"] is True and medical["analysis"]["patient_name"] == "Cy"
+    assert medical["follow_up"] in triage_pipeline.FOLLOW_UP_QUESTIONS
+    emergency = client.post("/api/send_message",
+                            json={"conversation_id": conversation_id, "message": "chest pain now"}).get_json()
+    assert emergency["is_emergency"] is True and emergency["analysis"]["red_flag"] is True
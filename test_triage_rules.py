@@ -0,0 +1,62 @@
+# test_triage_rules.py
+import json
+
+import pytest
+
+from symptom_api import MOCK_RULES, call_symptom_api_mock
+from triage_rules import FrozenDict, RuleEngine
+
+
+@pytest.mark.parametrize("text, rule_id", [
+    ("Chest pain and I'm short of breath", "cardiac_emergency"),
+    ("chest pain, feeling dizzy", "cardiac_emergency"),
+    ("fever, cough and a sore throat", "respiratory_infection_sore_throat"),
+    ("fever and cough", "respiratory_infection"),
+    ("bad headache and a stiff neck", "possible_meningitis"),
+    ("rash with fever", "rash_with_fever"),
+    ("stomach pain and vomiting", "gastroenteritis"),
+    ("back pain and fever", "back_pain_with_fever"),
+    ("chest pain only", None),
+    ("a bit tired", None),
+])
+def test_shipped_rules(text, rule_id):
+    rule = MOCK_RULES.match(text)
+    assert (rule.id if rule else None) == rule_id
+
+
+def test_mock_returns_copy_of_shared_frozen_template():
+    first = call_symptom_api_mock("fever and cough")
+    second = call_symptom_api_mock("fever and cough")
+    assert first == second and first is not second
+    assert first["conditions"] is second["conditions"]
+    first["patient_name"] = "Ann"  # top level is the caller's own
+    with pytest.raises(TypeError):
+        first["conditions"][0]["probability"] = 1.0
+    assert json.loads(json.dumps(first))["conditions"][0]["name"].startswith("Common cold")
+
+
+def test_priority_then_file_order():
+    engine = RuleEngine([
+        {"id": "low", "priority": 1, "all": ["fever"], "response": {"triage": "low"}},
+        {"id": "high", "priority": 5, "all": ["fever", "rash"], "response": {"triage": "high"}},
+        {"id": "tie", "priority": 5, "any": ["rash", "itch"], "response": {"triage": "tie"}},
+    ], {"triage": "default"})
+    assert engine.evaluate("fever")["triage"] == "low"
+    assert engine.evaluate("fever and rash")["triage"] == "high"
+    assert engine.evaluate("itchy")["triage"] == "tie"
+    assert engine.evaluate("nothing")["triage"] == "default"
+    assert isinstance(engine.evaluate("nothing"), FrozenDict)
+
+
+def test_thousands_of_rules_only_touch_matched_terms():
+    rules = [{"id": f"r{i}", "priority": i % 7, "all": [f"term{i:05d}", "fever"],
+              "response": {"triage": str(i)}} for i in range(5000)]
+    engine = RuleEngine(rules, {"triage": "default"})
+    assert engine.evaluate("fever with term01234")["triage"] == "1234"
+    # Each rule is indexed under one anchor term only
+    assert sum(len(v) for v in engine._index.values()) == 5000
+
+
+def test_rule_without_terms_rejected():
+    with pytest.raises(ValueError):
+        RuleEngine([{"id": "empty", "response": {}}], {})
@@ -0,0 +1,183 @@
+# triage_cache.py
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import db_helpers
+from triage_rules import freeze
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def _is_text_char(ch):
+    # \w alone would split words in scripts that write vowels as combining
+    # marks ("बुखार" -> "ब ख र"), so marks are kept too
+    return ch.isalnum() or unicodedata.category(ch)[0] == "M"
+
+
+def normalize_symptoms(text):
+    """Case-fold, drop punctuation and collapse whitespace: "I have fever!" -> "i have fever".
+
+    Works on any script; text with no letters or digits normalizes to "".
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    if text.isascii():
+        return _NON_WORD.sub(" ", text).strip()
+    return " ".join("".join(ch if _is_text_char(ch) else " " for ch in text).split())
+
+
+def age_band(age):
+    """The AGE_BANDS label for ``age`` (int or digit string), or None if unknown"""
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return None
+    for label, (low, high) in db_helpers.AGE_BANDS.items():
+        if age >= low and (high is None or age <= high):
+            return label
+    return None
+
+
+def cache_key(api_name, symptoms_text, age=None, gender=None):
+    """Content address of a triage request: provider, normalized text, age band, gender.
+
+    None when the text normalizes to nothing: such requests can't be told
+    apart, so they are never cached (TriageCache ignores a None key).
+    """
+    text = normalize_symptoms(symptoms_text)
+    if not text:
+        return None
+    parts = [api_name, text, age_band(age), (gender or "").strip().lower()]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+class TriageCache:
+    """Provider results by cache_key: an in-process LRU, optionally backed by SQLite.
+
+    Entries expire ``ttl_seconds`` after they were stored.  With
+    ``persistent`` every store is also written to the triage_cache table,
+    so a restarted (or sibling) worker falls back to it on an LRU miss.
+    Results are frozen once and each ``get`` returns a shallow copy, like
+    the mock provider's templates.  ``max_entries=0`` turns caching off.
+    Expired SQLite rows are purged from ``put`` at most every
+    ``purge_interval`` seconds, so the table doesn't grow without bound.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=6 * 3600, persistent=False, clock=time.time,
+                 purge_interval=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self.purge_interval = purge_interval
+        self._clock = clock
+        self._purged_at = clock()
+        self._entries = OrderedDict()  # key -> (expires_at, frozen result)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _pool(self):
+        return db_helpers.get_pool()
+
+    def _remember(self, key, expires_at, result):
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key, bypass=False):
+        """A copy of the cached result, or None on a miss (always None with ``bypass`` or no ``key``)"""
+        if not self.max_entries or key is None:
+            return None
+        if bypass:
+            self.bypasses += 1
+            return None
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return dict(entry[1])
+                del self._entries[key]
+        if self.persistent:
+            with self._pool().connection() as conn:
+                row = conn.execute("SELECT result, expires_at FROM triage_cache WHERE key = ? AND expires_at > ?",
+                                   (key, now)).fetchone()
+            if row is not None:
+                result = freeze(json.loads(row[0]))
+                self._remember(key, row[1], result)
+                self.sqlite_hits += 1
+                return dict(result)
+        self.misses += 1
+        return None
+
+    def put(self, key, api_name, result):
+        if not self.max_entries or key is None:
+            return
+        now = self._clock()
+        expires_at = now + self.ttl_seconds
+        self._remember(key, expires_at, freeze(result))
+        self.stores += 1
+        if self.persistent:
+            with self._lock:
+                purge = now - self._purged_at >= self.purge_interval
+                if purge:
+                    self._purged_at = now
+            if purge:
+                self.purge_expired()
+            with self._pool().connection() as conn:
+                conn.execute("INSERT OR REPLACE INTO triage_cache (key, api_name, result, expires_at, created_at) "
+                             "VALUES (?, ?, ?, ?, ?)", (key, api_name, json.dumps(result), expires_at, now))
+
+    def purge_expired(self):
+        """Drop expired entries from both tiers; returns how many were removed"""
+        now = self._clock()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+        removed = len(expired)
+        if self.persistent:
+            with self._pool().connection() as conn:
+                removed += conn.execute("DELETE FROM triage_cache WHERE expires_at <= ?", (now,)).rowcount
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.persistent:
+            with self._pool().connection() as conn:
+                conn.execute("DELETE FROM triage_cache")
+
+    def stats(self):
+        hits = self.memory_hits + self.sqlite_hits
+        lookups = hits + self.misses
+        return {
+            "backend": "sqlite" if self.persistent else "memory",
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "sqlite_hits": self.sqlite_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "bypasses": self.bypasses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,371 @@
+# triage_pipeline.py
+import asyncio
+import logging
+import time
+from concurrent.futures import Future
+
+import metrics
+from db_helpers import log_message, log_result
+from incremental_json import JSONFieldStream
+from symptom_api import (
+    call_symptom_api_mock, call_deepseek_async, has_red_flags, parse_triage_content, run_on_async_loop,
+    screen_symptoms, stream_deepseek, TRIAGE_FALLBACKS
+)
+from triage_cache import cache_key as triage_cache_key
+from triage_rules import freeze
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_NOTE = "Primary API unavailable - using backup analysis"
+
+# The fixed response for messages with a red flag, built once and shared;
+# emergency_result() adds the patient's name to a shallow copy
+EMERGENCY_RESULT = freeze({
+    "triage": "🚨 Emergency — seek immediate care",
+    "conditions": [{"name": "Potential emergency condition", "probability": 0.8}],
+    "advice": "Symptoms indicate possible emergency. Call emergency services or go to nearest ER immediately.",
+    "selfcare": ["Do not delay - go to emergency department"],
+    "warning": [
+        "Severe chest pain or pressure",
+        "Difficulty breathing or shortness of breath",
+        "Loss of consciousness or sudden confusion"
+    ],
+    "summary": "Immediate emergency care is recommended based on the symptoms you provided.",
+    "patient_name": None,
+    "red_flag": True
+})
+
+REQUIRED_KEYS = ("triage", "conditions", "advice", "selfcare", "warning", "summary")
+DEFAULT_SELFCARE = ("Stay hydrated and rest.",)
+DEFAULT_WARNING = ("Seek medical help if symptoms worsen.",)
+
+# Chat replies for messages that aren't about symptoms, and follow-ups after
+# an assessment; picked by conversation length so they rotate
+GENERAL_RESPONSES = (
+    "I'm here to help with medical concerns. Could you describe any symptoms you're experiencing?",
+    "I specialize in symptom assessment. Please tell me about any health issues you're having.",
+    "For medical assistance, please describe your symptoms and I'll do my best to help.",
+    "I understand you have a question. I'm designed to help with medical symptoms and health concerns. What symptoms are you experiencing?"
+)
+FOLLOW_UP_QUESTIONS = (
+    "Is there anything else you'd like to know about your symptoms?",
+    "Would you like me to clarify anything about this assessment?",
+    "Do you have any other symptoms you'd like to discuss?",
+    "Is there anything else about your health that you're concerned about?"
+)
+
+# What classify() makes of a message
+EMERGENCY = "emergency"
+GENERAL = "general"
+MEDICAL = "medical"
+
+STAGES = ("screen", "classify", "provide", "normalize", "persist")
+
+STAGE_SECONDS = metrics.histogram("triage_stage_seconds", "Time spent in each triage pipeline stage", ["stage"])
+PROVIDER_SECONDS = metrics.histogram(
+    "triage_provider_seconds",
+    "Time to get a triage result, by provider (deepseek, mock, redflag; mock_fallback for backup answers)",
+    ["api_name"])
+RED_FLAGS = metrics.counter("triage_red_flags_total", "Messages answered with the emergency template")
+
+
+class DeepSeekStreamFailed(Exception):
+    """A streamed DeepSeek triage broke off or didn't parse; raised to its followers"""
+
+
+def emergency_result(patient_name):
+    result = dict(EMERGENCY_RESULT)
+    result["patient_name"] = patient_name
+    return result
+
+
+def fallback_api_name(api_name, result):
+    """"mock_fallback" for a backup answer (marked with ``api_note``), else ``api_name``"""
+    return "mock_fallback" if "api_note" in result else api_name
+
+
+def complete_result(result, patient_name):
+    """Fill in whatever the provider left out, in place"""
+    for key in REQUIRED_KEYS:
+        result.setdefault(key, "")
+    if not result.get("selfcare"):
+        result["selfcare"] = DEFAULT_SELFCARE
+    if not result.get("warning"):
+        result["warning"] = DEFAULT_WARNING
+    if not result.get("summary"):
+        top_condition = result.get("conditions", [{}])[0].get("name") if result.get("conditions") else None
+        if top_condition:
+            result["summary"] = f"Most likely: {top_condition}. {result.get('advice', 'Follow up with a physician if unsure.')}"
+        else:
+            result["summary"] = "Please consult with a healthcare provider for proper diagnosis."
+    result["patient_name"] = patient_name
+    return result
+
+
+class TriageOutcome:
+    """What the pipeline made of one message.
+
+    ``kind`` is EMERGENCY, GENERAL or MEDICAL.  GENERAL messages stop after
+    classify and have no ``result``.  ``timings`` maps each stage that ran
+    to its duration in seconds.
+    """
+
+    __slots__ = ("kind", "api_name", "result", "cache_hit", "screening", "timings")
+
+    def __init__(self):
+        self.kind = None
+        self.api_name = None
+        self.result = None
+        self.cache_hit = False
+        self.screening = None
+        self.timings = {}
+
+
+class TriagePipeline:
+    """screen -> classify -> provide -> normalize -> persist, shared by the routes.
+
+    screen: one matcher pass for red flags and medical keywords.
+    classify: emergency, general chat (only when ``require_medical``) or a
+    medical question.  provide: the emergency template, a cached result,
+    or the chosen provider (DeepSeek calls for identical presentations are
+    coalesced on ``flights`` and the result cached); anything that goes
+    wrong there falls back to the mock as "mock_fallback".  normalize:
+    backfill missing fields.  persist: log the result and the bot reply.
+    """
+
+    def __init__(self, cache, flights, deepseek_available=False, deadline_seconds=20.0):
+        self.cache = cache
+        self.flights = flights
+        self.deepseek_available = deepseek_available
+        self.deadline_seconds = deadline_seconds
+
+    def select_api(self, use_api):
+        return "deepseek" if use_api == "deepseek" and self.deepseek_available else "mock"
+
+    # Stages
+
+    def screen(self, text):
+        return screen_symptoms(text)
+
+    def screen_many(self, texts):
+        """Red-flag booleans for a whole batch, in one matcher pass"""
+        return has_red_flags(texts)
+
+    def classify(self, screening, require_medical=False):
+        if screening["red_flags"]:
+            return EMERGENCY
+        # Negated red flags ("no chest pain") still make it a medical question
+        if require_medical and not (screening["keywords"] or screening["negated_red_flags"]):
+            return GENERAL
+        return MEDICAL
+
+    async def provide(self, text, age=None, gender=None, api_name="mock", bypass_cache=False, deadline=None):
+        """``(api_name, result, cache_hit)`` for a medical question"""
+        key = triage_cache_key(api_name, text, age, gender)
+        try:
+            result = self.cache.get(key, bypass=bypass_cache)
+            if result is not None:
+                return api_name, result, True
+            if api_name == "deepseek":
+                result = await self.call_deepseek(text, age, gender, cache_key=key, deadline=deadline)
+                # A backup answer (deadline, breaker, bad reply) isn't DeepSeek's
+                return fallback_api_name(api_name, result), result, False
+            result = call_symptom_api_mock(text, age=age, gender=gender)
+            self.cache_result(key, api_name, result)
+            return api_name, result, False
+        except Exception as e:
+            logger.error("API call failed: %s", e)
+            return "mock_fallback", self.backup_result(text, age, gender, "error"), False
+
+    def provide_stream(self, text, age=None, gender=None, api_name="mock", bypass_cache=False, deadline=None):
+        """provide() for /check/stream: a generator of ``(event, data)`` pairs
+        that returns ``(api_name, result, cache_hit, streamed)``.
+
+        A DeepSeek miss whose caller leads the flight is streamed: ``token``
+        events carry the raw model text and ``field`` events each top-level
+        field as it completes, and ``streamed`` is true.  Identical calls
+        that arrive meanwhile join it as usual.  If the stream fails after
+        fields went out, a ``reset`` event tells the client to drop them
+        before the backup answer.  Everything else goes through provide()
+        and yields nothing.
+        """
+        if api_name != "deepseek":
+            return (*asyncio.run(self.provide(text, age, gender, api_name, bypass_cache, deadline)), False)
+        key = triage_cache_key(api_name, text, age, gender)
+        result = self.cache.get(key, bypass=bypass_cache)
+        if result is not None:
+            return api_name, result, True, False
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline_seconds
+        future, is_leader = (Future(), True) if key is None else self.flights.submit(key, Future)
+        if not is_leader:
+            try:
+                result = asyncio.run(self.call_deepseek(text, age, gender, cache_key=key, deadline=deadline))
+            except Exception as e:
+                logger.error("API call failed: %s", e)
+                result = self.backup_result(text, age, gender, "error")
+            return fallback_api_name(api_name, result), result, False, False
+
+        fields = JSONFieldStream()
+        content, sent_fields = [], False
+        try:
+            for piece in stream_deepseek(text, age=age, gender=gender, deadline=deadline):
+                content.append(piece)
+                yield "token", {"text": piece}
+                for name, value in fields.feed(piece):
+                    sent_fields = True
+                    yield "field", {"name": name, "value": value}
+            result = parse_triage_content("".join(content))
+        except Exception as e:
+            logger.error("DeepSeek stream failed: %s", e)
+        finally:
+            # Release the followers even if the client hung up mid-stream
+            if result is None:
+                future.set_exception(DeepSeekStreamFailed("DeepSeek stream failed or didn't parse"))
+            else:
+                future.set_result(result)
+                self.cache_result(key, api_name, result)
+        if result is None:
+            if sent_fields:
+                yield "reset", {}
+            return "mock_fallback", self.backup_result(text, age, gender, "stream_error"), False, False
+        # The followers share the flight's dict; the caller fills in its own
+        return api_name, dict(result), False, True
+
+    def backup_result(self, text, age, gender, reason):
+        """The mock's answer, marked with FALLBACK_NOTE, when DeepSeek failed for ``reason``"""
+        TRIAGE_FALLBACKS.labels(reason).inc()
+        result = call_symptom_api_mock(text, age=age, gender=gender)
+        result["api_note"] = FALLBACK_NOTE
+        return result
+
+    async def provide_many(self, pending, api_name, bypass_cache=False, deadline=None, concurrency=16):
+        """Results for ``pending`` ({key: (text, age, gender)}), at most
+        ``concurrency`` DeepSeek calls at a time.
+
+        Keys are cache keys; any other key (e.g. a tuple, for text that has
+        no cache key) is triaged without touching the cache.
+        """
+        results = {}
+        calls = {}
+        for key, (text, age, gender) in pending.items():
+            cache_key = key if isinstance(key, str) else None
+            result = self.cache.get(cache_key, bypass=bypass_cache)
+            if result is not None:
+                results[key] = result
+            elif api_name == "deepseek":
+                calls[key] = (text, age, gender)
+            else:
+                result = call_symptom_api_mock(text, age=age, gender=gender)
+                self.cache_result(cache_key, api_name, result)
+                results[key] = result
+
+        limit = asyncio.Semaphore(concurrency)
+
+        async def bounded(key, text, age, gender):
+            async with limit:
+                return await self.call_deepseek(text, age, gender, cache_key=key if isinstance(key, str) else None,
+                                                deadline=deadline)
+
+        fetched = await asyncio.gather(*(bounded(key, *args) for key, args in calls.items()))
+        results.update(zip(calls, fetched))
+        return results
+
+    def normalize(self, result, patient_name):
+        return complete_result(result, patient_name)
+
+    def persist(self, session_id, api_name, result):
+        log_result(session_id, api_name, result)
+        log_message(session_id, "bot", result.get("advice", ""))
+
+    # Provider plumbing
+
+    def cache_result(self, key, api_name, result):
+        # Fallback answers carry an api_note; only cache what the provider said
+        if "api_note" not in result:
+            self.cache.put(key, api_name, result)
+
+    def _cache_flight_result(self, key, future):
+        if not future.cancelled() and future.exception() is None:
+            self.cache_result(key, "deepseek", future.result())
+
+    async def call_deepseek(self, text, age=None, gender=None, cache_key=None, deadline=None):
+        """Run a DeepSeek triage on the shared async client loop.
+
+        The upstream request is a coroutine on that loop, not a blocked
+        thread, so concurrent LLM calls are bounded by its connection limit.
+        Callers with the same ``cache_key`` share one in-flight call, and its
+        result is cached once it lands; text without a cache key gets a call
+        of its own.  A shared call runs to the pipeline's ``deadline_seconds``
+        (or the caller's ``deadline``, if later), so the leader's deadline
+        doesn't cut it short for followers; nobody waits past their own.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline_seconds
+        key = cache_key or triage_cache_key("deepseek", text, age, gender)
+        upstream_deadline = deadline if key is None else max(deadline, time.monotonic() + self.deadline_seconds)
+        start = lambda: run_on_async_loop(call_deepseek_async(text, age=age, gender=gender,
+                                                              deadline=upstream_deadline))
+        if key is None:
+            future, is_leader = start(), False
+        else:
+            future, is_leader = self.flights.submit(key, start)
+        if is_leader:
+            future.add_done_callback(lambda f: self._cache_flight_result(key, f))
+        elif key is not None:
+            logger.info("Joining in-flight DeepSeek triage for an identical presentation")
+        try:
+            # shield: one waiter timing out mustn't cancel the call for the others
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                            max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            logger.error("DeepSeek triage missed the request deadline; using backup analysis")
+            return self.backup_result(text, age, gender, "deadline")
+        # Every waiter gets its own top-level dict to fill in
+        return dict(result)
+
+    # The whole thing
+
+    async def run(self, text, session_id, age=None, gender=None, patient_name=None, use_api="mock",
+                  require_medical=False, bypass_cache=False, deadline=None):
+        """Triage ``text`` for ``session_id`` and log the outcome"""
+        outcome = TriageOutcome()
+        timings = outcome.timings
+        started = time.perf_counter()
+        outcome.screening = self.screen(text)
+        now = time.perf_counter()
+        timings["screen"], started = now - started, now
+
+        outcome.kind = self.classify(outcome.screening, require_medical)
+        now = time.perf_counter()
+        timings["classify"], started = now - started, now
+        if outcome.kind == GENERAL:
+            self.observe(timings)
+            return outcome
+
+        if outcome.kind == EMERGENCY:
+            logger.info("Red flag detected for session %s", session_id)
+            RED_FLAGS.inc()
+            outcome.api_name, outcome.result = "redflag", emergency_result(patient_name)
+        else:
+            outcome.api_name, outcome.result, outcome.cache_hit = await self.provide(
+                text, age, gender, self.select_api(use_api), bypass_cache, deadline)
+            if outcome.cache_hit:
+                logger.debug("Triage cache hit for session %s", session_id)
+        now = time.perf_counter()
+        timings["provide"], started = now - started, now
+        PROVIDER_SECONDS.labels(outcome.api_name).observe(timings["provide"])
+
+        if outcome.kind != EMERGENCY:
+            self.normalize(outcome.result, patient_name)
+            now = time.perf_counter()
+            timings["normalize"], started = now - started, now
+
+        self.persist(session_id, outcome.api_name, outcome.result)
+        timings["persist"] = time.perf_counter() - started
+        self.observe(timings)
+        return outcome
+
+    def observe(self, timings):
+        for stage, seconds in timings.items():
+            STAGE_SECONDS.labels(stage).observe(seconds)
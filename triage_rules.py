@@ -0,0 +1,94 @@
+# triage_rules.py
+import json
+from collections import namedtuple
+
+from phrase_matcher import PhraseMatcher
+
+Rule = namedtuple("Rule", "id priority order all_terms any_terms response")
+
+
+class FrozenDict(dict):
+    """A dict that refuses mutation.
+
+    Still a real dict, so json.dumps/jsonify serialise it as usual.  Used for
+    response templates shared by every caller.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("response templates are read-only; copy with dict(...) first")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    """Recursively turn dicts into FrozenDicts and lists into tuples"""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class RuleEngine:
+    """First-match-wins triage rules compiled from a declarative table.
+
+    Each rule lists ``all`` terms that must appear and, optionally, ``any``
+    terms of which at least one must appear.  Every term in the table is
+    compiled into one PhraseMatcher, and each rule is indexed under a single
+    anchor term (its first ``all`` term, else each ``any`` term), so an
+    evaluation only looks at rules anchored on terms that actually occur in
+    the text.  Among the rules that match, the highest ``priority`` wins,
+    then the earliest in the file.  Responses are frozen and shared.
+    """
+
+    def __init__(self, rules, default_response):
+        self.rules = []
+        self._index = {}
+        terms = set()
+        for order, spec in enumerate(rules):
+            all_terms = tuple(t.lower() for t in spec.get("all", ()))
+            any_terms = frozenset(t.lower() for t in spec.get("any", ()))
+            if not all_terms and not any_terms:
+                raise ValueError(f"Rule {spec.get('id', order)!r} has no terms")
+            rule = Rule(spec.get("id", f"rule_{order}"), spec.get("priority", 0), order,
+                        frozenset(all_terms), any_terms, freeze(spec["response"]))
+            self.rules.append(rule)
+            for anchor in (all_terms[:1] or sorted(any_terms)):
+                self._index.setdefault(anchor, []).append(rule)
+            terms.update(all_terms)
+            terms.update(any_terms)
+        self.default_response = freeze(default_response)
+        self.terms = frozenset(terms)
+        self._matcher = PhraseMatcher(sorted(terms))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+        return cls(table["rules"], table["default"]["response"])
+
+    def matched_terms(self, text):
+        return {match.phrase for match in self._matcher.finditer(text)}
+
+    def match(self, text):
+        """Return the winning Rule, or None when only the default applies"""
+        found = self.matched_terms(text)
+        best = None
+        for term in found:
+            for rule in self._index.get(term, ()):
+                if not rule.all_terms <= found:
+                    continue
+                if rule.any_terms and rule.any_terms.isdisjoint(found):
+                    continue
+                if best is None or (-rule.priority, rule.order) < (-best.priority, best.order):
+                    best = rule
+        return best
+
+    def evaluate(self, text):
+        """The shared, read-only response template for ``text``"""
+        rule = self.match(text)
+        return rule.response if rule is not None else self.default_response